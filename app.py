@@ -4,38 +4,66 @@ from starlette import status
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse
 
-from controller.app_controller import application
+from controller.app_controller.frame_upload import RequestSizeLimitMiddleware
 from controller.auth_controller import authentication
-from face_auth.constant.application import APP_HOST, APP_PORT
+from face_auth.business_val.password_hasher import password_hasher
+from face_auth.constant.application import APP_HOST, APP_PORT, APP_PROFILE
+from face_auth.constant.database_constants import ENSURE_INDEXES_ON_STARTUP
+from face_auth.data_access.async_data_access import db_executor
+from face_auth.data_access.indexes import ensure_indexes
 
 app = FastAPI()
 
 
-@app.get("/")
-def read_root():
-    return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
-
-
-app.include_router(authentication.router)
-
-app.include_router(application.router)
-
-app.add_middleware(SessionMiddleware, secret_key="!secret")
+def include_face_routes(app: FastAPI) -> None:
+    """Adds the face routes and the inference lifecycle to the app. The embedding subsystem is imported here, and
+    deepface and TensorFlow only when the models are loaded, so the auth profile never imports them.
+    """
+    from controller.app_controller import application
+    from face_auth.inference.inference_executor import inference_executor
 
+    @app.on_event("startup")
+    def load_models():
+        ## builds the detector and the embedding model once where the inference runs so the first login does not pay for it
+        inference_executor.start()
 
-if __name__ == "__main__":
-    uvicorn.run(app, host=APP_HOST, port=APP_PORT)
+    @app.on_event("shutdown")
+    async def stop_inference_executor():
+        await application.embedding_batcher.shutdown()
+        inference_executor.shutdown()
 
+    app.include_router(application.router)
 
 
+## full serves every route, auth only the /auth routes (APP_PROFILE=auth), e.g. for a token service scaled apart
+if APP_PROFILE == "full":
+    include_face_routes(app)
 
 
+@app.on_event("startup")
+def create_database_indexes():
+    ## the lookups by UUID, username and email id use an index, and the unique ones reject duplicated users
+    if ENSURE_INDEXES_ON_STARTUP:
+        ensure_indexes()
 
 
+@app.on_event("shutdown")
+async def stop_executors():
+    db_executor.shutdown(wait=True)
+    password_hasher.shutdown()
 
 
+@app.get("/")
+def read_root():
+    return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
 
 
+app.include_router(authentication.router)
 
+app.add_middleware(SessionMiddleware, secret_key="!secret")
+if APP_PROFILE == "full":
+    app.add_middleware(RequestSizeLimitMiddleware)
 
 
+if __name__ == "__main__":
+    uvicorn.run(app, host=APP_HOST, port=APP_PORT)
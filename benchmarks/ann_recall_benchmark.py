@@ -0,0 +1,101 @@
+## Recall vs QPS benchmark of the approximate embedding indexes (IVF, HNSW) against the exact cosine search.
+#  Usage: python benchmarks/ann_recall_benchmark.py [--size 100000] [--top-k 5] [--n-probe 1 4 8 16 32] [--ef 16 32 64 128]
+#  The exact results are the cosine_simmilarity of the query with every user, ranked. The synthetic users are
+#  clustered like real identities: noisy variations around a set of centers, queries are noisy copies of users.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## face_auth.constant imports the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.business_val.user_embedding_val import UserLoginEmbeddingValidation
+from face_auth.search.embedding_index import EmbeddingIndex
+from face_auth.search.ivf_index import IVFEmbeddingIndex
+
+
+def synthetic_users(rng, size, centers=1000):
+    center_vectors = rng.standard_normal((centers, EMBEDDING_SIZE), dtype=np.float32)
+    embeddings = center_vectors[rng.integers(0, centers, size)]
+    return embeddings + 0.5 * rng.standard_normal((size, EMBEDDING_SIZE), dtype=np.float32)
+
+
+def check_baseline(embeddings, queries, index, top_k):
+    ## the exact index must return the same ranking as cosine_simmilarity on a few queries
+    for query in queries[:3]:
+        scores = np.array([UserLoginEmbeddingValidation.cosine_simmilarity(embedding, query) for embedding in embeddings])
+        expected = np.argsort(-scores)[:top_k]
+        found = [int(match["uuid"]) for match in index.search(query, top_k)]
+        assert found == expected.tolist(), (found, expected)
+
+
+def measure(search, queries, exact_results, top_k):
+    hits, start = 0, time.perf_counter()
+    for query, expected in zip(queries, exact_results):
+        found = {match["uuid"] for match in search(query)}
+        hits += len(found & expected)
+    seconds = time.perf_counter() - start
+    return hits / (len(queries) * top_k), len(queries) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = synthetic_users(rng, args.size)
+    uuids = [str(row) for row in range(args.size)]
+    queries = embeddings[rng.integers(0, args.size, args.queries)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    exact = EmbeddingIndex()
+    exact.build(uuids, embeddings)
+    check_baseline(embeddings, queries, exact, args.top_k)
+    exact_results = [{match["uuid"] for match in exact.search(query, args.top_k)} for query in queries]
+
+    print(f"{'index':>6} {'param':>12} {'build s':>8} {'recall':>7} {'qps':>9}")
+    _, qps = measure(lambda query: exact.search(query, args.top_k), queries, exact_results, args.top_k)
+    print(f"{'exact':>6} {'-':>12} {'-':>8} {1.0:>7.3f} {qps:>9.1f}")
+
+    ivf = IVFEmbeddingIndex()
+    start = time.perf_counter()
+    ivf.build(uuids, embeddings)
+    build_seconds = time.perf_counter() - start
+    for n_probe in args.n_probe:
+        recall, qps = measure(
+            lambda query: ivf.search(query, args.top_k, n_probe=n_probe), queries, exact_results, args.top_k
+        )
+        print(f"{'ivf':>6} {f'n_probe={n_probe}':>12} {build_seconds:>8.2f} {recall:>7.3f} {qps:>9.1f}")
+
+    try:
+        from face_auth.search.hnsw_index import HNSWEmbeddingIndex
+
+        hnsw = HNSWEmbeddingIndex()
+    except Exception:
+        print("hnswlib is not installed, skipping the hnsw index")
+        return
+    start = time.perf_counter()
+    hnsw.build(uuids, embeddings)
+    build_seconds = time.perf_counter() - start
+    for ef in args.ef:
+        recall, qps = measure(
+            lambda query: hnsw.search(query, args.top_k, ef_search=ef), queries, exact_results, args.top_k
+        )
+        print(f"{'hnsw':>6} {f'ef={ef}':>12} {build_seconds:>8.2f} {recall:>7.3f} {qps:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+## Test harness of the async data access layer and of the /auth routes awaiting it.
+#  Usage: python benchmarks/async_data_access_harness.py [--mongodb-url mongodb://localhost:27017] [--db-latency-ms 20]
+#  Without --mongodb-url the database is the in-process fake (mongomock://, pip install mongomock).
+#  --db-latency-ms adds a sleep to every pymongo call of the harness to stand for the network round trip, the
+#  event loop lag measured while the logins run stays close to 0 only if no handler blocks on the database.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--mongodb-url", default="mongomock://localhost")
+parser.add_argument("--db-latency-ms", type=float, default=20.0)
+parser.add_argument("--concurrency", type=int, default=16)
+args = parser.parse_args()
+
+## the constants are read when face_auth is imported
+os.environ["MONGODB_URL_KEY"] = args.mongodb_url
+os.environ.setdefault("DATABASE_NAME", "async_data_access_harness")
+os.environ.setdefault("USER_COLLECTION_NAME", "users")
+os.environ.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+os.environ.setdefault("SECRET_KEY", "harness")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from starlette.middleware.sessions import SessionMiddleware
+
+from controller.auth_controller import authentication
+from face_auth.data_access.async_data_access import AsyncUserData, AsyncUserEmbeddingData
+from face_auth.data_access.embedding_cache import embedding_cache
+from face_auth.data_access.user_data import UserData
+
+
+def add_latency(collection_class, seconds):
+    ## wraps the collection calls used by the data access objects with a sleep standing for the round trip,
+    # on the class so that the collections built by the handlers are slowed down too
+    for name in ("find_one", "insert_one", "insert_many", "count_documents"):
+        method = getattr(collection_class, name)
+
+        def slow(self, *call_args, _method=method, **call_kwargs):
+            time.sleep(seconds)
+            return _method(self, *call_args, **call_kwargs)
+
+        setattr(collection_class, name, slow)
+
+
+async def check_data_access():
+    async_user_data = AsyncUserData()
+    async_embedding_data = AsyncUserEmbeddingData()
+    uuid_ = str(uuid.uuid4())
+    await async_user_data.save_user({"UUID": uuid_, "username": uuid_, "email_id": f"{uuid_}@harness.io"})
+    assert (await async_user_data.get_user({"UUID": uuid_}))["username"] == uuid_
+    assert await async_user_data.get_user({"UUID": "missing"}) is None
+    assert any([user["UUID"] == uuid_ async for user in async_user_data.get_all_users(batch_size=2)])
+
+    embedding = np.random.default_rng(0).standard_normal(128)
+    await async_embedding_data.save_user_embedding(uuid_, embedding.tolist())
+    stored = await async_embedding_data.get_user_embedding_array(uuid_)
+    assert np.allclose(stored, embedding / np.linalg.norm(embedding), atol=1e-6)
+    assert embedding_cache.get(uuid_) is not None  ## the next read is a cache hit on the event loop
+    await async_embedding_data.insert_embeddings(["bulk-1", "bulk-2"], np.ones((2, 128)))
+    streamed = {uuid_ async for uuid_, _ in async_embedding_data.get_all_embeddings(batch_size=2)}
+    assert {uuid_, "bulk-1", "bulk-2"} <= streamed
+    assert await async_embedding_data.count_embeddings() == len(streamed)
+    print("async data access     ok")
+
+    ## the lookups overlap on the database thread pool instead of running one after the other
+    start = time.perf_counter()
+    await asyncio.gather(*[async_user_data.get_user({"UUID": uuid_}) for _ in range(args.concurrency)])
+    print(f"{args.concurrency} concurrent lookups {(time.perf_counter() - start) * 1000:6.1f} ms")
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        lags.append((time.perf_counter() - start - 0.005) * 1000)
+
+
+async def check_auth_routes():
+    app = FastAPI()
+    app.include_router(authentication.router)
+    app.add_middleware(SessionMiddleware, secret_key="harness")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://harness") as client:
+        suffix = uuid.uuid4().hex[:8]
+        register = {
+            "Name": "Harness", "username": f"harness{suffix}", "email_id": f"harness{suffix}@harness.io",
+            "ph_no": 1234567890, "password1": "password123", "password2": "password123",
+        }
+        assert (await client.post("/auth/register", json=register)).status_code == 200
+        duplicate = await client.post("/auth/register", json=register)
+        assert duplicate.status_code == 401 and "User already exists" in duplicate.json()["message"]
+        login = {"email_id": register["email_id"], "password": "password123"}
+        assert (await client.post("/auth/", json=login)).status_code == 200
+        wrong = {"email_id": register["email_id"], "password": "wrong-password"}
+        assert (await client.post("/auth/", json=wrong)).status_code == 401
+        print("auth routes           ok")
+
+        stop, lags = asyncio.Event(), []
+        lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[client.post("/auth/", json=login) for _ in range(args.concurrency)])
+        seconds = time.perf_counter() - start
+        stop.set()
+        await lag_task
+        assert all(response.status_code == 200 for response in responses)
+        ## bcrypt runs on the password hasher threads, the loop lag only measures what is left on the loop
+        print(
+            f"{args.concurrency} concurrent logins {seconds:6.2f} s, event loop lag "
+            f"p50={np.percentile(lags, 50):.1f} ms max={np.max(lags):.1f} ms"
+        )
+
+
+async def main():
+    if args.db_latency_ms:
+        add_latency(type(UserData().collection), args.db_latency_ms / 1000)
+    await check_data_access()
+    await check_auth_routes()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
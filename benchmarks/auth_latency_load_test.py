@@ -0,0 +1,79 @@
+## Load test of the /auth latency while face embedding requests are running concurrently.
+#  Start the server first (python app.py) with a registered user, then run:
+#  python benchmarks/auth_latency_load_test.py --email-id <email> --password <password> --images <img1.jpg> ...
+#  The test measures p50/p99 latency of GET /auth/ once without load and once while
+#  --concurrency clients keep posting the images to /application/.
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+
+async def measure_auth_latency(client: httpx.AsyncClient, duration: float) -> list:
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        await client.get("/auth/")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def embedding_load(client: httpx.AsyncClient, files: list, stop: asyncio.Event, statuses: list):
+    while not stop.is_set():
+        response = await client.post(
+            "/application/", files=[("files", (name, content)) for name, content in files]
+        )
+        statuses.append(response.status_code)
+
+
+def report(name: str, latencies: list) -> None:
+    print(
+        f"{name:<24} requests={len(latencies):<6} p50={np.percentile(latencies, 50):8.2f} ms"
+        f" p99={np.percentile(latencies, 99):8.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email-id", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--images", nargs="+", required=True)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    files = []
+    for path in args.images:
+        with open(path, "rb") as image_file:
+            files.append((path, image_file.read()))
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as auth_client, httpx.AsyncClient(
+        base_url=args.url, timeout=120
+    ) as embedding_client:
+        login = await embedding_client.post(
+            "/auth/", json={"email_id": args.email_id, "password": args.password}
+        )
+        login.raise_for_status()
+
+        report("/auth idle", await measure_auth_latency(auth_client, args.duration))
+
+        stop = asyncio.Event()
+        statuses = []
+        load = [
+            asyncio.create_task(embedding_load(embedding_client, files, stop, statuses))
+            for _ in range(args.concurrency)
+        ]
+        latencies = await measure_auth_latency(auth_client, args.duration)
+        stop.set()
+        await asyncio.gather(*load)
+        report(f"/auth with {args.concurrency} embedders", latencies)
+        print(f"embedding requests completed={len(statuses)} status codes={sorted(set(statuses))}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
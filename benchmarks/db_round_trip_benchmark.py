@@ -0,0 +1,99 @@
+## Database round trips and latency of the login and of the registration, with the query pattern the handlers
+#  used before the request-scoped repository (three find_one per existence check, the check run twice per
+#  registration, a new UserData per call) and with the current one.
+#  Usage: python benchmarks/db_round_trip_benchmark.py [--mongodb-url mongodb://localhost:27017] [--db-latency-ms 1]
+#  Without --mongodb-url the database is the in-process fake (mongomock://, pip install mongomock), and
+#  --db-latency-ms stands for the network round trip of every call.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--mongodb-url", default="mongomock://localhost")
+parser.add_argument("--db-latency-ms", type=float, default=1.0)
+parser.add_argument("--iterations", type=int, default=20)
+args = parser.parse_args()
+
+os.environ["MONGODB_URL_KEY"] = args.mongodb_url
+os.environ.setdefault("DATABASE_NAME", "db_round_trip_benchmark")
+os.environ.setdefault("USER_COLLECTION_NAME", "users")
+os.environ.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+
+from face_auth.business_val.user_val import LoginValidation, RegisterValidation
+from face_auth.data_access.repository import get_repository
+from face_auth.data_access.user_data import UserData
+from face_auth.entity.user import User
+
+round_trips = 0
+
+
+def count_round_trips(collection_class, seconds):
+    ## every collection call used by the data access objects is one round trip to the server
+    for name in ("find_one", "insert_one", "insert_many", "count_documents"):
+        method = getattr(collection_class, name)
+
+        def counted(self, *call_args, _method=method, **call_kwargs):
+            global round_trips
+            round_trips += 1
+            time.sleep(seconds)
+            return _method(self, *call_args, **call_kwargs)
+
+        setattr(collection_class, name, counted)
+
+
+def new_user() -> User:
+    suffix = uuid.uuid4().hex[:12]
+    return User("Bench", f"bench{suffix}", f"bench{suffix}@bench.io", 1234567890, "password123", "password123")
+
+
+def legacy_register(user: User) -> None:
+    ## the handler validated, then authenticate_user_registration validated again before saving
+    for _ in range(2):
+        userdata = UserData()
+        for query in ({"username": user.username}, {"email_id": user.email_id}, {"UUID": user.uuid_}):
+            userdata.get_user(query)
+    UserData().save_user({"username": user.username, "email_id": user.email_id, "UUID": user.uuid_,
+                          "password": RegisterValidation.get_password_hash(user.password1)})
+
+
+def legacy_login(user: User) -> None:
+    LoginValidation(user.email_id, user.password1).authenticate_user_login()
+
+
+async def current_register(user: User) -> None:
+    await RegisterValidation(user, get_repository().users).authenticate_user_registration_async()
+
+
+async def current_login(user: User) -> None:
+    await LoginValidation(user.email_id, user.password1).authenticate_user_login_async(get_repository().users)
+
+
+async def measure(name, operation, users, is_async):
+    global round_trips
+    round_trips, seconds = 0, 0.0
+    for user in users:
+        start = time.perf_counter()
+        await operation(user) if is_async else operation(user)
+        seconds += time.perf_counter() - start
+    print(f"{name:<22} round trips/op={round_trips / len(users):5.2f}   mean latency={1000 * seconds / len(users):8.2f} ms")
+
+
+async def main():
+    count_round_trips(type(UserData().collection), args.db_latency_ms / 1000)
+    legacy_users = [new_user() for _ in range(args.iterations)]
+    current_users = [new_user() for _ in range(args.iterations)]
+    ## bcrypt dominates both latencies, the round trip counts are the figures compared here
+    await measure("registration (before)", legacy_register, legacy_users, False)
+    await measure("registration (after)", current_register, current_users, True)
+    await measure("login (before)", legacy_login, legacy_users, False)
+    await measure("login (after)", current_login, current_users, True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+## Benchmark of the MTCNN detection on the full resolution frames (current per-image path) against the
+#  decode and pre-resize stage of the ImagePreprocessor.
+#  Usage: python benchmarks/detection_preresize_benchmark.py --images-dir <dir with face photos> [--max-side 640]
+#  Latency is the decode plus detection time per frame. Accuracy compares the face found by both paths: the
+#  detection agreement, the IoU of the boxes and the cosine similarity of the resulting Facenet embeddings.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## the embedding modules import the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+
+from deepface.detectors import FaceDetector
+
+from face_auth.inference.embedding_engine import BatchEmbeddingEngine
+from face_auth.inference.face_detectors import MtcnnFaceDetector
+from face_auth.inference.image_preprocessor import ImagePreprocessor
+from face_auth.inference.model_registry import ModelRegistry
+
+
+def iou(box_a, box_b) -> float:
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    width = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    height = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = width * height
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union else 0.0
+
+
+def full_resolution(engine: BatchEmbeddingEngine, detector: MtcnnFaceDetector, contents: bytes):
+    img = BatchEmbeddingEngine.decode_image(contents)
+    face, region = FaceDetector.detect_face(detector.model, "mtcnn", img)
+    return img, face, region
+
+
+def pre_resized(engine: BatchEmbeddingEngine, detector: MtcnnFaceDetector, contents: bytes):
+    img = engine.preprocessor.decode(contents)
+    detection = detector.detect(img)
+    return img, detection.face if detection else None, detection.region if detection else None
+
+
+def embed(engine: BatchEmbeddingEngine, face) -> np.ndarray:
+    embedding = engine.represent_faces(engine.preprocess_face(face))[0]
+    return embedding / np.linalg.norm(embedding)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images-dir", required=True)
+    parser.add_argument("--max-side", type=int, default=None, help="overrides DETECTION_MAX_SIDE")
+    args = parser.parse_args()
+
+    ModelRegistry.load()
+    engine = BatchEmbeddingEngine()
+    detector = MtcnnFaceDetector(ImagePreprocessor(detection_max_side=args.max_side) if args.max_side is not None else None)
+
+    paths = sorted(
+        os.path.join(args.images_dir, name)
+        for name in os.listdir(args.images_dir)
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    latencies = {"full": [], "resized": []}
+    agreements, ious, similarities = 0, [], []
+    for path in paths:
+        with open(path, "rb") as image_file:
+            contents = image_file.read()
+        results = {}
+        for name, function in (("full", full_resolution), ("resized", pre_resized)):
+            start = time.perf_counter()
+            results[name] = function(engine, detector, contents)
+            latencies[name].append((time.perf_counter() - start) * 1000)
+
+        full_face, full_region = results["full"][1], results["full"][2]
+        resized_face, resized_region = results["resized"][1], results["resized"][2]
+        found = (full_face is not None, resized_face is not None)
+        agreements += found[0] == found[1]
+        if all(found):
+            ## the full resolution frame is the raw decode, the boxes are compared when no EXIF rotation applied
+            if results["full"][0].shape == results["resized"][0].shape:
+                ious.append(iou(full_region, resized_region))
+            similarities.append(float(embed(engine, full_face) @ embed(engine, resized_face)))
+        with Image.open(path) as image:
+            size = image.size
+        print(f"{os.path.basename(path):>30} {size[0]}x{size[1]} faces found (full, resized): {found}")
+
+    print(f"\nframes: {len(paths)}")
+    for name, values in latencies.items():
+        values = np.array(values)
+        print(f"{name:>8} decode + detect: p50 {np.percentile(values, 50):.1f} ms, mean {values.mean():.1f} ms")
+    print(f"detection agreement: {agreements / max(1, len(paths)):.3f}")
+    if ious:
+        print(f"box IoU: mean {np.mean(ious):.3f}, min {np.min(ious):.3f}")
+    if similarities:
+        print(f"embedding cosine similarity: mean {np.mean(similarities):.4f}, min {np.min(similarities):.4f}")
+
+
+if __name__ == "__main__":
+    main()
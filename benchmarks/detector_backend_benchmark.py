@@ -0,0 +1,104 @@
+## Per-frame CPU latency of the face detector backends (opencv Haar, ssd, mtcnn and the cascade).
+#  Usage: python benchmarks/detector_backend_benchmark.py [--images-dir <dir with face photos>] [--backends ...]
+#  Frames are decoded and downscaled by the ImagePreprocessor beforehand, the latency is the detection and
+#  alignment only. With photos the agreement with mtcnn (box IoU >= 0.5) is reported as the accuracy proxy.
+#  Without --images-dir synthetic frames are used, they contain no face and only measure the cost of a miss.
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## the embedding modules import the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+
+from face_auth.inference.face_detectors import build_face_detector
+from face_auth.inference.image_preprocessor import ImagePreprocessor
+
+
+def load_frames(images_dir: str) -> list:
+    preprocessor = ImagePreprocessor()
+    if images_dir:
+        paths = sorted(
+            os.path.join(images_dir, name)
+            for name in os.listdir(images_dir)
+            if name.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        frames = []
+        for path in paths:
+            with open(path, "rb") as image_file:
+                frames.append(preprocessor.decode(image_file))
+        return frames
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(10):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+        frames.append(preprocessor.decode(buffer.getvalue()))
+    return frames
+
+
+def iou(box_a, box_b) -> float:
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    width = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    height = max(0, min(ay + ah, by + bh) - max(ay, by))
+    intersection = width * height
+    union = aw * ah + bw * bh - intersection
+    return intersection / union if union else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images-dir", default=None)
+    parser.add_argument("--backends", nargs="+", default=["opencv", "ssd", "mtcnn", "cascade"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    frames = load_frames(args.images_dir)
+    reference = None
+    results = {}
+    for backend in ["mtcnn"] + [backend for backend in args.backends if backend != "mtcnn"]:
+        try:
+            detector = build_face_detector(backend)
+        except Exception as e:  ## ssd needs its weights, downloaded from GitHub on the first build
+            print(f"{backend}: could not be built ({e})")
+            continue
+        detector.detect(frames[0])  ## warmup
+        latencies, detections = [], []
+        for _ in range(args.repeat):
+            detections = []
+            for frame in frames:
+                start = time.perf_counter()
+                detections.append(detector.detect(frame))
+                latencies.append((time.perf_counter() - start) * 1000)
+        if backend == "mtcnn":
+            reference = detections
+        agreement = np.mean(
+            [
+                (found is None and expected is None)
+                or (found is not None and expected is not None and iou(found.region, expected.region) >= 0.5)
+                for found, expected in zip(detections, reference)
+            ]
+        )
+        results[backend] = (np.array(latencies), np.mean([d is not None for d in detections]), agreement, detector)
+
+    print(f"\n{'backend':>8} {'p50 ms':>8} {'p99 ms':>8} {'fps':>7} {'found':>6} {'agree':>6}")
+    for backend, (latencies, found, agreement, detector) in results.items():
+        print(
+            f"{backend:>8} {np.percentile(latencies, 50):>8.1f} {np.percentile(latencies, 99):>8.1f}"
+            f" {1000 / latencies.mean():>7.1f} {found:>6.2f} {agreement:>6.2f}"
+        )
+        if hasattr(detector, "stats"):
+            print(f"{'':>8} cascade: {detector.stats()}")
+
+
+if __name__ == "__main__":
+    main()
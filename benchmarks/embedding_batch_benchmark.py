@@ -0,0 +1,92 @@
+## Benchmark of the per-image embedding path against the batched embedding engine.
+#  Usage: python benchmarks/embedding_batch_benchmark.py [--images-dir <dir with face photos>]
+#  Without --images-dir synthetic frames are used, which is enough to measure the model overhead.
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## the embedding modules import the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+## the synthetic frames contain no face, the quality gate would reject all of them before the embedding model
+os.environ.setdefault("QUALITY_GATE_ENABLED", "False")
+
+from face_auth.business_val.user_embedding_val import UserLoginEmbeddingValidation
+from face_auth.inference.embedding_engine import BatchEmbeddingEngine
+
+FRAME_COUNTS = [1, 5, 10]
+
+
+def load_frames(images_dir: str, count: int) -> list:
+    """Returns `count` encoded frames, cycling over the images of images_dir or synthetic frames"""
+    if images_dir:
+        paths = sorted(
+            os.path.join(images_dir, name)
+            for name in os.listdir(images_dir)
+            if name.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        frames = []
+        for index in range(count):
+            with open(paths[index % len(paths)], "rb") as image_file:
+                frames.append(image_file.read())
+        return frames
+
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buffer, format="JPEG")
+        frames.append(buffer.getvalue())
+    return frames
+
+
+def per_image_embeddings(files: list) -> np.ndarray:
+    return np.array(
+        [
+            UserLoginEmbeddingValidation.generate_embedding(BatchEmbeddingEngine.decode_image(contents))
+            for contents in files
+        ]
+    )
+
+
+def timed(function, files: list, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(files)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images-dir", default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = BatchEmbeddingEngine()
+    ## warm up both paths so that model construction is not part of the measurement
+    warmup_frames = load_frames(args.images_dir, 1)
+    per_image_embeddings(warmup_frames)
+    engine.generate_embedding_batch(warmup_frames)
+
+    print(f"{'frames':>6} {'per-image img/s':>16} {'batched img/s':>14} {'speedup':>8} {'max abs diff':>13}")
+    for count in FRAME_COUNTS:
+        files = load_frames(args.images_dir, count)
+        reference, per_image_seconds = timed(per_image_embeddings, files, args.repeat)
+        batched, batched_seconds = timed(engine.generate_embedding_batch, files, args.repeat)
+        max_diff = float(np.max(np.abs(reference - batched)))
+        print(
+            f"{count:>6} {count / per_image_seconds:>16.2f} {count / batched_seconds:>14.2f}"
+            f" {per_image_seconds / batched_seconds:>7.2f}x {max_diff:>13.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
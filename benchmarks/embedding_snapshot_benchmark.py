@@ -0,0 +1,77 @@
+## Startup time of the exact index built from the embedding collection vs mapped from a snapshot.
+#  Usage: python benchmarks/embedding_snapshot_benchmark.py [--size 100000] [--mongodb-url mongodb://localhost:27017]
+#  Without --mongodb-url the collection is an in-memory mongomock one (pip install mongomock), which measures
+#  the decoding of the documents but not the network transfer.
+
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.data_access.embedding_snapshot import export_embedding_snapshot, load_embedding_snapshot
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.search.embedding_index import EmbeddingIndex
+
+
+def embedding_data(mongodb_url):
+    if mongodb_url:
+        import pymongo
+
+        client = pymongo.MongoClient(mongodb_url)
+    else:
+        import mongomock
+
+        client = mongomock.MongoClient()
+    ## skips MongodbClient, which reads its URL from MONGODB_URL_KEY
+    data = UserEmbeddingData.__new__(UserEmbeddingData)
+    data.collection = client["embedding_snapshot_benchmark"]["embeddings"]
+    data.collection.drop()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--mongodb-url", default="")
+    args = parser.parse_args()
+
+    data = embedding_data(args.mongodb_url)
+    embeddings = np.random.default_rng(0).standard_normal((args.size, EMBEDDING_SIZE), dtype=np.float32)
+    uuids = [str(row) for row in range(args.size)]
+    for start in range(0, args.size, 1000):
+        data.insert_embeddings(uuids[start : start + 1000], embeddings[start : start + 1000])
+
+    index = EmbeddingIndex()
+    start = time.perf_counter()
+    index.load_from_collection(data)
+    print(f"load from collection  {time.perf_counter() - start:8.3f} s")
+    expected = index.search(embeddings[0], 5)
+
+    path = os.path.join(tempfile.mkdtemp(), "snapshot")
+    start = time.perf_counter()
+    export_embedding_snapshot(path, data)
+    print(f"export snapshot       {time.perf_counter() - start:8.3f} s")
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = EmbeddingIndex()
+    start = time.perf_counter()
+    index.load_snapshot(load_embedding_snapshot(path))
+    print(f"load from snapshot    {time.perf_counter() - start:8.3f} s")
+    assert [match["uuid"] for match in index.search(embeddings[0], 5)] == [match["uuid"] for match in expected]
+    print(f"matrix copied         {not isinstance(index.matrix, np.memmap)}")
+    print(f"peak RSS growth       {(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024:8.1f} MB")
+    data.collection.drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+## Benchmark of the 1:N identification query latency of the in-memory embedding index.
+#  Usage: python benchmarks/identification_benchmark.py [--sizes 10000 100000 1000000] [--top-k 5]
+#  The index is filled with synthetic random embeddings, 1M users need about 512MB of memory.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## face_auth.constant imports the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.search.embedding_index import EmbeddingIndex
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'users':>9} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'qps':>9}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, EMBEDDING_SIZE), dtype=np.float32)
+        uuids = [f"user-{row}" for row in range(size)]
+        index = EmbeddingIndex()
+        start = time.perf_counter()
+        index.build(uuids, embeddings)
+        build_seconds = time.perf_counter() - start
+
+        queries = rng.standard_normal((args.queries, EMBEDDING_SIZE), dtype=np.float32)
+        index.search(queries[0], args.top_k)  ## warmup
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies = np.array(latencies)
+        print(
+            f"{size:>9} {build_seconds:>8.2f} {np.percentile(latencies, 50):>8.3f}"
+            f" {np.percentile(latencies, 99):>8.3f} {1000 / latencies.mean():>9.1f}"
+        )
+        del index, embeddings
+
+
+if __name__ == "__main__":
+    main()
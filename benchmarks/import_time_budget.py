@@ -0,0 +1,82 @@
+## Import time budget of the app, run as a check: exits with 1 when a profile imports slower than its budget or
+#  imports a module it must not (TensorFlow and deepface are loaded by ModelRegistry.load, never by an import).
+#  Every profile is imported in a fresh interpreter with `python -X importtime`, the best of --repeat runs is kept.
+#  Usage: python benchmarks/import_time_budget.py [--repeat 3] [--budget-ms auth=1000 full=1200 cli=700]
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## profile -> (environment, module imported)
+PROFILES = {
+    "auth": ({"APP_PROFILE": "auth"}, "app"),
+    "full": ({"APP_PROFILE": "full"}, "app"),
+    "cli": ({}, "face_auth.data_access.embedding_snapshot"),
+}
+DEFAULT_BUDGETS_MS = {"auth": 1000, "full": 1200, "cli": 700}
+FORBIDDEN_MODULES = ("tensorflow", "keras", "deepface")
+
+
+def import_time(module: str, environment: dict) -> tuple:
+    """Imports the module in a fresh interpreter
+
+    Returns:
+        tuple: cumulative import time of the module in ms, set of the top level modules imported
+    """
+    env = dict(os.environ, **environment)
+    env.setdefault("MONGODB_URL_KEY", "mongomock://localhost")
+    env.setdefault("DATABASE_NAME", "import_time_budget")
+    env.setdefault("USER_COLLECTION_NAME", "users")
+    env.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+    env.setdefault("SECRET_KEY", "budget")
+    env.setdefault("ALGORITHM", "HS256")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    cumulative_us, imported = None, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if cumulative.strip().isdigit():
+            imported.add(name.split(".")[0])
+            if name == module:
+                cumulative_us = int(cumulative)
+    return cumulative_us / 1000, imported
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--budget-ms", nargs="*", default=[], help="profile=ms, overrides the default budgets")
+    parser.add_argument("--profiles", nargs="*", default=list(PROFILES))
+    args = parser.parse_args()
+    budgets = dict(DEFAULT_BUDGETS_MS, **{k: float(v) for k, v in (item.split("=") for item in args.budget_ms)})
+
+    failures = []
+    print(f"{'profile':<8} {'import ms':>10} {'budget ms':>10}  forbidden modules")
+    for profile in args.profiles:
+        environment, module = PROFILES[profile]
+        runs = [import_time(module, environment) for _ in range(args.repeat)]
+        milliseconds = min(run[0] for run in runs)
+        forbidden = sorted(set().union(*(run[1] for run in runs)) & set(FORBIDDEN_MODULES))
+        print(f"{profile:<8} {milliseconds:>10.0f} {budgets[profile]:>10.0f}  {', '.join(forbidden) or '-'}")
+        if milliseconds > budgets[profile]:
+            failures.append(f"{profile} imports in {milliseconds:.0f} ms, over its {budgets[profile]:.0f} ms budget")
+        if forbidden:
+            failures.append(f"{profile} imports {', '.join(forbidden)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
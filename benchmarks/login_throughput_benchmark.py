@@ -0,0 +1,88 @@
+## Logins per second and event loop lag of concurrent logins, with bcrypt verified on the event loop (the
+#  previous authenticate_user_login called from the handler) and on the password hasher threads.
+#  Usage: python benchmarks/login_throughput_benchmark.py [--concurrency 1 4 16] [--rounds 12] [--workers 4]
+#  The users live in the in-process fake database (mongomock://), so bcrypt is the only cost measured. The
+#  throughput only scales with --workers up to the number of cores, the loop lag drops whatever the cores.
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+parser.add_argument("--logins", type=int, default=32)
+parser.add_argument("--rounds", type=int, default=12)
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+args = parser.parse_args()
+
+os.environ["MONGODB_URL_KEY"] = "mongomock://localhost"
+os.environ.setdefault("DATABASE_NAME", "login_throughput_benchmark")
+os.environ.setdefault("USER_COLLECTION_NAME", "users")
+os.environ.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max(args.concurrency) * 2)
+
+import numpy as np
+
+from face_auth.business_val.password_hasher import password_hasher
+from face_auth.business_val.user_val import LoginValidation
+from face_auth.data_access.user_data import UserData
+
+
+async def blocking_login(email_id, password):
+    ## what the handlers did before: the whole login, bcrypt included, on the event loop
+    return LoginValidation(email_id, password).authenticate_user_login()
+
+
+async def offloaded_login(email_id, password):
+    return await LoginValidation(email_id, password).authenticate_user_login_async()
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - start - 0.001) * 1000)
+
+
+async def run(login, concurrency, users):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(email_id):
+        async with semaphore:
+            assert await login(email_id, "password123")
+
+    stop, lags = asyncio.Event(), []
+    lag_task = asyncio.create_task(measure_loop_lag(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*[one(users[n % len(users)]) for n in range(args.logins)])
+    seconds = time.perf_counter() - start
+    stop.set()
+    await lag_task
+    return args.logins / seconds, np.percentile(lags, 99)
+
+
+async def main():
+    user_data = UserData()
+    hashed_password = password_hasher.hash("password123")
+    users = [f"user{n}@bench.io" for n in range(8)]
+    for n, email_id in enumerate(users):
+        user_data.save_user({"UUID": str(n), "username": f"user{n}", "email_id": email_id, "password": hashed_password})
+
+    print(f"bcrypt rounds={args.rounds}, hasher threads={args.workers}, cores={os.cpu_count()}")
+    print(f"{'login':<10} {'concurrency':>11} {'logins/s':>9} {'loop lag p99 ms':>16}")
+    for name, login in (("blocking", blocking_login), ("offloaded", offloaded_login)):
+        for concurrency in args.concurrency:
+            logins_per_second, lag = await run(login, concurrency, users)
+            print(f"{name:<10} {concurrency:>11} {logins_per_second:>9.2f} {lag:>16.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+## Parity check and CPU throughput of the ONNX Runtime embedding backends against the TensorFlow Facenet.
+#  Usage: python benchmarks/onnx_runtime_benchmark.py --faces-dir <face photos> [--calibration-dir <face photos>]
+#             [--runtimes onnx onnx-fp16 onnx-int8] [--threads 1]
+#  The photos go through the detector and the preprocessing of the engine, so the parity is measured on the face
+#  crops the model sees in production. The int8 model is calibrated on the photos of --calibration-dir, which must
+#  not share any photo with --faces-dir: the parity of a quantized model on its own calibration set says nothing.
+#  Parity: the cosine similarity between the TensorFlow and the ONNX embedding of the same face must stay
+#  above 1 - tolerance, and the similarity of face pairs must not move by more than the tolerance, so the
+#  SIMILARITY_THRESHOLD decisions are unchanged. The script fails with an AssertionError when a runtime regresses.
+#  Throughput: faces per second of a single session limited to --threads cores, for several batch sizes.
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+## the embedding modules import the database constants, they are not used by this benchmark
+for variable_name in ("MONGODB_URL_KEY", "DATABASE_NAME", "USER_COLLECTION_NAME", "EMBEDDING_COLLECTION_NAME"):
+    os.environ.setdefault(variable_name, "benchmark")
+os.environ["EMBEDDING_RUNTIME"] = "tensorflow"  ## the reference model, and the one preprocessing the faces
+
+import tensorflow as tf
+
+from face_auth.inference.embedding_engine import BatchEmbeddingEngine
+from face_auth.inference.model_registry import ModelRegistry
+from face_auth.inference.onnx_embedding import OnnxEmbeddingModel, export_onnx_model
+
+TOLERANCES = {"onnx": 1e-4, "onnx-fp16": 5e-3, "onnx-int8": 3e-2}
+BATCH_SIZES = [1, 8, 32]
+
+
+def read_photos(directory: str) -> dict:
+    """sha256 of the content -> content of every file of the directory"""
+    photos = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "rb") as photo:
+            contents = photo.read()
+        photos[hashlib.sha256(contents).hexdigest()] = contents
+    return photos
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def throughput(predict, faces: np.ndarray, batch_size: int, seconds: float = 3.0) -> float:
+    batch = faces[:batch_size]
+    predict(batch)  ## warmup
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        predict(batch)
+        count += batch_size
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces-dir", required=True, help="face photos the parity is measured on")
+    parser.add_argument("--calibration-dir", default=None, help="face photos calibrating the int8 model")
+    parser.add_argument("--runtimes", nargs="+", default=list(TOLERANCES))
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--model-dir", default=None, help="defaults to a temporary directory")
+    args = parser.parse_args()
+    if "onnx-int8" in args.runtimes and not args.calibration_dir:
+        parser.error("onnx-int8 is calibrated on real faces, pass --calibration-dir <face photos>")
+
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    ModelRegistry.load(warmup=False)
+    keras_model = ModelRegistry.get_embedding_model()
+    engine = BatchEmbeddingEngine()
+    model_dir = args.model_dir or tempfile.mkdtemp()
+
+    photos = read_photos(args.faces_dir)
+    calibration_faces = None
+    if args.calibration_dir:
+        calibration_photos = read_photos(args.calibration_dir)
+        shared = set(photos) & set(calibration_photos)
+        assert not shared, f"{len(shared)} photos are both in --faces-dir and --calibration-dir"
+        calibration_faces = engine.extract_faces(list(calibration_photos.values()))
+    ## preprocessed face crops, as the engine hands them to the embedding model
+    faces = engine.extract_faces(list(photos.values()))
+    assert len(faces) >= 2, f"only {len(faces)} faces found in --faces-dir, the parity needs at least 2"
+    print(
+        f"{len(faces)} parity faces from {len(photos)} photos"
+        + ("" if calibration_faces is None else f", {len(calibration_faces)} calibration faces")
+    )
+    reference = normalize(np.asarray(keras_model.predict_on_batch(faces)))
+    reference_pairs = reference[::2] @ reference[1::2].T
+    ## the throughput batches repeat the faces up to the largest batch size
+    batch_faces = np.resize(faces, (max(BATCH_SIZES),) + faces.shape[1:])
+
+    failures = []
+    print(f"{'runtime':>10} {'min cos':>8} {'max pair diff':>13} " + " ".join(f"{f'b={b} f/s':>10}" for b in BATCH_SIZES))
+    rates = [throughput(keras_model.predict_on_batch, batch_faces, batch_size) for batch_size in BATCH_SIZES]
+    print(f"{'tensorflow':>10} {1.0:>8.5f} {0.0:>13.5f} " + " ".join(f"{rate:>10.1f}" for rate in rates))
+    for runtime in args.runtimes:
+        path = export_onnx_model(runtime, model_dir, keras_model, calibration_faces=calibration_faces)
+        model = OnnxEmbeddingModel(path, intra_op_threads=args.threads)
+        embeddings = normalize(model.predict_on_batch(faces))
+        min_cosine = float(np.min(np.sum(embeddings * reference, axis=1)))
+        pair_difference = float(np.max(np.abs(embeddings[::2] @ embeddings[1::2].T - reference_pairs)))
+        passed = 1 - min_cosine <= TOLERANCES[runtime] and pair_difference <= TOLERANCES[runtime]
+        if not passed:
+            failures.append(f"{runtime}: min cos {min_cosine:.5f}, max pair diff {pair_difference:.5f}")
+        rates = [throughput(model.predict_on_batch, batch_faces, batch_size) for batch_size in BATCH_SIZES]
+        print(
+            f"{runtime:>10} {min_cosine:>8.5f} {pair_difference:>13.5f} "
+            + " ".join(f"{rate:>10.1f}" for rate in rates)
+            + ("" if passed else f"  FAILED parity (tolerance {TOLERANCES[runtime]})")
+        )
+    assert not failures, "ONNX parity regression: " + "; ".join(failures)
+
+
+if __name__ == "__main__":
+    main()
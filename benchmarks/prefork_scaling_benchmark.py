@@ -0,0 +1,179 @@
+## Throughput of the face routes served by launcher.py with 1 to N workers, the memory the workers share with the
+#  parent (RSS against PSS) and the requests lost by a rolling restart (SIGHUP) under load.
+#  Usage: python benchmarks/prefork_scaling_benchmark.py [--workers 1 2 4] [--requests 64] [--frames 2]
+#  The requests are /application/identify uploads of random frames authenticated by a token signed with the
+#  SECRET_KEY of the launcher, so every worker accepts them without a shared database: each one runs the face
+#  detection of its frames and is answered 422 (no usable frame). The throughput only scales up to the cores.
+
+import argparse
+import asyncio
+import io
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+from jose import jwt
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from face_auth.config.cpu import available_cpus
+
+CORES = available_cpus()  ## the cores launcher.py splits between its workers
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, *[2 ** n for n in range(1, 8) if 2 ** n <= CORES]}))
+parser.add_argument("--requests", type=int, default=64)
+parser.add_argument("--concurrency", type=int, default=0, help="requests in flight, defaults to 2 per worker")
+parser.add_argument("--frames", type=int, default=2)
+parser.add_argument("--no-reload-check", action="store_true")
+args = parser.parse_args()
+
+ENV = dict(os.environ)
+ENV.setdefault("MONGODB_URL_KEY", "mongomock://localhost")
+ENV.setdefault("DATABASE_NAME", "prefork_scaling_benchmark")
+ENV.setdefault("USER_COLLECTION_NAME", "users")
+ENV.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+ENV.setdefault("SECRET_KEY", "benchmark")
+ENV.setdefault("ALGORITHM", "HS256")
+ENV.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+ENV["EARLY_EXIT_ENABLED"] = "False"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def memory_mb(pid: int) -> tuple:
+    """RSS and PSS of the process, the PSS splits the shared pages between the processes sharing them"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) / 1024
+    return values.get("Rss", 0.0), values.get("Pss", 0.0)
+
+
+def children(pid: int) -> list:
+    with open(f"/proc/{pid}/task/{pid}/children") as pids:
+        return [int(child) for child in pids.read().split()]
+
+
+def random_frames(count: int) -> list:
+    rng = np.random.default_rng(0)
+    uploads = []
+    for n in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)).save(buffer, "JPEG")
+        uploads.append(("files", (f"random{n}.jpg", buffer.getvalue(), "image/jpeg")))
+    return uploads
+
+
+class Launcher:
+    def __init__(self, workers: int) -> None:
+        self.port = free_port()
+        self.output = tempfile.NamedTemporaryFile("w+", suffix=".log")
+        self.process = subprocess.Popen(
+            [sys.executable, "launcher.py", "--workers", str(workers), "--port", str(self.port)],
+            cwd=ROOT, env=ENV, stdout=self.output, stderr=subprocess.DEVNULL,
+        )
+
+    def wait_for(self, text: str, timeout: float = 600) -> float:
+        start = time.monotonic()
+        while time.monotonic() - start < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"launcher exited with {self.process.returncode}")
+            self.output.seek(0)
+            if text in self.output.read():
+                return time.monotonic() - start
+            time.sleep(0.2)
+        raise RuntimeError(f"'{text}' not printed by the launcher after {timeout} s")
+
+    def stop(self) -> None:
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait()
+        self.output.close()
+
+
+async def load(port: int, requests: int, concurrency: int, frames: list, during=None) -> dict:
+    token = jwt.encode(
+        {"sub": "benchmark", "username": "benchmark", "exp": datetime.utcnow() + timedelta(hours=1)},
+        ENV["SECRET_KEY"], algorithm=ENV["ALGORITHM"],
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(client):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                status = (await client.post("/application/identify", files=frames)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", cookies={"access_token": token}, timeout=300
+    ) as client:
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(one(client)) for _ in range(requests)]
+        if during is not None:
+            await during()
+        await asyncio.gather(*tasks)
+        seconds = time.perf_counter() - start
+    return {
+        "requests_per_second": requests / seconds,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "statuses": statuses,
+    }
+
+
+def main() -> None:
+    frames = random_frames(args.frames)
+    print(f"cores={CORES}, {args.requests} requests of {args.frames} frames per worker count")
+    print(f"{'workers':>7} {'startup s':>9} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'RSS MB':>8} {'PSS MB':>8}  statuses")
+    for workers in args.workers:
+        launcher = Launcher(workers)
+        try:
+            startup = launcher.wait_for("workers ready")
+            concurrency = args.concurrency or 2 * workers
+            ## one warm up request per worker, the first requests of a worker trace the model graphs
+            asyncio.run(load(launcher.port, workers * 2, concurrency, frames))
+            result = asyncio.run(load(launcher.port, args.requests, concurrency, frames))
+            pids = [launcher.process.pid] + children(launcher.process.pid)
+            rss, pss = map(sum, zip(*(memory_mb(pid) for pid in pids)))
+            print(
+                f"{workers:>7} {startup:>9.1f} {result['requests_per_second']:>7.2f} {result['p50_ms']:>8.0f} "
+                f"{result['p95_ms']:>8.0f} {rss:>8.0f} {pss:>8.0f}  {result['statuses']}"
+            )
+            if workers == args.workers[-1] and not args.no_reload_check:
+
+                async def restart():
+                    await asyncio.sleep(1)
+                    launcher.process.send_signal(signal.SIGHUP)
+                    while "workers restarted" not in open(launcher.output.name).read():
+                        await asyncio.sleep(0.5)
+
+                requests = max(args.requests, 16 * workers)
+                result = asyncio.run(load(launcher.port, requests, concurrency, frames, restart))
+                lost = sum(count for status, count in result["statuses"].items() if status != 422)
+                print(f"rolling restart under load: {requests} requests, {lost} not served, {result['statuses']}")
+        finally:
+            launcher.stop()
+
+
+if __name__ == "__main__":
+    main()
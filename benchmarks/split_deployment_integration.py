@@ -0,0 +1,165 @@
+## Integration check of the split deployment: an inference worker (python -m face_auth.inference.inference_worker)
+#  and the API (uvicorn app:app with INFERENCE_EXECUTOR=remote) are started as subprocesses and driven over HTTP.
+#  Usage: python benchmarks/split_deployment_integration.py [--mongodb-url mongodb://localhost:27017] [--face-image a.jpg]
+#  It checks that the face routes are served by the worker, that the API process stays small (it never loads the
+#  models) and that the API reconnects to a restarted worker. Exits with 1 when a check fails.
+#  With the default in-process fake database (mongomock://) each process has its own data, so the embedding stored
+#  by the worker is not visible to the API: pass --mongodb-url and --face-image for the whole register/login flow.
+
+import argparse
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--mongodb-url", default="mongomock://localhost")
+parser.add_argument("--face-image", default=None, help="image of a face, random frames are sent without it")
+parser.add_argument("--startup-timeout", type=float, default=300)
+args = parser.parse_args()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def frames(count: int) -> list:
+    if args.face_image:
+        with open(args.face_image, "rb") as image:
+            content = image.read()
+        return [("files", (f"face{n}.jpg", content, "image/jpeg")) for n in range(count)]
+    rng = np.random.default_rng(0)
+    uploads = []
+    for n in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (240, 240, 3), dtype=np.uint8)).save(buffer, "JPEG")
+        uploads.append(("files", (f"random{n}.jpg", buffer.getvalue(), "image/jpeg")))
+    return uploads
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not up after {timeout} s")
+
+
+def wait_for_port(port: int, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"port {port} not open after {timeout} s")
+
+
+def main() -> int:
+    worker_port, api_port = free_port(), free_port()
+    env = dict(os.environ)
+    env.update(
+        MONGODB_URL_KEY=args.mongodb_url,
+        INFERENCE_EXECUTOR="remote",
+        INFERENCE_WORKER_ADDRESSES=f"127.0.0.1:{worker_port}",
+        PYTHONPATH=ROOT,
+    )
+    env.setdefault("DATABASE_NAME", "split_deployment_integration")
+    env.setdefault("USER_COLLECTION_NAME", "users")
+    env.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+    env.setdefault("SECRET_KEY", "integration")
+    env.setdefault("INFERENCE_WORKER_AUTHKEY", "integration-worker")
+    env.setdefault("ALGORITHM", "HS256")
+    worker_command = [sys.executable, "-m", "face_auth.inference.inference_worker", "--port", str(worker_port)]
+    api_command = [sys.executable, "-m", "uvicorn", "app:app", "--port", str(api_port), "--log-level", "warning"]
+
+    failures = []
+
+    def check(condition: bool, message: str) -> None:
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    worker = subprocess.Popen(worker_command, cwd=ROOT, env=env)
+    api = subprocess.Popen(api_command, cwd=ROOT, env=env)
+    base_url = f"http://127.0.0.1:{api_port}"
+    try:
+        start = time.monotonic()
+        ## the API startup waits for the worker, which listens once its models are loaded
+        wait_for(f"{base_url}/auth/", api, args.startup_timeout)
+        print(f"worker and API up in {time.monotonic() - start:.1f} s")
+        worker_rss, api_rss = rss_mb(worker.pid), rss_mb(api.pid)
+        print(f"resident memory: worker {worker_rss:.0f} MB, API {api_rss:.0f} MB")
+        check(api_rss < worker_rss / 2, "the API process does not hold the models")
+
+        client = httpx.Client(base_url=base_url, timeout=120)
+        name = uuid.uuid4().hex[:12]
+        email_id, password = f"{name}@integration.io", "Password123"
+        response = client.post("/auth/register", json={
+            "Name": "Integration", "username": name, "email_id": email_id, "ph_no": 1234567890,
+            "password1": password, "password2": password,
+        })
+        check(response.status_code == 200, f"registration {response.status_code}")
+        response = client.post("/application/register_embedding", files=frames(2))
+        expected = (200,) if args.face_image else (200, 422)
+        check(response.status_code in expected, f"register_embedding served by the worker {response.status_code}")
+
+        response = client.post("/auth/", json={"email_id": email_id, "password": password})
+        check(response.status_code == 200, f"login {response.status_code}")
+        response = client.post("/application/identify", files=frames(2))
+        check(response.status_code in expected, f"identify served by the worker {response.status_code} {response.json()}")
+        remote = client.get("/application/metrics").json()["executor"].get("remote", {})
+        check(remote.get("sent", 0) > 0, f"jobs sent to the worker {remote}")
+
+        ## a job sent while the worker is down fails fast instead of hanging the request
+        worker.terminate()
+        worker.wait()
+        start = time.monotonic()
+        response = client.post("/application/identify", files=frames(1))
+        check(response.status_code not in expected, f"identify without worker {response.status_code}")
+        check(time.monotonic() - start < 10, f"failed in {time.monotonic() - start:.1f} s")
+
+        ## the API connects again to the restarted worker
+        worker = subprocess.Popen(worker_command, cwd=ROOT, env=env)
+        wait_for_port(worker_port, worker, args.startup_timeout)
+        response = client.post("/application/identify", files=frames(1))
+        check(response.status_code in expected, f"identify after the worker restart {response.status_code}")
+        print(f"executor: {client.get('/application/metrics').json()['executor']}")
+    finally:
+        for process in (api, worker):
+            process.terminate()
+            process.wait()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
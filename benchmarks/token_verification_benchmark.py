@@ -0,0 +1,83 @@
+## Per request cost of the access token check of the protected routes: the previous get_current_user (the
+#  configuration read through CommonUtils and jwt.decode on every request), the token verifier on a first request
+#  (cache miss, jwt.decode) and on the next requests of the session (cache hit), plus the whole get_current_user
+#  dependency on a cookie request.
+#  Usage: python benchmarks/token_verification_benchmark.py [--requests 20000] [--sessions 100]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=20000)
+parser.add_argument("--sessions", type=int, default=100)
+args = parser.parse_args()
+
+os.environ.setdefault("MONGODB_URL_KEY", "mongomock://localhost")
+os.environ.setdefault("DATABASE_NAME", "token_verification_benchmark")
+os.environ.setdefault("USER_COLLECTION_NAME", "users")
+os.environ.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from jose import jwt
+from starlette.requests import Request
+
+from controller.auth_controller.authentication import create_access_token, get_current_user
+from face_auth.business_val.token_verifier import TokenVerifier
+from face_auth.utils.util import CommonUtils
+
+
+def legacy_verify(token):
+    ## what get_current_user did before: configuration lookup and signature check on every request
+    secret_key = CommonUtils().get_environment_variable("SECRET_KEY")
+    algorithm = CommonUtils().get_environment_variable("ALGORITHM")
+    payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+    return {"uuid": payload.get("sub"), "username": payload.get("username")}
+
+
+def cookie_request(token):
+    return Request({"type": "http", "headers": [(b"cookie", f"access_token={token}".encode())]})
+
+
+def measure(function, tokens):
+    start = time.perf_counter()
+    for n in range(args.requests):
+        function(tokens[n % len(tokens)])
+    return 1e6 * (time.perf_counter() - start) / args.requests
+
+
+def main():
+    tokens = [create_access_token(str(n), f"user{n}", timedelta(minutes=15)) for n in range(args.sessions)]
+    timings = {"legacy (decode per request)": measure(legacy_verify, tokens)}
+
+    ## a fresh verifier per request: every call is the first request of its session
+    timings["verifier miss"] = measure(lambda token: TokenVerifier().verify(token), tokens)
+
+    verifier = TokenVerifier()
+    for token in tokens:
+        verifier.verify(token)
+    timings["verifier hit"] = measure(verifier.verify, tokens)
+
+    ## the dependency as the routes resolve it, the shared verifier warmed by the first requests
+    requests = [cookie_request(token) for token in tokens]
+    loop = asyncio.new_event_loop()
+    for request in requests:
+        loop.run_until_complete(get_current_user(request))
+    timings["get_current_user (hit)"] = measure(lambda request: loop.run_until_complete(get_current_user(request)), requests)
+    loop.close()
+
+    print(f"{args.requests} requests over {args.sessions} sessions")
+    print(f"{'path':<30} {'us/request':>11}")
+    for name, micro_seconds in timings.items():
+        print(f"{name:<30} {micro_seconds:>11.1f}")
+    print(f"verifier stats: {verifier.stats()}")
+
+
+if __name__ == "__main__":
+    main()
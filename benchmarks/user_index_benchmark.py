@@ -0,0 +1,114 @@
+## Latency of the registration duplicate check, the login lookup and the embedding lookup on a collection of
+#  synthetic users, without indexes (collection scans) and with the indexes of face_auth.data_access.indexes.
+#  Usage: python benchmarks/user_index_benchmark.py [--mongodb-url mongodb://localhost:27017] [--size 1000000]
+#  The benchmark writes to its own database (user_index_benchmark) and drops it at the end. mongomock:// urls
+#  work for a smoke test with a small --size, mongomock has no index so both columns are scans.
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+parser.add_argument("--size", type=int, default=1_000_000)
+parser.add_argument("--queries", type=int, default=200)
+args = parser.parse_args()
+
+os.environ["MONGODB_URL_KEY"] = args.mongodb_url
+os.environ["DATABASE_NAME"] = "user_index_benchmark"
+os.environ.setdefault("USER_COLLECTION_NAME", "users")
+os.environ.setdefault("EMBEDDING_COLLECTION_NAME", "embeddings")
+
+from pymongo.errors import DuplicateKeyError
+
+from face_auth.business_val.user_val import RegisterValidation
+from face_auth.config.database import MongodbClient
+from face_auth.data_access.indexes import ensure_indexes
+from face_auth.data_access.user_data import UserData
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.entity.user import User
+
+
+def populate(user_data, user_embedding_data, size, batch_size=10_000):
+    rng = np.random.default_rng(0)
+    uuids = []
+    for start in range(0, size, batch_size):
+        batch = [str(uuid.UUID(int=int(rng.integers(1 << 62)) << 64 | row)) for row in range(start, min(size, start + batch_size))]
+        user_data.collection.insert_many(
+            [{"UUID": uuid_, "username": f"user{uuid_[:18]}", "email_id": f"{uuid_[:18]}@bench.io",
+              "Name": "Bench", "ph_no": 1234567890, "password": "x" * 60} for uuid_ in batch],
+            ordered=False,
+        )
+        user_embedding_data.insert_embeddings(batch, rng.standard_normal((len(batch), 128), dtype=np.float32))
+        uuids += batch
+    return uuids
+
+
+def lookups(user_data, user_embedding_data, uuids, queries):
+    rng = np.random.default_rng(1)
+    picked = [uuids[row] for row in rng.integers(0, len(uuids), queries)]
+    timings = {}
+    start = time.perf_counter()
+    for uuid_ in picked:  ## a new user, every clause misses: the worst case of the duplicate check
+        user = User("Bench", f"new{uuid_[:18]}", f"new{uuid_[:18]}@bench.io", 1, "password123", "password123")
+        RegisterValidation(user).is_details_exists()
+    timings["duplicate check ($or)"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for uuid_ in picked:
+        user_data.get_user({"email_id": f"{uuid_[:18]}@bench.io"}, {"_id": 0, "UUID": 1, "password": 1})
+    timings["login lookup"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for uuid_ in picked:
+        user_embedding_data.fetch_user_embedding_array(uuid_)
+    timings["embedding lookup"] = time.perf_counter() - start
+    return {name: 1000 * seconds / queries for name, seconds in timings.items()}
+
+
+def plan(collection, query):
+    ## winning plan stage of the query, COLLSCAN or IXSCAN (under FETCH)
+    try:
+        winning = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+    except Exception:
+        return "n/a"
+    stages = []
+    while winning:
+        stages.append(winning.get("stage"))
+        winning = winning.get("inputStage") or (winning.get("inputStages") or [None])[0]
+    return ">".join(filter(None, stages))
+
+
+def main():
+    user_data, user_embedding_data = UserData(), UserEmbeddingData()
+    MongodbClient.client.drop_database("user_index_benchmark")
+    start = time.perf_counter()
+    uuids = populate(user_data, user_embedding_data, args.size)
+    print(f"inserted {args.size} users in {time.perf_counter() - start:.1f} s")
+
+    without = lookups(user_data, user_embedding_data, uuids, args.queries)
+    print(f"plan without indexes: {plan(user_data.collection, {'email_id': 'x'})}")
+    start = time.perf_counter()
+    print(f"indexes: {ensure_indexes(user_data, user_embedding_data)} in {time.perf_counter() - start:.1f} s")
+    with_indexes = lookups(user_data, user_embedding_data, uuids, args.queries)
+    print(f"plan with indexes:    {plan(user_data.collection, {'email_id': 'x'})}")
+
+    print(f"{'query':<24} {'no index ms':>12} {'indexed ms':>12}")
+    for name in without:
+        print(f"{name:<24} {without[name]:>12.3f} {with_indexes[name]:>12.3f}")
+
+    ## the unique index rejects a second user with a taken email id even without the duplicate check
+    try:
+        user_data.save_user({"UUID": str(uuid.uuid4()), "username": "taken", "email_id": f"{uuids[0][:18]}@bench.io"})
+        print("duplicate email id accepted, the unique index is missing")
+    except DuplicateKeyError:
+        print("duplicate email id rejected by the unique index")
+    MongodbClient.client.drop_database("user_index_benchmark")
+
+
+if __name__ == "__main__":
+    main()
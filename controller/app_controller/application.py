@@ -1,15 +1,42 @@
+import asyncio
 import os
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, File, Request
+import numpy as np
+
+from fastapi import APIRouter, Depends, File, Query, Request, UploadFile
 from starlette import status
 from starlette.responses import JSONResponse, RedirectResponse
 
+from controller.app_controller.frame_upload import (
+    UploadTooLarge,
+    check_upload_sizes,
+    read_frame,
+    upload_too_large_response,
+)
 from controller.auth_controller.authentication import get_current_user
 from face_auth.business_val.user_embedding_val import (
-    UserLoginEmbeddingValidation,
     UserRegisterEmbeddingValidation,
+    compare_user_embedding_list,
+    extract_gated_faces,
+    represent_faces,
+    verify_user_embedding_list,
+)
+from face_auth.business_val.password_hasher import password_hasher
+from face_auth.business_val.token_verifier import token_verifier
+from face_auth.business_val.user_identification_val import identify_users
+from face_auth.constant.embedding_constants import IDENTIFICATION_MAX_TOP_K, IDENTIFICATION_TOP_K
+from face_auth.constant.inference_constants import (
+    EARLY_EXIT_BATCH_SIZE,
+    EARLY_EXIT_ENABLED,
+    MICRO_BATCH_ENABLED,
 )
+from face_auth.config.database.pool_metrics import pool_metrics
+from face_auth.data_access.embedding_cache import embedding_cache
+from face_auth.data_access.repository import Repository, get_repository
+from face_auth.inference.inference_executor import InferenceQueueFull, inference_executor
+from face_auth.inference.micro_batcher import EmbeddingMicroBatcher
+from face_auth.scoring.early_exit import Verification
 
 router = APIRouter(
     prefix="/application",
@@ -19,6 +46,99 @@ router = APIRouter(
 
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1" 
 
+## coalesces the faces of concurrent requests into a single Facenet inference
+embedding_batcher = EmbeddingMicroBatcher(represent_faces)
+
+
+async def embed_files(files: List[UploadFile], offset: int = 0) -> Tuple[list, List[dict]]:
+    """Generates the embeddings of the uploaded images without blocking the event loop
+
+    Args:
+        files (List[UploadFile]): spooled uploaded images
+        offset (int, optional): position of the first image in the request, used in the rejections
+
+    Returns:
+        tuple: one embedding per image accepted by the quality gate, and the rejected images with the reason
+    """
+    ## every frame is decoded and reduced to its face crop on its own, then its spooled file is closed, so
+    # only one decoded frame per request is alive at a time and no raw bytes are kept after the decode
+    in_process = inference_executor.kind == "thread"
+    faces, rejections = [], []
+    for index, file in enumerate(files):
+        frame = await read_frame(file, in_process)
+        frame_faces, reasons = await inference_executor.run(extract_gated_faces, [frame])
+        del frame
+        await file.close()
+        faces.append(frame_faces)
+        if reasons[0] is not None:
+            ## the rejected frames skip the embedding model
+            rejections.append({"frame": offset + index, "filename": file.filename, "reason": reasons[0]})
+    if len(rejections) == len(files):
+        return [], rejections
+    faces = np.concatenate(faces, axis=0)
+    if MICRO_BATCH_ENABLED:
+        ## the embedding model runs on the batch shared with other requests
+        return list(await embedding_batcher.embed(faces)), rejections
+    return list(await inference_executor.run(represent_faces, faces)), rejections
+
+
+async def verify_files(
+    uuid: str, files: List[UploadFile], db_embedding: np.ndarray
+) -> Tuple[Verification, List[dict]]:
+    """Embeds the uploaded images EARLY_EXIT_BATCH_SIZE at a time and stops once the login decision is settled
+
+    Args:
+        uuid (str): uuid of the user
+        files (List[UploadFile]): spooled uploaded images
+        db_embedding (np.ndarray): normalized stored embedding of the user, handed to every early-exit decision
+            instead of being looked up again in the inference executor
+
+    Returns:
+        tuple: decision with the number of frames actually embedded, and the frames rejected by the quality gate
+    """
+    embedding_list, rejections = [], []
+    verification = Verification(False, True, 0, 0.0)
+    for start in range(0, len(files), EARLY_EXIT_BATCH_SIZE):
+        embeddings, rejected = await embed_files(files[start : start + EARLY_EXIT_BATCH_SIZE], start)
+        embedding_list += embeddings
+        rejections += rejected
+        if not embedding_list:
+            continue
+        usable_frames = len(files) - len(rejections)
+        verification = await inference_executor.run(
+            verify_user_embedding_list, uuid, embedding_list, usable_frames, db_embedding
+        )
+        if verification.settled:
+            break
+    return verification, rejections
+
+
+def no_usable_frame_response(rejections: List[dict]) -> JSONResponse:
+    """Response sent when the quality gate rejected every uploaded frame"""
+    msg = "No uploaded frame is usable, please retake the pictures"
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"status": False, "message": msg, "rejected_frames": rejections},
+    )
+
+
+def busy_response() -> JSONResponse:
+    """Response sent when the inference executor already holds the maximum number of jobs"""
+    msg = "Server is busy, please try again"
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": False, "message": msg},
+    )
+
+
+def timeout_response() -> JSONResponse:
+    """Response sent when the face inference did not finish within the configured timeout"""
+    msg = "Face inference timed out"
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"status": False, "message": msg},
+    )
+
 ### after the manual login process we will bw redirected to login embedding
 # code using the FastAPI library, which implements a REST API endpoint for user authentication based on face embedding.
 @router.post("/") # line defines a POST HTTP method on the root URL ("/") of the API, with the router object being a FastAPI Router instance.
@@ -27,7 +147,9 @@ async def login_embedding( ## this is the main function for the endpoint, with t
                         #request: the FastAPI Request object for the incoming request.
                         #files: a list of uploaded files in binary format, described as "Multiple files as UploadFile".
     request: Request,
-    files: List[bytes] = File(description="Multiple files as UploadFile"),
+    files: List[UploadFile] = File(description="Multiple files as UploadFile"),
+    repository: Repository = Depends(get_repository),
+    user: Optional[dict] = Depends(get_current_user),
 ):
     """This function is used to get the embedding of the user while login
 
@@ -40,22 +162,37 @@ async def login_embedding( ## this is the main function for the endpoint, with t
     """
 
     try:
-        user = await get_current_user(request) ## gets the current user information by calling the get_current_user function and passing the request object.
+        ## user is the current user information, resolved from the access token cookie by the get_current_user dependency
         if user is None: #if the user is not found, a redirect response to the "/auth" URL is returned with a 302 status code.
             return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
 
-        user_embedding_validation = UserLoginEmbeddingValidation(user["uuid"]) ## creates an instance of the
-# UserLoginEmbeddingValidation class with the user's unique identifier (UUID).
-
+        check_upload_sizes(files)
+        ## the stored embedding is read once per request, without blocking the event loop, and before any
+        # inference: a user without a registered face is refused without embedding a single frame
+        db_embedding = await repository.embeddings.get_user_embedding_array(user["uuid"])
         # Compare embedding
-        user_simmilariy_status = user_embedding_validation.compare_embedding(files)# calls the compare_embedding
-# method on the user_embedding_validation instance to compare the face embedding of the uploaded files with the stored embedding of the user.
+        if db_embedding is None:
+            user_simmilariy_status, frames_used, rejections = False, 0, []
+        elif EARLY_EXIT_ENABLED:
+            ## the remaining frames are not embedded once the running score settles the decision
+            verification, rejections = await verify_files(user["uuid"], files, db_embedding)
+            user_simmilariy_status, frames_used = verification.authenticated, verification.frames_used
+        else:
+            embedding_list, rejections = await embed_files(files)
+            frames_used = len(embedding_list)
+        if frames_used == 0 and db_embedding is not None:
+            return no_usable_frame_response(rejections)
+        if db_embedding is not None and not EARLY_EXIT_ENABLED:
+            user_simmilariy_status = await inference_executor.run(compare_user_embedding_list, user["uuid"], embedding_list, db_embedding) ## runs
+# UserLoginEmbeddingValidation.compare_embedding_list in the inference executor so the event loop keeps serving other requests
+# while the face embedding of the uploaded files is compared with the stored embedding of the user.
 
         if user_simmilariy_status: ## if the embeddings match, a JSON response with status code 200 and a
         # message indicating successful authentication is returned.
             msg = "User is authenticated"
             response = JSONResponse(
-                status_code=status.HTTP_200_OK, content={"status": True, "message": msg}
+                status_code=status.HTTP_200_OK,
+                content={"status": True, "message": msg, "frames_used": frames_used, "rejected_frames": rejections},
             )
             return response
         else:
@@ -63,9 +200,15 @@ async def login_embedding( ## this is the main function for the endpoint, with t
             response = JSONResponse( ##if the embeddings do not match, a JSON response with status code 401 and 
             #a message indicating unsuccessful authentication is returned.
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                content={"status": False, "message": msg},
+                content={"status": False, "message": msg, "frames_used": frames_used, "rejected_frames": rejections},
             )
             return response
+    except UploadTooLarge as e:
+        return upload_too_large_response(str(e))
+    except InferenceQueueFull:
+        return busy_response()
+    except asyncio.TimeoutError:
+        return timeout_response()
     except Exception as e:
         msg = "Error in Login Embedding in Database"
         response = JSONResponse( #an exception occurs, a JSON response with status code 404 and an error message is returned.
@@ -78,7 +221,8 @@ async def login_embedding( ## this is the main function for the endpoint, with t
 @router.post("/register_embedding")
 async def register_embedding(  ##  function register_embedding takes two arguments, request and files. 
     request: Request,   ## request is a Request object, and files is a list of binary files that are uploaded by the user.
-    files: List[bytes] = File(description="Multiple files as UploadFile"),
+    files: List[UploadFile] = File(description="Multiple files as UploadFile"),
+    repository: Repository = Depends(get_repository),
 ):
     """This function is used to get the embedding of the user while register
 
@@ -96,19 +240,28 @@ async def register_embedding(  ##  function register_embedding takes two argumen
         if uuid is None:
             return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND) ##checks if the UUID is present
             # in the session. If it's not present, the function returns a redirect to the "/auth" endpoint with a 302 Found HTTP status code.
-        user_embedding_validation = UserRegisterEmbeddingValidation(uuid) ##creates an instance of the UserRegisterEmbeddingValidation class and passes the UUID as an argument.
-
-        # saves the user's embeddings to the database.
-        user_embedding_validation.save_embedding(files)
+        check_upload_sizes(files)
+        # the embeddings are computed in the inference executor, then saved from this process so the embedding
+        # cache of the logins is invalidated here, whatever the kind of the executor
+        embedding_list, rejections = await embed_files(files)
+        if not embedding_list:
+            return no_usable_frame_response(rejections)
+        await UserRegisterEmbeddingValidation(uuid).save_embedding_list_async(embedding_list, repository.embeddings)
 #If the embeddings are saved successfully, the function returns a JSONResponse object with a 200 OK HTTP status code
 #  and a message that says "Embedding Stored Successfully in Database". The UUID is also included in the headers
         msg = "Embedding Stored Successfully in Database"
         response = JSONResponse(
             status_code=status.HTTP_200_OK,
-            content={"status": True, "message": msg},
+            content={"status": True, "message": msg, "rejected_frames": rejections},
             headers={"uuid": uuid},
         )
         return response
+    except UploadTooLarge as e:
+        return upload_too_large_response(str(e))
+    except InferenceQueueFull:
+        return busy_response()
+    except asyncio.TimeoutError:
+        return timeout_response()
     except Exception as e:
 ## If there is an error in storing the embeddings, the function returns a JSONResponse object with a 404 Not Found
 #  HTTP status code and a message that says "Error in Storing Embedding in Database"
@@ -120,9 +273,71 @@ async def register_embedding(  ##  function register_embedding takes two argumen
         return response
 
 
+@router.post("/identify")
+async def identify_embedding(
+    request: Request,
+    files: List[UploadFile] = File(description="Multiple files as UploadFile"),
+    top_k: int = Query(IDENTIFICATION_TOP_K, ge=1, le=IDENTIFICATION_MAX_TOP_K),
+    user: Optional[dict] = Depends(get_current_user),
+):
+    """This function is used to find the registered users most similar to the uploaded faces
 
+    Args:
+        request (Request): Request from the route
+        files (List[UploadFile], optional): Bytes of images. Defaults to \File(description="Multiple files as UploadFile").
+        top_k (int, optional): number of users to return, 1 to IDENTIFICATION_MAX_TOP_K. Defaults to IDENTIFICATION_TOP_K.
 
+    Returns:
+        response: the top_k users with their cosine similarity
+    """
+    try:
+        if user is None:
+            return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
 
+        check_upload_sizes(files)
+        embedding_list, rejections = await embed_files(files)
+        if not embedding_list:
+            return no_usable_frame_response(rejections)
+        ## the search runs next to the inference, the index is loaded lazily by the first identification
+        matches = await inference_executor.run(identify_users, embedding_list, top_k)
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"status": True, "matches": matches, "rejected_frames": rejections},
+        )
+    except UploadTooLarge as e:
+        return upload_too_large_response(str(e))
+    except InferenceQueueFull:
+        return busy_response()
+    except asyncio.TimeoutError:
+        return timeout_response()
+    except Exception as e:
+        msg = "Error in Identifying User"
+        response = JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={"status": False, "message": msg},
+        )
+        return response
 
 
+@router.get("/metrics")
+async def inference_metrics(user: Optional[dict] = Depends(get_current_user)):
+    """Route exposing the metrics of the inference executor, the micro-batcher, the embedding cache and the
+    MongoDB connection pool, the password hasher and the token verifier. Like the other routes it requires the
+    access token, the metrics describe the load and the configuration of the deployment.
 
+    Returns:
+        JSONResponse: queue depth, batch size histogram, wait times, cache hit/miss and pool counters
+    """
+    if user is None:
+        return RedirectResponse(url="/auth", status_code=status.HTTP_302_FOUND)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "executor": inference_executor.stats(),
+            "micro_batcher": embedding_batcher.stats(),
+            "embedding_cache": embedding_cache.stats(),
+            "mongodb_pool": pool_metrics.stats(),
+            "token_verifier": token_verifier.stats(),
+            "password_hasher": password_hasher.stats(),
+        },
+    )
@@ -0,0 +1,68 @@
+## Streaming ingestion of the uploaded frames. The multipart parser spools every frame to a temporary file
+#  (in memory up to 1MB, on disk above), the frames are then checked against the size limits and handed to
+#  the inference one at a time, so a request never holds the raw bytes of all its frames in memory.
+
+import os
+from typing import List
+
+from fastapi import UploadFile
+from starlette import status
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from face_auth.constant.upload_constants import (
+    MAX_FRAME_SIZE_BYTES,
+    MAX_FRAMES_PER_REQUEST,
+    MAX_REQUEST_SIZE_BYTES,
+)
+
+
+class UploadTooLarge(Exception):
+    """Raised when the uploaded frames exceed the per-frame or per-request limits"""
+
+
+def upload_too_large_response(message: str = "Uploaded frames are too large") -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={"status": False, "message": message},
+    )
+
+
+def file_size(file: UploadFile) -> int:
+    """Size of a spooled upload, read from the file position without loading it"""
+    size = file.file.seek(0, os.SEEK_END)
+    file.file.seek(0)
+    return size
+
+
+def check_upload_sizes(files: List[UploadFile]) -> None:
+    """Raises UploadTooLarge when a frame or the whole request is above the configured limits"""
+    if len(files) > MAX_FRAMES_PER_REQUEST:
+        raise UploadTooLarge(f"At most {MAX_FRAMES_PER_REQUEST} frames can be uploaded")
+    total_size = 0
+    for file in files:
+        size = file_size(file)
+        if size > MAX_FRAME_SIZE_BYTES:
+            raise UploadTooLarge(f"Frame {file.filename} is larger than {MAX_FRAME_SIZE_BYTES} bytes")
+        total_size += size
+    if total_size > MAX_REQUEST_SIZE_BYTES:
+        raise UploadTooLarge(f"Uploaded frames are larger than {MAX_REQUEST_SIZE_BYTES} bytes")
+
+
+async def read_frame(file: UploadFile, in_process: bool):
+    """Returns what the inference decodes: the spooled file itself when the inference runs in this process,
+    its bytes when it runs in a worker process since file objects cannot be sent to it"""
+    if in_process:
+        file.file.seek(0)
+        return file.file
+    return await file.read()
+
+
+class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
+    """Rejects the requests announcing a body larger than MAX_REQUEST_SIZE_BYTES before it is parsed"""
+
+    async def dispatch(self, request, call_next):
+        content_length = request.headers.get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > MAX_REQUEST_SIZE_BYTES:
+            return upload_too_large_response()
+        return await call_next(request)
@@ -4,13 +4,16 @@
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from starlette.responses import JSONResponse, RedirectResponse
 
+from face_auth.business_val.password_hasher import PasswordHasherBusy
+from face_auth.business_val.token_verifier import token_verifier
 from face_auth.business_val.user_val import LoginValidation, RegisterValidation
 from face_auth.constant.auth_constant import ALGORITHM, SECRET_KEY
+from face_auth.data_access.repository import Repository, get_repository
 from face_auth.entity.user import User
 
 ## Defines the Login and Register data models. These classes define the expected inputs for the authentication APIs.
@@ -47,42 +50,38 @@ router = APIRouter(
 # Calloging the logger for Database read and insert operations
 
 
-async def get_current_user(request: Request):
-    """This function is used to get the current user
+async def get_current_user(request: Request) -> Optional[dict]:
+    """FastAPI dependency of the protected routes returning the user of the access token cookie, e.g.
+    `user: Optional[dict] = Depends(get_current_user)`. The token is verified by the token verifier, which
+    caches the claims of the tokens it already verified until they expire.
 
     Args:
         request (Request): Request from the route
 
+    Raises:
+        HTTPException: 404 when the token is invalid or expired
+
     Returns:
-        dict: Returns the username and uuid of the user
+        dict: Returns the username and uuid of the user, None when there is no usable token
     """
+    ## access_token is retrieved from the cookies in the request
+    token = request.cookies.get("access_token")
+    if token is None:
+        return None ## If the token is None, the function returns None
     try:
-        ## try block is used to handle exceptions that might occur while getting the current user.
-        ## secret_key and algorithm are assigned values from SECRET_KEY and ALGORITHM respectively.
-        secret_key = SECRET_KEY
-        algorithm = ALGORITHM
-        ## access_token is retrieved from the cookies in the request using request.cookies.get("access_token")
-        token = request.cookies.get("access_token")
-        if token is None:
-            return None ## If the token is None, the function returns None
-
-        ## The payload of the token is decoded using jwt.decode(token, secret_key, algorithms=[algorithm]).
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
-        ## uuid and username are extracted from the payload using payload.get("sub") and payload.get("username") respectively.
-        uuid: str = payload.get("sub")
-        username: str = payload.get("username")
-        ## uuid or username is None, the function calls logout(request) and returns its result.
-        if uuid is None or username is None:
-            return logout(request)
-        return {"uuid": uuid, "username": username} ## uuid and username are not None, a dictionary with uuid and username as keys is returned.
+        ## None when the token lacks the uuid or the username, the route then redirects to the login
+        return token_verifier.verify(token)
     except JWTError:
         raise HTTPException(status_code=404, detail="Detail Not Found") #JWTError is caught, an HTTPException with a status code of 404 and detail "Detail Not Found" is raised.
-    except Exception as e: ## If any other exception occurs, an error message is created and a JSONResponse object with the error message and a status code of 404 is returned.
-        msg = "Error while getting current user"
-        response = JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND, content={"message": msg}
-        )
-        return response
+
+
+def password_hasher_busy_response() -> JSONResponse:
+    """Response sent when the password hasher already holds the maximum number of jobs"""
+    msg = "Server is busy, please try again"
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": False, "message": msg},
+    )
 
 ## The function create_access_token generates a JSON Web Token (JWT) given the uuid and username of a user.
 def create_access_token(
@@ -123,7 +122,9 @@ def create_access_token(
 
 ## defines a FastAPI route that implements a login logic for obtaining an access token.
 @router.post("/token")#decorator "@router.post("/token")" that maps the route to the function defined below it. The "/token" URL endpoint will be accessible using HTTP POST method.
-async def login_for_access_token(response: Response, login) -> dict:  ##The function "login_for_access_token" 
+async def login_for_access_token(
+    response: Response, login, repository: Repository = Depends(get_repository)
+) -> dict:  ##The function "login_for_access_token" 
 #takes two arguments "response" and "login", where "response" is an instance of the Response class and "login" is 
 #an instance of the "Login" class defined elsewhere. The function returns a dictionary with three keys: "status", "uuid" and "response".
 
@@ -137,8 +138,8 @@ async def login_for_access_token(response: Response, login) -> dict:  ##The func
         user_validation = LoginValidation(login.email_id, login.password) ##instance of the LoginValidation class
         # is created with the "email_id" and "password" from the "login" argument.
 
-        user: Optional[str] = user_validation.authenticate_user_login() ## in instance user the output of
-# authenticate_user_login() authenticates the user and returns the token if the user is authenticated
+        user: Optional[str] = await user_validation.authenticate_user_login_async(repository.users) ## in instance user the output of
+# authenticate_user_login_async() authenticates the user, the database lookup does not block the event loop
         if not user: ## If the user credentials are not valid, returns a dictionary 
             return {"status": False, "uuid": None, "response": response} 
         token_expires = timedelta(minutes=15) ## The token expiration time is set to 15 minutes
@@ -152,6 +153,8 @@ async def login_for_access_token(response: Response, login) -> dict:  ##The func
 #  It helps in improving the security of the application.
         return {"status": True, "uuid": user["UUID"], "response": response} ## Returns the dictionary
 #{"status": True, "uuid": user["UUID"], "response": response} indicating the success of setting the access token, along with the user's UUID and the response object.
+    except PasswordHasherBusy:  ## not a failed login, the handler answers 503
+        raise
     except Exception as e:
         msg = "Failed to set access token"
         response = JSONResponse( ## n case of any exceptions, sets the response status to HTTP_404_NOT_FOUND 
@@ -178,7 +181,7 @@ async def authentication_page(request: Request): ##The function takes a single a
 
 ## code is a FastAPI route handler for handling POST requests to the "/" endpoint.
 @router.post("/", response_class=JSONResponse) ##the response type will be of JSONResponse.
-async def login(request: Request, login: Login): ## The function takes in two arguments, request of type Request and login of type Login.
+async def login(request: Request, login: Login, repository: Repository = Depends(get_repository)): ## The function takes in two arguments, request of type Request and login of type Login.
     """Route for User Login
 
     Returns:
@@ -190,7 +193,7 @@ async def login(request: Request, login: Login): ## The function takes in two ar
         response = JSONResponse(  ##  line creates a JSONResponse object with a status code of HTTP_200_OK and a content of {"message": "Login Successful"}.
             status_code=status.HTTP_200_OK, content={"message": msg}
         )
-        token_response = await login_for_access_token(response=response, login=login) ##calls the function 
+        token_response = await login_for_access_token(response=response, login=login, repository=repository) ##calls the function 
         # login_for_access_token and awaits its response. The function takes in two arguments, response and login.
         if not token_response["status"]: ## checks if the value of the "status" key in token_response is False.
             msg = "Incorrect Username and password" ## if statement evaluates to True, the value of msg is set to "Incorrect Username and password"
@@ -206,6 +209,8 @@ async def login(request: Request, login: Login): ## The function takes in two ar
 
         return response ## if statement evaluates to False, this line returns the response object.
 
+    except PasswordHasherBusy:
+        return password_hasher_busy_response()
     except HTTPException: ## This block catches any exception of type HTTPException.
         msg = "UnKnown Error" ## value of msg to "UnKnown Error".
         return JSONResponse(    ## This line returns a JSONResponse object with a status code 
@@ -241,7 +246,9 @@ async def authentication_page(request: Request): ## function takes a single argu
 
 ## code block defines a FastAPI endpoint for registering a new user.
 @router.post("/register", response_class=JSONResponse) ##It starts with the "@router.post" decorator which maps this function to the /register endpoint for HTTP POST requests.
-async def register_user(request: Request, register: Register): ## It takes two arguments: "request" and
+async def register_user(
+    request: Request, register: Register, repository: Repository = Depends(get_repository)
+): ## It takes two arguments: "request" and
     # "register". "request" is a standard FastAPI request object, while "register" is a Pydantic model 
     # representing the information that the user provides during registration.
 
@@ -275,23 +282,20 @@ async def register_user(request: Request, register: Register): ## It takes two a
         user = User(name, username, email_id, ph_no, password1, password2)
         request.session["uuid"] = user.uuid_
 
-        #user information is then passed to a RegisterValidation object for validation by calling the validate_registration method.
-        user_registration = RegisterValidation(user)
+        #user information is then passed to a RegisterValidation object, which validates it and saves the user
+        # when the validation is successful. The database calls are awaited, they do not block the event loop.
+        user_registration = RegisterValidation(user, repository.users)
+        validation_status = await user_registration.authenticate_user_registration_async()
         #If the validation fails, a JSONResponse object with status code 401 (Unauthorized) is returned, along
         #  with an error message indicating why the validation failed.
-        validate_regitration = user_registration.validate_registration()
-        if not validate_regitration["status"]:
-            msg = validate_regitration["msg"]
+        if not validation_status["status"]:
+            msg = validation_status["msg"]
             response = JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 content={"status": False, "message": msg},
             )
             return response
 
-        # Save user if the validation is successful
-        validation_status = user_registration.authenticate_user_registration()
-        ## If the validation is successful, the authenticate_user_registration method is called to save the user
-        # information to the database.
         msg = "Registration Successful...Please Login to continue"
         ##the user is successfully registered, a JSONResponse object with status code 200 (OK) is returned,
         # along with a message indicating that the registration was successful. The UUID of the user is also returned in the headers.
@@ -301,6 +305,8 @@ async def register_user(request: Request, register: Register): ## It takes two a
             headers={"uuid": user.uuid_},
         )
         return response
+    except PasswordHasherBusy:
+        return password_hasher_busy_response()
     except Exception as e:
         raise e
 
@@ -0,0 +1,112 @@
+## Password hashing of the logins and registrations. bcrypt is slow by design (hundreds of milliseconds at
+#  12 rounds), so the async handlers run it on a dedicated bounded thread pool: bcrypt releases the GIL, the event
+#  loop keeps serving requests and several hashes run in parallel on several cores.
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from face_auth.constant.auth_constant import BCRYPT_ROUNDS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_WORKERS
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hasher already holds the maximum number of pending hash jobs"""
+
+
+class PasswordHasher:
+    """Shared bcrypt context and the bounded thread pool running it.
+
+    Args:
+        rounds (int): bcrypt cost of the new hashes
+        max_workers (int): threads hashing passwords
+        max_pending (int): maximum number of running plus waiting jobs
+    """
+
+    def __init__(
+        self,
+        rounds: int = BCRYPT_ROUNDS,
+        max_workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ) -> None:
+        self.rounds = rounds
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=rounds)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rehashed = 0
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        return self.context.hash(password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether the hash uses a deprecated scheme or another cost than the configured rounds"""
+        if self.context.needs_update(hashed_password):
+            return True
+        return self.context.handler("bcrypt").from_string(hashed_password).rounds != self.rounds
+
+    def verify_and_rehash(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verifies the password and hashes it again when the stored hash has another cost
+
+        Args:
+            password (str): plain password
+            hashed_password (str): stored hash
+
+        Returns:
+            tuple: whether the password matches, and the new hash to store or None
+        """
+        if not self.context.verify(password, hashed_password):
+            return False, None
+        if self.needs_rehash(hashed_password):
+            with self._lock:
+                self.rehashed += 1
+            return True, self.hash(password)
+        return True, None
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, function, *args):
+        """Runs function(*args) on the hashing threads and waits for its result
+
+        Raises:
+            PasswordHasherBusy: the hasher already holds max_pending jobs
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PasswordHasherBusy(f"{self.pending} password hash jobs are already pending")
+            self.pending += 1
+        try:
+            future = self.pool.submit(function, *args)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def hash_async(self, password: str) -> str:
+        return await self.run(self.hash, password)
+
+    async def verify_and_rehash_async(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self.run(self.verify_and_rehash, password, hashed_password)
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "rehashed": self.rehashed,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,81 @@
+## Verification of the access token cookie of the protected routes. The signature check and the claims parsing
+#  of jwt.decode run once per token: the verified claims are cached under the SHA-256 of the token until the
+#  exp claim of the token, so the next requests of the session only pay a hash and a dictionary lookup.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from jose import jwt
+
+from face_auth.config.settings import require_auth_settings
+from face_auth.constant.auth_constant import ALGORITHM, SECRET_KEY
+from face_auth.constant.cache_constants import TOKEN_CACHE_SIZE
+
+## the routes importing the verifier sign or verify tokens, the app does not boot without their settings
+require_auth_settings()
+
+
+class TokenVerifier:
+    """Verifies the access tokens and caches the claims of the valid ones.
+
+    Args:
+        secret_key (str): key the tokens are signed with
+        algorithm (str): signing algorithm
+        max_size (int): maximum number of cached tokens, the least recently used one is evicted first
+    """
+
+    def __init__(
+        self, secret_key: str = SECRET_KEY, algorithm: str = ALGORITHM, max_size: int = TOKEN_CACHE_SIZE
+    ) -> None:
+        ## resolved once, the handlers do not read the configuration per request
+        self.secret_key = secret_key
+        self.algorithms = [algorithm]
+        self.max_size = max_size
+        self.entries = OrderedDict()  ## SHA-256 of the token -> (user, exp)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Returns the user of a valid token
+
+        Args:
+            token (str): access token of the cookie
+
+        Raises:
+            JWTError: the signature is invalid or the token expired
+
+        Returns:
+            Optional[dict]: {"uuid": ..., "username": ...}, None when the token lacks these claims
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:  ## expired, jwt.decode raises ExpiredSignatureError below
+                del self.entries[key]
+            self.misses += 1
+        payload = jwt.decode(token, self.secret_key, algorithms=self.algorithms)
+        uuid, username = payload.get("sub"), payload.get("username")
+        if uuid is None or username is None:
+            return None
+        user = {"uuid": uuid, "username": username}
+        if payload.get("exp") is not None:  ## a token without exp is verified every time
+            with self._lock:
+                self.entries[key] = (user, float(payload["exp"]))
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return user
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_verifier = TokenVerifier()
@@ -1,38 +1,47 @@
-import io
 import sys
 from ast import Bytes
-from typing import List
+from typing import List, Optional, Tuple
 
 import numpy as np
-from deepface import DeepFace
-from deepface.commons.functions import detect_face
-from PIL import Image
 
 from face_auth.constant.embedding_constants import (
+    CASCADE_ACCURATE_DETECTOR,
     DETECTOR_BACKEND,
     EMBEDDING_MODEL_NAME,
     ENFORCE_DETECTION,
     SIMILARITY_THRESHOLD,
 )
+from face_auth.data_access.async_data_access import AsyncUserEmbeddingData
 from face_auth.data_access.user_embedding_data import UserEmbeddingData
 from face_auth.exception import AppException
+from face_auth.inference.embedding_engine import BatchEmbeddingEngine
+from face_auth.inference.model_registry import ModelRegistry
 from face_auth.logger import logging
+from face_auth.constant.inference_constants import EARLY_EXIT_BATCH_SIZE
+from face_auth.scoring.early_exit import Verification, early_exit_verifier
+from face_auth.scoring.similarity_scorer import SimilarityScore, similarity_scorer
+from face_auth.search.index_factory import embedding_index
+
+embedding_engine = BatchEmbeddingEngine()
 
 ## validates a user's embedding information in the database.
 class UserLoginEmbeddingValidation:
-    def __init__(self, uuid_: str) -> None:  
+    def __init__(self, uuid_: str, db_embedding: Optional[np.ndarray] = None) -> None:  
     ## the constructor method that takes a user's UUID as an argument and sets it as an instance variable 
-    # self.uuid_. It also creates an instance of the UserEmbeddingData class and calls its get_user_embedding 
-    # method to retrieve the user's embedding data and stores it as self.user.
+    # self.uuid_. The handlers pass the embedding they already read with the async data access layer as db_embedding,
+    # so the inference workers open no database client. Otherwise it creates an instance of the UserEmbeddingData
+    # class and calls its get_user_embedding_array method to retrieve the user's normalized embedding (from the
+    # embedding cache when possible) and stores it as self.db_embedding.
         self.uuid_ = uuid_
-        self.user_embedding_data = UserEmbeddingData()
-        self.user = self.user_embedding_data.get_user_embedding(uuid_)
+        if db_embedding is None:
+            db_embedding = UserEmbeddingData().get_user_embedding_array(uuid_)
+        self.db_embedding = db_embedding
 
     def validate(self) -> bool: ## the method that validates the user's information and returns a boolean value
         try:
-            if self.user["UUID"] == None: ## checks if the UUID of the user is None. If it is, returns False.
+            if self.uuid_ == None: ## checks if the UUID of the user is None. If it is, returns False.
                 return False
-            if self.user["user_embed"] == None: #  checks if the user's embedding information is None. If it is, returns False.
+            if self.db_embedding is None: #  checks if the user's embedding information is None. If it is, returns False.
                 return False
             return True
         except Exception as e:
@@ -44,17 +53,23 @@ class UserLoginEmbeddingValidation:
         """
         Generate embedding from image array"""
         try:
+            ## deepface imports TensorFlow, it is only loaded by the processes computing embeddings
+            from deepface import DeepFace
+            from deepface.commons.functions import detect_face
+
             ##method first calls a function detect_face with the input img_array and specified detector_backend and
             # enforce_detection arguments. The purpose of this function is to detect faces in the input image.
             faces = detect_face(
                 img_array,
-                detector_backend=DETECTOR_BACKEND, ## we are using mtcnn algorithm for face detection
+                ## we are using mtcnn algorithm for face detection, the cascade of the engine has no deepface equivalent
+                detector_backend=CASCADE_ACCURATE_DETECTOR if DETECTOR_BACKEND == "cascade" else DETECTOR_BACKEND,
                 enforce_detection=ENFORCE_DETECTION, ## ENFORCE_DETECTION is set to false
             )
             # function is used to generate an embedding from the face
             embed = DeepFace.represent(  ## calls another function DeepFace.
                 img_path=faces[0], ##represent with the input faces[0] which is the first face detected
                 model_name=EMBEDDING_MODEL_NAME, ## we using Facenet algorithm for generating the embeddings
+                model=ModelRegistry.get_embedding_model(), ## model loaded once per process by the registry
                 enforce_detection=False, ## 
             )
             return embed ## The generated embedding is then returned. 
@@ -66,16 +81,10 @@ class UserLoginEmbeddingValidation:
         #(binary image data) as input and returns a list of embeddings (np.ndarray).
         """
         The code defines a static method generate_embedding_list in the class UserLoginEmbeddingValidation.
+        All the frames are embedded with a single batched inference of the embedding model.
         """
-        embedding_list = []  ## creating empty list to store the embeddings
-        for contents in files: ## It then loops over the binary data in files and for each binary data:
-            img = Image.open(io.BytesIO(contents)) # Converts it to an image using the Image.open method from the PIL library. 
-
-            img_array = np.array(img) ## Converts the image to a numpy array using the np.array method.
-            
-            embed = UserLoginEmbeddingValidation.generate_embedding(img_array) # the embedding of the image using the generate_embedding method from the same class.
-            embedding_list.append(embed) #Adds the embedding to the embedding_list.
-        return embedding_list
+        ## the engine decodes every frame, detects the faces and stacks the crops so that Facenet runs once per request
+        return embedding_engine.generate_embedding_list(files)
 
     @staticmethod
     def average_embedding(embedding_list: List[np.ndarray]) -> List:
@@ -127,41 +136,55 @@ class UserLoginEmbeddingValidation:
             bool: Returns True if the similarity is greater than the threshold
         """
         try:
-
-            if self.user: 
-                logging.info("Validating User Embedding ......")
-                # Validate user embedding
+            if self.db_embedding is not None:
+                # no need to run the inference when the stored embedding is not valid
                 if self.validate() == False:
                     return False
 
-                logging.info("Embedding Validation Successfull.......")
-
                 # Generate embedding list
                 logging.info("Generating Embedding List .......")
                 embedding_list = UserLoginEmbeddingValidation.generate_embedding_list(
                     files
                 )
                 logging.info("Embedding List generated.......")
+                return self.compare_embedding_list(embedding_list)
+            logging.info("User Authentication Failed.......")
 
-                
+            return False
+        except Exception as e:
+            raise AppException(e, sys) from e
 
-                # Calculate average embedding
+    def compare_embedding_list(self, embedding_list: List[np.ndarray]) -> bool:
+        """Function to compare already generated embeddings of the current images with the embedding of the database
 
-                logging.info("Calculating Average Embedding .......")
-                avg_embedding_list = UserLoginEmbeddingValidation.average_embedding(
-                    embedding_list
-                )
-                logging.info("Average Embedding calculated.......")
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the current images
+
+        Returns:
+            bool: Returns True if the similarity is greater than the threshold
+        """
+        try:
+
+            if self.db_embedding is not None: 
+                logging.info("Validating User Embedding ......")
+                # Validate user embedding
+                if self.validate() == False:
+                    return False
 
-                # code then gets the embedding stored in the database for the user
-                db_embedding = self.user["user_embed"]
+                logging.info("Embedding Validation Successfull.......")
+
+                if len(embedding_list) == 0:  ## every frame was rejected by the quality gate
+                    logging.info("User Authentication Failed, no usable frame.......")
+                    return False
 
                 logging.info("Calculating Cosine Similarity .......")
-                # Calculate cosine similarity  between the average embedding and the embedding stored in the database
-                simmilarity = UserLoginEmbeddingValidation.cosine_simmilarity(
-                    db_embedding, avg_embedding_list
+                # every frame is scored against the embedding stored in the database, already normalized by the
+                # cache, in one matrix op and the per-frame scores are aggregated with SCORE_AGGREGATION
+                similarity = self.score_embedding_list(embedding_list)
+                simmilarity = similarity.score
+                logging.info(
+                    f"Cosine Similarity calculated: {simmilarity:.4f}, frames: {similarity.frame_scores.round(4).tolist()}......."
                 )
-                logging.info("Cosine Similarity calculated.......")
 ## code checks if the cosine similarity is greater than or equal to a pre-defined constant SIMILARITY_THRESHOLD
                 if simmilarity >= SIMILARITY_THRESHOLD:  ## SIMILARITY_THRESHOLD = 0.75
                     logging.info("User Authenticated Successfully.......")
@@ -175,6 +198,63 @@ class UserLoginEmbeddingValidation:
         except Exception as e:
             raise AppException(e, sys) from e
 
+    def score_embedding_list(self, embedding_list: List[np.ndarray]) -> SimilarityScore:
+        """Function to score the embeddings of the current images against the embedding of the database
+
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the current images
+
+        Returns:
+            SimilarityScore: aggregated score and per-frame scores, for diagnostics and frame rejection
+        """
+        return similarity_scorer.score(self.db_embedding, embedding_list)
+
+    def verify_embedding(self, files: List[Bytes], batch_size: int = EARLY_EXIT_BATCH_SIZE) -> Verification:
+        """Early-exit variant of compare_embedding, the frames are embedded batch_size at a time and the
+        remaining ones are skipped as soon as the decision is settled
+
+        Args:
+            files (list): Bytes of images
+            batch_size (int, optional): frames embedded per step. Defaults to EARLY_EXIT_BATCH_SIZE.
+
+        Returns:
+            Verification: decision and number of frames actually embedded
+        """
+        try:
+            embedding_list = []
+            verification = Verification(False, True, 0, 0.0)
+            for start in range(0, len(files), batch_size):
+                embedding_list += UserLoginEmbeddingValidation.generate_embedding_list(files[start : start + batch_size])
+                verification = self.verify_embedding_list(embedding_list, len(files))
+                if verification.settled:
+                    break
+            return verification
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def verify_embedding_list(self, embedding_list: List[np.ndarray], total_frames: int) -> Verification:
+        """Function to decide on the embeddings generated so far whether the remaining frames are needed
+
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the frames processed so far
+            total_frames (int): number of uploaded frames
+
+        Returns:
+            Verification: decision, whether it is settled, frames used and running score
+        """
+        try:
+            if self.validate() == False:
+                logging.info("User Authentication Failed.......")
+                return Verification(False, True, len(embedding_list), 0.0)
+            verification = early_exit_verifier.decide(self.db_embedding, embedding_list, total_frames)
+            logging.info(
+                f"Running similarity {verification.score:.4f} after {verification.frames_used}/{total_frames} frames, "
+                f"settled: {verification.settled}......."
+            )
+            return verification
+        except Exception as e:
+            raise AppException(e, sys) from e
+
     # def get_user_embeeding_object(self, uuid_:str) -> Embedding:
     #     """_summary_
 
@@ -212,15 +292,88 @@ class UserRegisterEmbeddingValidation:
         try:
             embedding_list = UserLoginEmbeddingValidation.generate_embedding_list(files) #It calls the generate_embedding_list 
             #method from the UserLoginEmbeddingValidation class with the files as input. The method generates the embedding from the files.
+            self.save_embedding_list(embedding_list)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def save_embedding_list(self, embedding_list: List[np.ndarray]) -> None:
+        """This method averages already generated embeddings of the images and saves it to the database
+
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the images
+        """
+        try:
+            if len(embedding_list) == 0:  ## every frame was rejected by the quality gate
+                raise ValueError("No uploaded frame passed the quality gate, nothing to save")
             avg_embedding_list = UserLoginEmbeddingValidation.average_embedding(embedding_list) # It calls the average_embedding 
             #method from the UserLoginEmbeddingValidation class with the embedding_list as input. This method calculates the average embedding.
             self.user_embedding_data.save_user_embedding(self.uuid_, avg_embedding_list) #code saves the average embedding in the database by 
             # calling the save_user_embedding method from the UserEmbeddingData class.
+            if embedding_index.loaded: ## keeps the identification index of this process up to date
+                embedding_index.add(self.uuid_, avg_embedding_list)
         except Exception as e:
             raise AppException(e, sys) from e
 
+    async def save_embedding_list_async(
+        self, embedding_list: List[np.ndarray], embedding_data: AsyncUserEmbeddingData
+    ) -> None:
+        """Async form of save_embedding_list for the handlers. The embeddings are computed by the inference
+        executor, but the database write and the invalidation of the embedding cache run in the process of the
+        handler, the one whose cache serves the logins.
+
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the images
+            embedding_data (AsyncUserEmbeddingData): embedding data access object of the request
+        """
+        try:
+            if len(embedding_list) == 0:  ## every frame was rejected by the quality gate
+                raise ValueError("No uploaded frame passed the quality gate, nothing to save")
+            avg_embedding_list = UserLoginEmbeddingValidation.average_embedding(embedding_list)
+            await embedding_data.save_user_embedding(self.uuid_, avg_embedding_list)
+            if embedding_index.loaded: ## the other processes apply the new embedding by their next catch up,
+                # at most EMBEDDING_INDEX_REFRESH_SECONDS later
+                embedding_index.add(self.uuid_, avg_embedding_list)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+## module level entry points of the embedding validations, they are picklable so the inference executor
+# can run them in a thread or in a worker process.
+def extract_faces(files: List[Bytes]) -> np.ndarray:
+    """Decodes the uploaded images and returns their preprocessed face crops"""
+    return embedding_engine.extract_faces(files)
+
+
+def extract_gated_faces(files: List[Bytes]) -> Tuple[np.ndarray, List[Optional[str]]]:
+    """Decodes the uploaded images and returns the face crops accepted by the quality gate and the rejection
+    reason of every image"""
+    return embedding_engine.extract_gated_faces(files)
+
+
+def represent_faces(faces: np.ndarray) -> np.ndarray:
+    """Runs one inference of the embedding model over a batch of face crops"""
+    return embedding_engine.represent_faces(faces)
+
+
+def generate_embedding_list(files: List[Bytes]) -> List[np.ndarray]:
+    """Generates the embeddings of the uploaded images with a single batched inference"""
+    return UserLoginEmbeddingValidation.generate_embedding_list(files)
+
 
+def compare_user_embedding_list(
+    uuid_: str, embedding_list: List[np.ndarray], db_embedding: Optional[np.ndarray] = None
+) -> bool:
+    """Builds the login validation of the user and compares the embeddings of the uploaded images"""
+    return UserLoginEmbeddingValidation(uuid_, db_embedding).compare_embedding_list(embedding_list)
 
 
+def verify_user_embedding_list(
+    uuid_: str, embedding_list: List[np.ndarray], total_frames: int, db_embedding: Optional[np.ndarray] = None
+) -> Verification:
+    """Builds the login validation of the user and takes the early-exit decision on the frames embedded so far"""
+    return UserLoginEmbeddingValidation(uuid_, db_embedding).verify_embedding_list(embedding_list, total_frames)
 
 
+def save_user_embedding_list(uuid_: str, embedding_list: List[np.ndarray]) -> None:
+    """Builds the register validation of the user and saves the embeddings of the uploaded images"""
+    UserRegisterEmbeddingValidation(uuid_).save_embedding_list(embedding_list)
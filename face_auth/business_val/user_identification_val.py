@@ -0,0 +1,130 @@
+## 1:N identification of a face against every registered user. The uploaded frames are embedded like for
+#  the login, averaged, and searched in the in-memory embedding index.
+#  The API processes only read the index file of EMBEDDING_INDEX_PATH, it is written by a single owner:
+#  python -m face_auth.business_val.user_identification_val [--path PREFIX], e.g. before a deployment.
+
+import argparse
+import sys
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import IDENTIFICATION_TOP_K, SIMILARITY_THRESHOLD
+from face_auth.constant.search_constants import (
+    EMBEDDING_INDEX_PATH,
+    EMBEDDING_INDEX_REFRESH_SECONDS,
+    EMBEDDING_SNAPSHOT_PATH,
+)
+from face_auth.data_access.embedding_snapshot import load_embedding_snapshot, snapshot_exists
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.exception import AppException
+from face_auth.logger import logging
+from face_auth.search.base_index import BaseEmbeddingIndex
+from face_auth.search.index_factory import embedding_index
+
+_index_lock = threading.Lock()
+
+
+class UserIdentification:
+    """Returns the registered users whose stored embedding is the most similar to the uploaded faces
+
+    Args:
+        index (BaseEmbeddingIndex, optional): searched index. Defaults to the index of the process.
+        catch_up (bool, optional): apply the embeddings written since the index was built. Defaults to True,
+            launcher.py loads the index file without it before forking, the database is not read in its parent.
+    """
+
+    def __init__(self, index: BaseEmbeddingIndex = embedding_index, catch_up: bool = True) -> None:
+        self.index = index
+        ## the index is loaded by the first identification of the process, from the persisted index
+        # when EMBEDDING_INDEX_PATH points to one, then from the EMBEDDING_SNAPSHOT_PATH snapshot, otherwise
+        # from the embedding collection. A persisted index or a snapshot is only a warm start: the embeddings
+        # written after it are applied right after, then every EMBEDDING_INDEX_REFRESH_SECONDS
+        if not self.index.loaded or (catch_up and self.needs_catch_up()):
+            with _index_lock:
+                if not self.index.loaded:
+                    self.load_index()
+                if catch_up and self.needs_catch_up():
+                    self.index.catch_up(UserEmbeddingData())
+
+    def needs_catch_up(self) -> bool:
+        if self.index.caught_up_at is None:
+            return True
+        return (
+            EMBEDDING_INDEX_REFRESH_SECONDS > 0
+            and time.monotonic() - self.index.caught_up_at > EMBEDDING_INDEX_REFRESH_SECONDS
+        )
+
+    def load_index(self) -> None:
+        if EMBEDDING_INDEX_PATH and self.index.exists(EMBEDDING_INDEX_PATH):
+            logging.info(f"Loading embedding index from {EMBEDDING_INDEX_PATH} .......")
+            self.index.load(EMBEDDING_INDEX_PATH)
+            return
+        if EMBEDDING_SNAPSHOT_PATH and snapshot_exists(EMBEDDING_SNAPSHOT_PATH):
+            logging.info(f"Loading embedding index from the snapshot {EMBEDDING_SNAPSHOT_PATH} .......")
+            ## the users registered after the export are added by the catch up, like for a persisted index
+            self.index.load_snapshot(load_embedding_snapshot(EMBEDDING_SNAPSHOT_PATH))
+        else:
+            self.index.load_from_collection(UserEmbeddingData())
+
+    def identify(self, embedding_list: List[np.ndarray], top_k: int = IDENTIFICATION_TOP_K) -> List[dict]:
+        """Function to find the top_k most similar users to the current images
+
+        Args:
+            embedding_list (List[np.ndarray]): embeddings of the current images
+            top_k (int, optional): number of users to return. Defaults to IDENTIFICATION_TOP_K.
+
+        Returns:
+            List[dict]: uuid, cosine similarity and whether the similarity reaches the threshold
+        """
+        try:
+            logging.info("Identifying User .......")
+            avg_embedding = np.mean(embedding_list, axis=0)
+            matches = self.index.search(avg_embedding, top_k)
+            for match in matches:
+                match["match"] = match["score"] >= SIMILARITY_THRESHOLD
+            logging.info(f"Identification returned {len(matches)} users.......")
+            return matches
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+
+def identify_users(embedding_list: List[np.ndarray], top_k: int = IDENTIFICATION_TOP_K) -> List[dict]:
+    """Picklable entry point of the identification for the inference executor"""
+    return UserIdentification().identify(embedding_list, top_k)
+
+
+def save_embedding_index(path: str = EMBEDDING_INDEX_PATH) -> int:
+    """Loads the index like an identification does, applies the embeddings written since it was built, then writes
+    it to path so the API processes start from it instead of rebuilding it
+
+    Args:
+        path (str, optional): prefix of the index files. Defaults to EMBEDDING_INDEX_PATH.
+
+    Returns:
+        int: number of indexed users
+    """
+    try:
+        if not path:
+            raise ValueError("No index path, set EMBEDDING_INDEX_PATH or pass --path")
+        UserIdentification()
+        embedding_index.save(path)
+        logging.info(f"Saved the embedding index of {len(embedding_index)} users to {path}.......")
+        return len(embedding_index)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Writes the identification index file loaded by the API")
+    parser.add_argument("--path", default=EMBEDDING_INDEX_PATH, help="defaults to EMBEDDING_INDEX_PATH")
+    args = parser.parse_args()
+    if not args.path:
+        parser.error("set EMBEDDING_INDEX_PATH or pass --path")
+    print(f"saved {save_embedding_index(args.path)} embeddings to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
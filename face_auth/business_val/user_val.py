@@ -2,14 +2,17 @@ import re
 import sys
 from typing import Optional
 
-from passlib.context import CryptContext
+from pymongo.errors import DuplicateKeyError
 
+from face_auth.business_val.password_hasher import PasswordHasherBusy, password_hasher
+from face_auth.data_access.async_data_access import AsyncUserData
 from face_auth.data_access.user_data import UserData
 from face_auth.entity.user import User
 from face_auth.exception import AppException
 from face_auth.logger import logging
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+## fields of the user needed by the login, the rest of the document is not transferred
+LOGIN_PROJECTION = {"_id": 0, "UUID": 1, "username": 1, "password": 1}
 
 
 class LoginValidation:
@@ -67,7 +70,7 @@ class LoginValidation:
         Returns:
             bool: _description_
         """
-        return bcrypt_context.verify(plain_password, hashed_password) ##  bcrypt_context.verify method to verify if the plain_password is equal to the hashed_password.
+        return password_hasher.context.verify(plain_password, hashed_password) ##  verifies with the shared bcrypt context if the plain_password is equal to the hashed_password.
 
     def validate_login(self) -> dict: ## returns a dictionary with two keys status and msg
 
@@ -92,21 +95,61 @@ class LoginValidation:
 # the current object is {"status": True}. If it is, the function continues to execute, otherwise it returns False.
                 userdata = UserData() ## function creates an object of the UserData class This class will have all the mongo db operations for user data .
                 logging.info("Fetching the user details from the database.....")
-                user_login_val = userdata.get_user({"email_id": self.email_id}) ## retrieves the user data using get_user method of userdata object.
+                user_login_val = userdata.get_user({"email_id": self.email_id}, LOGIN_PROJECTION) ## retrieves the user data using get_user method of userdata object.
 # It retrieves the data of the user whose email id is the same as the email_id attribute of the current object.
                 if not user_login_val: ## The function checks if the user data exists by checking the truthiness of the user_login_val
-                    logging.info("User not found while Login") 
+                    logging.info("User not found while Login")
                     return False
-                if not self.verify_password(self.password, user_login_val["password"]): ## verifies the password
-# using verify_password method by passing self.password and user_login_val["password"] as arguments
-                    logging.info("Password is incorrect")
+                matches, new_hash = password_hasher.verify_and_rehash(self.password, user_login_val["password"]) ## verifies the password
+                if new_hash is not None:  ## the hash has another cost than BCRYPT_ROUNDS, it is replaced
+                    userdata.update_password(user_login_val["UUID"], new_hash)
+                return self.login_result(user_login_val, matches)
+            return False
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    async def authenticate_user_login_async(self, user_data: AsyncUserData = None) -> Optional[dict]:
+        """Async form of authenticate_user_login, the user is read through the database thread pool and the
+        password is verified on the password hasher threads, so the event loop is blocked by neither
+
+        Args:
+            user_data (AsyncUserData, optional): async user data access object. Defaults to AsyncUserData().
+
+        Raises:
+            PasswordHasherBusy: too many password hash jobs are already pending
+
+        Returns:
+            Optional[dict]: the user data if the user is authenticated else False
+        """
+        try:
+            logging.info("Authenticating the user details.....")
+            if self.validate_login()["status"]:
+                user_data = user_data or AsyncUserData()
+                logging.info("Fetching the user details from the database.....")
+                user_login_val = await user_data.get_user({"email_id": self.email_id}, LOGIN_PROJECTION)
+                if not user_login_val:
+                    logging.info("User not found while Login")
                     return False
-                logging.info("User authenticated successfully....")
-                return user_login_val  ## returns the user data.
+                matches, new_hash = await password_hasher.verify_and_rehash_async(
+                    self.password, user_login_val["password"]
+                )
+                if new_hash is not None:  ## the hash has another cost than BCRYPT_ROUNDS, it is replaced
+                    await user_data.update_password(user_login_val["UUID"], new_hash)
+                return self.login_result(user_login_val, matches)
             return False
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             raise AppException(e, sys) from e
 
+    @staticmethod
+    def login_result(user_login_val: dict, matches: bool) -> Optional[dict]:
+        if not matches:
+            logging.info("Password is incorrect")
+            return False
+        logging.info("User authenticated successfully....")
+        return user_login_val  ## returns the user data.
+
 ##  RegisterValidation which has a set of methods to validate the registration of a user.
 class RegisterValidation:
 
@@ -114,7 +157,8 @@ class RegisterValidation:
     """
     
     
-    def __init__(self, user: User) -> None:  ## method and accepts one argument, "user", of type "User". The return type is specified as "None"
+    def __init__(self, user: User, async_userdata: AsyncUserData = None) -> None:  ## method and accepts one argument, "user", of type "User". The return type is specified as "None"
+        # async_userdata is the user data access object of the request, injected by the handlers
         try:
 # # It initializes the user, regular expression to validate email, UUID, UserData object and bcrypt context.
             self.user = user  ## assigns the argument passed to the constructor, "user", to an instance variable named "user".
@@ -122,18 +166,33 @@ class RegisterValidation:
                 r"([A-Za-z0-9]+[.-_])*[A-Za-z0-9]+@[A-Za-z0-9-]+(\.[A-Z|a-z]{2,})+"
             ) # The pattern is used to match strings that match a specific format for an email address.
             self.uuid = self.user.uuid_ ##"uuid_" attribute of the "user" object to an instance variable named "uuid".
-            self.userdata = UserData()  ## instance of the "UserData" class and assigns it to an instance variable named "userdata".
-            self.bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto") ## creates a "CryptContext" object, 
-            #which is used for handling password hashing, using the "bcrypt" scheme. The "deprecated" argument is
-            #set to "auto", which means that deprecated schemes will be automatically replaced with the most secure available scheme.
+            self.async_userdata = async_userdata or AsyncUserData()  ## used by the async validations
+            self.userdata = self.async_userdata.user_data  ## the "UserData" object wrapped by the async one, used by the sync validations
+            ## the passwords are hashed with the bcrypt context shared by the process, see password_hasher
         except Exception as e:
             raise e
 
-    def validate(self) -> bool:
+    def validate(self) -> str:
+        """The method that checks all validation conditions for user registration, including whether the
+        details already exist in the database. It returns a message, empty when the user can be registered.
+        """
+        msg = self.validate_fields()
+        if not self.is_details_exists():
+            msg += "User already exists"  ## If the user details already exist, msg is updated with the string "User already exists". This is determined by calling the method is_details_exists.
+        return msg
+
+    async def validate_async(self) -> str:
+        """Async form of validate, the existing user lookups go through the database thread pool"""
+        msg = self.validate_fields()
+        if not await self.is_details_exists_async():
+            msg += "User already exists"
+        return msg
+
+    def validate_fields(self) -> str:
 
         """The method that checks all validation conditions for user registration such as if all required fields are
-         filled, email is valid, password length is between 8 and 16, password match, and details already exists or 
-         not. It returns a message.
+         filled, email is valid, password length is between 8 and 16 and password match, without reading the
+         database. It returns a message.
 
         Returns:
             _type_: string
@@ -168,9 +227,6 @@ class RegisterValidation:
             if not self.is_password_match():
                 msg += "Password does not match" ## If the password does not match, msg is updated with the string "Password does not match". This is determined by calling the method is_password_match.
 
-            if not self.is_details_exists():
-                msg += "User already exists"  ## If the user details already exist, msg is updated with the string "User already exists". This is determined by calling the method is_details_exists.
-
             return msg
         except Exception as e:
             raise e
@@ -202,23 +258,25 @@ class RegisterValidation:
         else:
             return False
 
+    def details_query(self) -> dict:
+        ## a user with the same username, email id or UUID, found with a single round trip
+        return {"$or": [{"username": self.user.username}, {"email_id": self.user.email_id}, {"UUID": self.uuid}]}
+
     def is_details_exists(self) -> bool:
-        """The function is_details_exists checks if the user already exists in the database or not."""
-        username_val = self.userdata.get_user({"username": self.user.username}) ## uses the get_user method of UserData to search the database with the given username.
-        emailid_val = self.userdata.get_user({"email_id": self.user.email_id}) ## uses the get_user method of UserData to search the database with the given email id.
-        uuid_val = self.userdata.get_user({"UUID": self.uuid}) ## uses the get_user method of UserData to search the database with the given UUID.
-        if username_val == None and emailid_val == None and uuid_val == None: # The final if statement checks if all of the username_val, emailid_val and uuid_val are None, meaning that no user was found in the database with these details.
-            return True # If the details do not exist in the database, the function returns True.
-            # Otherwise, it returns False.
+        """The function is_details_exists checks if the user already exists in the database or not.
+        It returns True when no user has the same username, email id or UUID."""
+        return self.userdata.get_user(self.details_query(), {"_id": 1}) is None
 
-        return False
+    async def is_details_exists_async(self) -> bool:
+        """Async form of is_details_exists, the lookup goes through the database thread pool"""
+        return await self.async_userdata.get_user(self.details_query(), {"_id": 1}) is None
 
     @staticmethod
     def get_password_hash(password: str) -> str:
         """This method get_password_hash is a static method. It takes a string parameter password and returns
          the hash of the given password as a string. """
-        return bcrypt_context.hash(password) # The hash is calculated using the bcrypt_context object that
-        # was created in the __init__ method of the class. This method is used to store the password securely
+        return password_hasher.hash(password) # The hash is calculated using the bcrypt context shared by the
+        # process, with BCRYPT_ROUNDS rounds. This method is used to store the password securely
         #  in the database by storing its hash instead of the actual password.
 
     def validate_registration(self) -> bool:
@@ -241,16 +299,12 @@ class RegisterValidation:
             if self.validate_registration()["status"]: ## checks if the validation is successful
                 logging.info("Generating the password hash.....")
                 hashed_password: str = self.get_password_hash(self.user.password1) ## generates the password hash using the get_password_hash function and saves it to the hashed_password variable.
-                user_data_dict: dict = { # creates a dictionary of user data to be saved in the database
-                    "Name": self.user.Name, 
-                    "username": self.user.username,
-                    "password": hashed_password,
-                    "email_id": self.user.email_id,
-                    "ph_no": self.user.ph_no,
-                    "UUID": self.uuid,
-                }
+                user_data_dict: dict = self.user_document(hashed_password) # creates a dictionary of user data to be saved in the database
                 logging.info("Saving the user details in the database.....")
-                self.userdata.save_user(user_data_dict)  ## saves the user data to the database
+                try:
+                    self.userdata.save_user(user_data_dict)  ## saves the user data to the database
+                except DuplicateKeyError:  ## registered concurrently since the duplicate check
+                    return self.user_exists_status()
                 logging.info("Saving the user details in the database completed.....")
                 return {"status": True, "msg": "User registered successfully"} ## returns the status of the registration process and a message indicating successful registration
             logging.info("Validation failed while Registration.....")
@@ -258,5 +312,47 @@ class RegisterValidation:
         except Exception as e:
             raise e
 
+    async def authenticate_user_registration_async(self) -> dict:
+        """Async form of authenticate_user_registration, the details are validated once and the database
+        calls go through the database thread pool
+
+        Returns:
+            dict: status of the registration and its message, the validation errors when it failed
+        """
+        try:
+            logging.info("Validating the user details while Registration.....")
+            msg = await self.validate_async()
+            if len(msg) != 0:
+                logging.info("Validation failed while Registration.....")
+                return {"status": False, "msg": msg}
+            logging.info("Generating the password hash.....")
+            user_data_dict = self.user_document(await password_hasher.hash_async(self.user.password1))
+            logging.info("Saving the user details in the database.....")
+            try:
+                await self.async_userdata.save_user(user_data_dict)
+            except DuplicateKeyError:  ## registered concurrently since the duplicate check
+                return self.user_exists_status()
+            logging.info("Saving the user details in the database completed.....")
+            return {"status": True, "msg": "User registered successfully"}
+        except Exception as e:
+            raise e
+
+    @staticmethod
+    def user_exists_status() -> dict:
+        ## the unique indexes of the user collection rejected the insert, the details were taken in between
+        logging.info("User registered concurrently, the unique index rejected the insert.....")
+        return {"status": False, "msg": "User already exists"}
+
+    def user_document(self, hashed_password: str) -> dict:
+        """Document of the user saved in the database"""
+        return {
+            "Name": self.user.Name,
+            "username": self.user.username,
+            "password": hashed_password,
+            "email_id": self.user.email_id,
+            "ph_no": self.user.ph_no,
+            "UUID": self.uuid,
+        }
+
 
 
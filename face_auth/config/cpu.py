@@ -0,0 +1,44 @@
+## Number of CPUs the process can actually use. os.cpu_count() returns the cores of the host, while a container
+#  usually runs on fewer: the affinity mask of the process (cpuset) and the CFS quota of its cgroup limit it.
+#  This module reads no setting, launcher.py uses it before face_auth reads its settings.
+
+import os
+from typing import Optional
+
+## cgroup v1 mounts the cpu controller under one of these directories
+CGROUP_V1_CPU_DIRS = ("/sys/fs/cgroup/cpu", "/sys/fs/cgroup/cpu,cpuacct")
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPUs allowed by the CFS quota of the cgroup of the process, None when there is no quota"""
+    try:
+        ## cgroup v2: "<quota> <period>", or "max <period>" without quota
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()[:2]
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    for directory in CGROUP_V1_CPU_DIRS:
+        try:
+            with open(os.path.join(directory, "cpu.cfs_quota_us")) as quota_file:
+                quota = int(quota_file.read())
+            with open(os.path.join(directory, "cpu.cfs_period_us")) as period_file:
+                period = int(period_file.read())
+        except (OSError, ValueError):
+            continue
+        ## a quota of -1 means no limit
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs of the affinity mask of the process, capped by the quota of its cgroup, at least 1"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  ## no affinity on macOS and Windows
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        ## a quota of 2.5 CPUs is throttled with 3 busy threads, the fraction is not counted
+        cpus = min(cpus, int(limit))
+    return max(1, cpus)
@@ -1,21 +1,57 @@
+import threading
+
 import pymongo
 
+try:
+    import mongomock
+except ImportError:  ## mongomock is optional, it only backs the in-process fake database of the test harness
+    mongomock = None
+
+from face_auth.config.database.pool_metrics import pool_metrics
 from face_auth.constant.database_constants import (
     DATABASE_NAME,
-    MONGODB_URL_KEY
+    MONGODB_CONNECT_TIMEOUT_MS,
+    MONGODB_MAX_IDLE_TIME_MS,
+    MONGODB_MAX_POOL_SIZE,
+    MONGODB_MIN_POOL_SIZE,
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    MONGODB_SOCKET_TIMEOUT_MS,
+    MONGODB_URL_KEY,
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS,
 )
 
 
 class MongodbClient:
+    """Shares one pooled MongoClient per process between every data access object. pymongo clients are
+    thread safe, building one per request would open new connections and repeat the server discovery."""
+
     client = None
+    _lock = threading.Lock()
 
     def __init__(self, database_name=DATABASE_NAME) -> None:
         if MongodbClient.client is None:
-            mongo_db_url = MONGODB_URL_KEY
-            if "localhost" in mongo_db_url:
-                MongodbClient.client = pymongo.MongoClient(mongo_db_url) 
-            else:
-                MongodbClient.client=pymongo.MongoClient(mongo_db_url)
+            with MongodbClient._lock:
+                if MongodbClient.client is None:
+                    MongodbClient.client = self.build_client(MONGODB_URL_KEY)
         self.client = MongodbClient.client
         self.database = self.client[database_name]
         self.database_name = database_name
+
+    @staticmethod
+    def build_client(mongo_db_url: str):
+        if mongo_db_url.startswith("mongomock://"):
+            ## in-process fake database, e.g. MONGODB_URL_KEY=mongomock://localhost for the test harness
+            if mongomock is None:
+                raise ImportError("mongomock is required by mongomock:// database urls")
+            return mongomock.MongoClient()
+        return pymongo.MongoClient(
+            mongo_db_url,
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+            event_listeners=[pool_metrics],
+        )
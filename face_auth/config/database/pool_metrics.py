@@ -0,0 +1,92 @@
+## Connection pool metrics of the MongoClient, collected with a pymongo ConnectionPoolListener and exposed by
+#  the /application/metrics route. They show whether MONGODB_MAX_POOL_SIZE is large enough: a max_in_use close
+#  to the pool size or checkout failures mean requests wait for connections.
+
+import threading
+import time
+
+from pymongo import monitoring
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts the connections of the pools of a MongoClient, all servers summed"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.open = 0  ## connections created and not closed yet
+        self.in_use = 0  ## connections checked out by a thread right now
+        self.max_in_use = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_wait_seconds = 0.0
+        self.pools_cleared = 0
+        ## a checkout starts and ends in the thread asking for the connection, the start is kept per thread and
+        # per server: the duration of the events only exists from pymongo 4.11
+        self._checkout_started = threading.local()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "open_connections": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "mean_checkout_wait_ms": 1000 * self.checkout_wait_seconds / max(self.checkouts, 1),
+                "pools_cleared": self.pools_cleared,
+            }
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open -= 1
+
+    def _checkout_wait(self, event) -> float:
+        started = getattr(self._checkout_started, "by_address", {}).pop(event.address, None)
+        return 0.0 if started is None else time.monotonic() - started
+
+    def connection_check_out_started(self, event) -> None:
+        if not hasattr(self._checkout_started, "by_address"):
+            self._checkout_started.by_address = {}
+        self._checkout_started.by_address[event.address] = time.monotonic()
+
+    def connection_checked_out(self, event) -> None:
+        wait_seconds = self._checkout_wait(event)
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkouts += 1
+            ## time spent waiting for the connection, including its creation when the pool had none idle
+            self.checkout_wait_seconds += wait_seconds
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_check_out_failed(self, event) -> None:
+        self._checkout_wait(event)
+        with self._lock:
+            self.checkout_failures += 1
+
+    def pool_cleared(self, event) -> None:
+        with self._lock:
+            self.pools_cleared += 1
+
+    ## the other events of the listener interface are not needed by the metrics
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+
+pool_metrics = PoolMetrics()
@@ -0,0 +1,146 @@
+## Configuration of the process, read once from the environment and the .env file and validated at import.
+#  The face_auth/constant modules re-export these values under their usual names, so a missing or malformed
+#  variable fails the boot with every problem listed instead of surfacing in the middle of a request.
+
+import os
+from functools import lru_cache
+from typing import Literal, Optional
+
+from pydantic import BaseSettings, Field, root_validator
+
+from face_auth.config.cpu import available_cpus
+
+
+class Settings(BaseSettings):
+    """Typed, immutable settings of the app. Every field is read from the environment variable of the same name,
+    then from the .env file of the working directory, then from its default.
+    """
+
+    ## full serves the auth and the face routes, auth only the auth routes and never imports TensorFlow
+    APP_PROFILE: Literal["full", "auth"] = "full"
+
+    ## database
+    MONGODB_URL_KEY: str
+    DATABASE_NAME: str
+    USER_COLLECTION_NAME: str
+    EMBEDDING_COLLECTION_NAME: str
+    DB_EXECUTOR_WORKERS: int = Field(8, gt=0)
+    MONGODB_MAX_POOL_SIZE: int = Field(50, gt=0)
+    MONGODB_MIN_POOL_SIZE: int = Field(2, ge=0)
+    MONGODB_MAX_IDLE_TIME_MS: int = Field(300000, ge=0)
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = Field(2000, ge=0)
+    MONGODB_CONNECT_TIMEOUT_MS: int = Field(5000, ge=0)
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = Field(5000, ge=0)
+    MONGODB_SOCKET_TIMEOUT_MS: int = Field(10000, ge=0)
+    ENSURE_INDEXES_ON_STARTUP: bool = True
+
+    ## authentication, only required by the processes signing or verifying the tokens, see require_auth_settings
+    SECRET_KEY: str = ""
+    ALGORITHM: Optional[Literal["HS256", "HS384", "HS512"]] = None
+    BCRYPT_ROUNDS: int = Field(12, ge=4, le=31)
+    PASSWORD_HASH_WORKERS: int = Field(default_factory=available_cpus, gt=0)
+    PASSWORD_HASH_MAX_PENDING: int = Field(64, gt=0)
+
+    ## caches
+    EMBEDDING_CACHE_SIZE: int = Field(10000, ge=0)
+    EMBEDDING_CACHE_TTL_SECONDS: float = Field(300, ge=0)
+    TOKEN_CACHE_SIZE: int = Field(10000, ge=0)
+
+    ## embedding and detection
+    SIMILARITY_THRESHOLD: float = Field(0.75, ge=-1, le=1)
+    DETECTOR_BACKEND: Literal["mtcnn", "opencv", "ssd", "cascade"] = "mtcnn"
+    EMBEDDING_MODEL_NAME: str = "Facenet"
+    EMBEDDING_RUNTIME: Literal["tensorflow", "onnx", "onnx-fp16", "onnx-int8"] = "tensorflow"
+    ONNX_MODEL_DIR: str = os.path.join(os.path.expanduser("~"), ".deepface", "onnx")
+    ONNX_INTRA_OP_THREADS: int = Field(0, ge=0)
+    TF_INTRA_OP_THREADS: int = Field(0, ge=0)
+    TF_INTER_OP_THREADS: int = Field(0, ge=0)
+    CASCADE_FAST_DETECTOR: Literal["opencv", "ssd"] = "opencv"
+    HAAR_MIN_CONFIDENCE: float = 4.0
+    SSD_MIN_CONFIDENCE: float = Field(0.97, ge=0, le=1)
+    EMBEDDING_STORAGE_FORMAT: Literal["binary", "array"] = "binary"
+    EMBEDDING_STORAGE_DTYPE: Literal["float32", "float16"] = "float32"
+
+    ## inference
+    INFERENCE_EXECUTOR: Literal["thread", "process", "remote"] = "thread"
+    INFERENCE_MAX_WORKERS: int = Field(2, gt=0)
+    INFERENCE_MAX_QUEUE_SIZE: int = Field(16, gt=0)
+    INFERENCE_TIMEOUT_SECONDS: float = Field(30, gt=0)
+    INFERENCE_WORKER_ADDRESSES: str = "127.0.0.1:7001"
+    INFERENCE_WORKER_AUTHKEY: str = ""  ## required by the remote executor and the inference workers
+    INFERENCE_WORKER_CONNECT_TIMEOUT_SECONDS: float = Field(120, ge=0)
+    MICRO_BATCH_ENABLED: bool = True
+    MICRO_BATCH_WINDOW_MS: float = Field(10, ge=0)
+    MICRO_BATCH_MAX_SIZE: int = Field(32, gt=0)
+    EARLY_EXIT_ENABLED: bool = True
+    EARLY_EXIT_BATCH_SIZE: int = Field(2, gt=0)
+    EARLY_EXIT_MIN_FRAMES: int = Field(2, gt=0)
+    EARLY_EXIT_MARGIN: float = Field(0.05, ge=0)
+    EARLY_EXIT_Z: float = Field(3, ge=0)
+
+    ## frame quality gate
+    QUALITY_GATE_ENABLED: bool = True
+    QUALITY_MIN_SHARPNESS: float = 30
+    QUALITY_MIN_BRIGHTNESS: float = Field(40, ge=0, le=255)
+    QUALITY_MAX_BRIGHTNESS: float = Field(220, ge=0, le=255)
+    QUALITY_MIN_FACE_SIZE: int = Field(40, ge=0)
+    QUALITY_MIN_CONFIDENCE: float = Field(0.9, ge=0, le=1)  ## MTCNN only, SSD and Haar use their *_MIN_CONFIDENCE
+
+    ## identification index
+    EMBEDDING_INDEX_BACKEND: Literal["exact", "ivf", "hnsw"] = "exact"
+    EMBEDDING_INDEX_PATH: str = ""
+    EMBEDDING_SNAPSHOT_PATH: str = ""
+    EMBEDDING_INDEX_REFRESH_SECONDS: float = Field(1, ge=0)
+    IVF_N_LISTS: int = Field(0, ge=0)
+    IVF_N_PROBE: int = Field(8, gt=0)
+    IVF_TRAIN_SIZE: int = Field(100000, gt=0)
+    IVF_TRAIN_ITERATIONS: int = Field(10, gt=0)
+    HNSW_M: int = Field(16, gt=0)
+    HNSW_EF_CONSTRUCTION: int = Field(200, gt=0)
+    HNSW_EF_SEARCH: int = Field(64, gt=0)
+
+    ## uploads
+    MAX_FRAME_SIZE_BYTES: int = Field(10 * 1024 * 1024, gt=0)
+    MAX_REQUEST_SIZE_BYTES: int = Field(60 * 1024 * 1024, gt=0)
+    MAX_FRAMES_PER_REQUEST: int = Field(20, gt=0)
+
+    @root_validator(skip_on_failure=True)
+    def check_ranges(cls, values: dict) -> dict:
+        if values["MONGODB_MIN_POOL_SIZE"] > values["MONGODB_MAX_POOL_SIZE"]:
+            raise ValueError("MONGODB_MIN_POOL_SIZE is greater than MONGODB_MAX_POOL_SIZE")
+        if values["QUALITY_MIN_BRIGHTNESS"] > values["QUALITY_MAX_BRIGHTNESS"]:
+            raise ValueError("QUALITY_MIN_BRIGHTNESS is greater than QUALITY_MAX_BRIGHTNESS")
+        if values["MAX_FRAME_SIZE_BYTES"] > values["MAX_REQUEST_SIZE_BYTES"]:
+            raise ValueError("MAX_FRAME_SIZE_BYTES is greater than MAX_REQUEST_SIZE_BYTES")
+        if values["INFERENCE_EXECUTOR"] == "remote" and not values["INFERENCE_WORKER_AUTHKEY"]:
+            raise ValueError("INFERENCE_WORKER_AUTHKEY is required by the remote inference executor")
+        if values["INFERENCE_WORKER_AUTHKEY"] and values["INFERENCE_WORKER_AUTHKEY"] == values["SECRET_KEY"]:
+            raise ValueError("INFERENCE_WORKER_AUTHKEY must not be the SECRET_KEY signing the tokens")
+        return values
+
+    class Config:
+        env_file = ".env"
+        case_sensitive = True
+        frozen = True
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Returns the settings of the process, the environment and the .env file are read by the first call only"""
+    return Settings()
+
+
+settings = get_settings()
+
+
+def require_auth_settings() -> None:
+    """Fails when the settings of the access tokens are missing. Called by the token modules the auth and face routes
+    import, so the app still fails at boot without them while the ML modules, the CLIs and the benchmarks do not
+    need the auth secrets.
+
+    Raises:
+        ValueError: SECRET_KEY or ALGORITHM is not set
+    """
+    missing = [name for name in ("SECRET_KEY", "ALGORITHM") if not getattr(settings, name)]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} must be set to sign and verify the access tokens")
@@ -1,2 +1,6 @@
+from face_auth.config.settings import settings
+
 APP_HOST = "0.0.0.0"
 APP_PORT = 8000
+## full or auth, see app.py
+APP_PROFILE = settings.APP_PROFILE
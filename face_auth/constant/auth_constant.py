@@ -1,4 +1,11 @@
-from face_auth.utils.util import CommonUtils
+from face_auth.config.settings import settings
 
-SECRET_KEY = CommonUtils().get_environment_variable("SECRET_KEY")
-ALGORITHM = CommonUtils().get_environment_variable("ALGORITHM")
+SECRET_KEY = settings.SECRET_KEY
+ALGORITHM = settings.ALGORITHM
+
+## cost of the password hashes, the hashes of another cost are rehashed at the next successful login
+BCRYPT_ROUNDS = settings.BCRYPT_ROUNDS
+## threads hashing and verifying passwords, bcrypt releases the GIL so they run in parallel with the event loop
+PASSWORD_HASH_WORKERS = settings.PASSWORD_HASH_WORKERS
+## running plus waiting hash jobs before the logins and registrations are refused with a 503
+PASSWORD_HASH_MAX_PENDING = settings.PASSWORD_HASH_MAX_PENDING
@@ -0,0 +1,6 @@
+from face_auth.config.settings import settings
+
+EMBEDDING_CACHE_SIZE = settings.EMBEDDING_CACHE_SIZE
+EMBEDDING_CACHE_TTL_SECONDS = settings.EMBEDDING_CACHE_TTL_SECONDS
+## verified access tokens kept by the token verifier, each one until its exp claim
+TOKEN_CACHE_SIZE = settings.TOKEN_CACHE_SIZE
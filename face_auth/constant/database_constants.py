@@ -1,8 +1,19 @@
-from face_auth.utils.util import CommonUtils
+from face_auth.config.settings import settings
 
-MONGODB_URL_KEY = CommonUtils().get_environment_variable("MONGODB_URL_KEY")
-DATABASE_NAME = CommonUtils().get_environment_variable("DATABASE_NAME")
-USER_COLLECTION_NAME = CommonUtils().get_environment_variable("USER_COLLECTION_NAME")
-EMBEDDING_COLLECTION_NAME = CommonUtils().get_environment_variable(
-    "EMBEDDING_COLLECTION_NAME"
-)
+MONGODB_URL_KEY = settings.MONGODB_URL_KEY
+DATABASE_NAME = settings.DATABASE_NAME
+USER_COLLECTION_NAME = settings.USER_COLLECTION_NAME
+EMBEDDING_COLLECTION_NAME = settings.EMBEDDING_COLLECTION_NAME
+## threads running the pymongo calls of the async data access layer, off the event loop
+DB_EXECUTOR_WORKERS = settings.DB_EXECUTOR_WORKERS
+## connection pool of the MongoClient shared by the process
+MONGODB_MAX_POOL_SIZE = settings.MONGODB_MAX_POOL_SIZE
+MONGODB_MIN_POOL_SIZE = settings.MONGODB_MIN_POOL_SIZE
+MONGODB_MAX_IDLE_TIME_MS = settings.MONGODB_MAX_IDLE_TIME_MS
+## how long a request waits for a free connection before failing, instead of queueing forever
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+MONGODB_CONNECT_TIMEOUT_MS = settings.MONGODB_CONNECT_TIMEOUT_MS
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS
+MONGODB_SOCKET_TIMEOUT_MS = settings.MONGODB_SOCKET_TIMEOUT_MS
+## creates the indexes declared by the data access objects when the app starts, see face_auth/data_access/indexes.py
+ENSURE_INDEXES_ON_STARTUP = settings.ENSURE_INDEXES_ON_STARTUP
@@ -1,6 +1,46 @@
-EMBEDDING_SIZE = 128
+from face_auth.config.settings import settings
+
+## output size of the deepface recognition models, stored embeddings of another size are never compared
+EMBEDDING_DIMENSIONS = {
+    "VGG-Face": 2622,
+    "Facenet": 128,
+    "Facenet512": 512,
+    "OpenFace": 128,
+    "DeepFace": 4096,
+    "DeepID": 160,
+    "Dlib": 128,
+    "ArcFace": 512,
+    "SFace": 128,
+}
+EMBEDDING_SIZE = EMBEDDING_DIMENSIONS.get(settings.EMBEDDING_MODEL_NAME, 128)
 EMBEDDING_TYPE = 1
-SIMILARITY_THRESHOLD = 0.75
-DETECTOR_BACKEND = "mtcnn"
+SIMILARITY_THRESHOLD = settings.SIMILARITY_THRESHOLD
+## mtcnn, opencv (Haar cascade), ssd or cascade (a fast detector first, mtcnn when it is unsure)
+DETECTOR_BACKEND = settings.DETECTOR_BACKEND
 ENFORCE_DETECTION = False
-EMBEDDING_MODEL_NAME = "Facenet"
+EMBEDDING_MODEL_NAME = settings.EMBEDDING_MODEL_NAME
+## tensorflow (deepface Keras model), onnx, onnx-fp16 or onnx-int8 (ONNX Runtime on CPU)
+EMBEDDING_RUNTIME = settings.EMBEDDING_RUNTIME
+ONNX_MODEL_DIR = settings.ONNX_MODEL_DIR
+ONNX_INTRA_OP_THREADS = settings.ONNX_INTRA_OP_THREADS
+## threads of the TensorFlow models (Facenet, MTCNN) of the process, 0 lets TensorFlow use every core. launcher.py
+#  gives each of its workers its share of the cores so the workers do not oversubscribe them
+TF_INTRA_OP_THREADS = settings.TF_INTRA_OP_THREADS
+TF_INTER_OP_THREADS = settings.TF_INTER_OP_THREADS
+REPRESENT_DETECTOR_BACKEND = "opencv"
+NORMALIZATION = "base"
+MODEL_WARMUP = True
+WARMUP_IMAGE_SHAPE = (160, 160, 3)
+IDENTIFICATION_TOP_K = 5
+## largest top_k accepted by /application/identify
+IDENTIFICATION_MAX_TOP_K = 100
+SCORE_AGGREGATION = "mean_embedding"
+DECODE_MAX_SIDE = 1600
+DETECTION_MAX_SIDE = 640
+CASCADE_FAST_DETECTOR = settings.CASCADE_FAST_DETECTOR
+CASCADE_ACCURATE_DETECTOR = "mtcnn"
+HAAR_MIN_CONFIDENCE = settings.HAAR_MIN_CONFIDENCE
+SSD_MIN_CONFIDENCE = settings.SSD_MIN_CONFIDENCE
+## binary (versioned BSON Binary, see face_auth/data_access/embedding_codec.py) or array (list of doubles)
+EMBEDDING_STORAGE_FORMAT = settings.EMBEDDING_STORAGE_FORMAT
+EMBEDDING_STORAGE_DTYPE = settings.EMBEDDING_STORAGE_DTYPE
@@ -0,0 +1,23 @@
+from face_auth.config.settings import settings
+
+INFERENCE_EXECUTOR = settings.INFERENCE_EXECUTOR
+INFERENCE_MAX_WORKERS = settings.INFERENCE_MAX_WORKERS
+INFERENCE_MAX_QUEUE_SIZE = settings.INFERENCE_MAX_QUEUE_SIZE
+INFERENCE_TIMEOUT_SECONDS = settings.INFERENCE_TIMEOUT_SECONDS
+## host:port of the inference workers of the remote executor (python -m face_auth.inference.inference_worker)
+INFERENCE_WORKER_ADDRESSES = [
+    address.strip() for address in settings.INFERENCE_WORKER_ADDRESSES.split(",") if address.strip()
+]
+## key of the connection handshake between the API and the workers, its own secret: a client knowing it may send
+# jobs to the workers
+INFERENCE_WORKER_AUTHKEY = settings.INFERENCE_WORKER_AUTHKEY.encode()
+## how long the API waits at startup for the workers, which only listen once their models are loaded
+INFERENCE_WORKER_CONNECT_TIMEOUT_SECONDS = settings.INFERENCE_WORKER_CONNECT_TIMEOUT_SECONDS
+MICRO_BATCH_ENABLED = settings.MICRO_BATCH_ENABLED
+MICRO_BATCH_WINDOW_MS = settings.MICRO_BATCH_WINDOW_MS
+MICRO_BATCH_MAX_SIZE = settings.MICRO_BATCH_MAX_SIZE
+EARLY_EXIT_ENABLED = settings.EARLY_EXIT_ENABLED
+EARLY_EXIT_BATCH_SIZE = settings.EARLY_EXIT_BATCH_SIZE
+EARLY_EXIT_MIN_FRAMES = settings.EARLY_EXIT_MIN_FRAMES
+EARLY_EXIT_MARGIN = settings.EARLY_EXIT_MARGIN
+EARLY_EXIT_Z = settings.EARLY_EXIT_Z
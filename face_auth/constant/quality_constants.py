@@ -0,0 +1,16 @@
+from face_auth.config.settings import settings
+
+QUALITY_GATE_ENABLED = settings.QUALITY_GATE_ENABLED
+QUALITY_MIN_SHARPNESS = settings.QUALITY_MIN_SHARPNESS
+QUALITY_MIN_BRIGHTNESS = settings.QUALITY_MIN_BRIGHTNESS
+QUALITY_MAX_BRIGHTNESS = settings.QUALITY_MAX_BRIGHTNESS
+QUALITY_MIN_FACE_SIZE = settings.QUALITY_MIN_FACE_SIZE
+QUALITY_MIN_CONFIDENCE = settings.QUALITY_MIN_CONFIDENCE
+## minimal detector confidence per backend, their scores have different scales: MTCNN and SSD give a probability,
+#  the Haar cascade the level weight of its last stage. The fast backends reuse their cascade thresholds
+QUALITY_MIN_CONFIDENCE_BY_BACKEND = {
+    "mtcnn": QUALITY_MIN_CONFIDENCE,
+    "ssd": settings.SSD_MIN_CONFIDENCE,
+    "opencv": settings.HAAR_MIN_CONFIDENCE,
+}
+QUALITY_SAMPLE_SIZE = 160
@@ -0,0 +1,22 @@
+from face_auth.config.settings import settings
+
+EMBEDDING_INDEX_BACKEND = settings.EMBEDDING_INDEX_BACKEND
+## prefix of the index file the processes load at startup, only written by python -m
+#  face_auth.business_val.user_identification_val
+EMBEDDING_INDEX_PATH = settings.EMBEDDING_INDEX_PATH
+## prefix of an embedding snapshot (face_auth/data_access/embedding_snapshot.py) the index is built from
+EMBEDDING_SNAPSHOT_PATH = settings.EMBEDDING_SNAPSHOT_PATH
+## seconds after which an identification applies the embeddings written since the last check (by another process,
+#  or after the index file was written) to the index of the process, 0 only checks once after the index is loaded.
+#  The check reads the documents stamped after the last one applied through the index on updated_at.
+EMBEDDING_INDEX_REFRESH_SECONDS = settings.EMBEDDING_INDEX_REFRESH_SECONDS
+## the catch up reads again the documents stamped this many seconds before the latest applied one, a write is
+#  stamped before it commits and may become visible after a later stamp was read
+EMBEDDING_CATCH_UP_OVERLAP_SECONDS = 5
+IVF_N_LISTS = settings.IVF_N_LISTS
+IVF_N_PROBE = settings.IVF_N_PROBE
+IVF_TRAIN_SIZE = settings.IVF_TRAIN_SIZE
+IVF_TRAIN_ITERATIONS = settings.IVF_TRAIN_ITERATIONS
+HNSW_M = settings.HNSW_M
+HNSW_EF_CONSTRUCTION = settings.HNSW_EF_CONSTRUCTION
+HNSW_EF_SEARCH = settings.HNSW_EF_SEARCH
@@ -0,0 +1,5 @@
+from face_auth.config.settings import settings
+
+MAX_FRAME_SIZE_BYTES = settings.MAX_FRAME_SIZE_BYTES
+MAX_REQUEST_SIZE_BYTES = settings.MAX_REQUEST_SIZE_BYTES
+MAX_FRAMES_PER_REQUEST = settings.MAX_FRAMES_PER_REQUEST
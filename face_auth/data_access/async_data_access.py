@@ -0,0 +1,103 @@
+## Async form of the data access objects for the FastAPI handlers. pymongo is synchronous, so every call of
+#  UserData and UserEmbeddingData runs on a small dedicated thread pool and the event loop keeps serving other
+#  requests during the database round trips. The methods have the same names and arguments as the sync ones.
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+from face_auth.constant.database_constants import DB_EXECUTOR_WORKERS
+from face_auth.data_access.embedding_cache import embedding_cache
+from face_auth.data_access.user_data import UserData
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+
+## shared by every async data access object, separate from the inference executor so that database calls
+# never wait behind face embedding jobs
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="mongodb")
+
+
+async def run_in_db_executor(function, *args, **kwargs):
+    """Runs a blocking pymongo call on the database thread pool and returns its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(function, *args, **kwargs))
+
+
+async def _iterate_in_batches(iterator, batch_size: int) -> AsyncIterator:
+    ## every batch of the cursor is fetched in one executor call, not one call per document
+    def next_batch() -> list:
+        batch = []
+        for item in iterator:
+            batch.append(item)
+            if len(batch) == batch_size:
+                break
+        return batch
+
+    while True:
+        batch = await run_in_db_executor(next_batch)
+        for item in batch:
+            yield item
+        if len(batch) < batch_size:
+            return
+
+
+class AsyncUserData:
+    """Async form of UserData
+
+    Args:
+        user_data (UserData, optional): wrapped sync data access object. Defaults to UserData().
+    """
+
+    def __init__(self, user_data: UserData = None) -> None:
+        self.user_data = user_data or UserData()
+
+    async def save_user(self, user: dict) -> None:
+        await run_in_db_executor(self.user_data.save_user, user)
+
+    async def update_password(self, uuid_: str, hashed_password: str) -> None:
+        await run_in_db_executor(self.user_data.update_password, uuid_, hashed_password)
+
+    async def get_user(self, query: dict, projection: dict = None) -> Optional[dict]:
+        return await run_in_db_executor(self.user_data.get_user, query, projection)
+
+    async def get_all_users(self, projection: dict = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+        async for user in _iterate_in_batches(self.user_data.get_all_users(projection, batch_size), batch_size):
+            yield user
+
+
+class AsyncUserEmbeddingData:
+    """Async form of UserEmbeddingData
+
+    Args:
+        user_embedding_data (UserEmbeddingData, optional): wrapped sync data access object.
+            Defaults to UserEmbeddingData().
+    """
+
+    def __init__(self, user_embedding_data: UserEmbeddingData = None) -> None:
+        self.user_embedding_data = user_embedding_data or UserEmbeddingData()
+
+    async def save_user_embedding(self, uuid_: str, embedding_list) -> None:
+        await run_in_db_executor(self.user_embedding_data.save_user_embedding, uuid_, embedding_list)
+
+    async def get_user_embedding(self, uuid_: str) -> Optional[dict]:
+        return await run_in_db_executor(self.user_embedding_data.get_user_embedding, uuid_)
+
+    async def get_user_embedding_array(self, uuid_: str) -> Optional[np.ndarray]:
+        ## a cache hit is answered on the event loop, only a miss goes through the database thread pool
+        embedding = embedding_cache.get(uuid_)
+        if embedding is not None:
+            return embedding
+        return await run_in_db_executor(self.user_embedding_data.fetch_user_embedding_array, uuid_)
+
+    async def get_all_embeddings(self, batch_size: int = 1000) -> AsyncIterator[tuple]:
+        iterator = self.user_embedding_data.get_all_embeddings(batch_size)
+        async for item in _iterate_in_batches(iterator, batch_size):
+            yield item
+
+    async def count_embeddings(self) -> int:
+        return await run_in_db_executor(self.user_embedding_data.count_embeddings)
+
+    async def insert_embeddings(self, uuids: List[str], embeddings) -> None:
+        await run_in_db_executor(self.user_embedding_data.insert_embeddings, uuids, embeddings)
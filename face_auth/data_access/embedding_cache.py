@@ -0,0 +1,120 @@
+## In-process cache of the stored user embeddings. Every login used to read the embedding of the user from
+#  MongoDB and convert the 128 floats list with numpy, the cache keeps them as pre-normalized float32 arrays.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from face_auth.constant.cache_constants import (
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL_SECONDS,
+)
+
+
+class EmbeddingCache:
+    """Bounded LRU cache with a time to live, keyed by the UUID of the user.
+
+    A read missing the cache takes the generation before reading the database and passes it to put: an
+    invalidation of the user in between (a save of a new embedding) drops the put, so the embedding read before
+    the save is not cached for a whole TTL.
+
+    Args:
+        max_size (int): maximum number of cached embeddings, the least recently used one is evicted first
+        ttl_seconds (float): seconds after which a cached embedding is read again from the database
+    """
+
+    def __init__(
+        self, max_size: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.dropped_puts = 0
+        self._generation = 0
+        self._invalidations = OrderedDict()  ## uuid -> generation of its last invalidation, the most recent ones
+        self._forgotten_generation = 0  ## newest generation trimmed from _invalidations
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(embedding) -> np.ndarray:
+        """Returns the embedding as a read only L2 normalized float32 array"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+        embedding.setflags(write=False)
+        return embedding
+
+    def get(self, uuid_: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self.entries.get(uuid_)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self.entries[uuid_]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(uuid_)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        """Returns the current generation, taken before the database read of a cache miss"""
+        with self._lock:
+            return self._generation
+
+    def put(self, uuid_: str, embedding, generation: Optional[int] = None) -> np.ndarray:
+        """Normalizes and caches the embedding of the user
+
+        Args:
+            uuid_ (str): UUID of the user
+            embedding: embedding read from the database
+            generation (int, optional): generation taken before the read, the embedding is not cached when the
+                user was invalidated since. Defaults to None, always cached.
+
+        Returns:
+            np.ndarray: the normalized embedding
+        """
+        embedding = self.normalize(embedding)
+        with self._lock:
+            if generation is not None and self._invalidated_since(uuid_, generation):
+                self.dropped_puts += 1
+                return embedding
+            self.entries[uuid_] = (embedding, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(uuid_)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return embedding
+
+    def _invalidated_since(self, uuid_: str, generation: int) -> bool:
+        ## a user trimmed from the invalidation log may have been invalidated up to the newest trimmed generation
+        return self._invalidations.get(uuid_, self._forgotten_generation) > generation
+
+    def invalidate(self, uuid_: str) -> None:
+        with self._lock:
+            self.entries.pop(uuid_, None)
+            self._generation += 1
+            self._invalidations[uuid_] = self._generation
+            self._invalidations.move_to_end(uuid_)
+            while len(self._invalidations) > max(self.max_size, 1):
+                _, self._forgotten_generation = self._invalidations.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "dropped_puts": self.dropped_puts,
+        }
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,105 @@
+## Compact storage format of the embeddings in MongoDB. Instead of a BSON array of 128 doubles (each one with
+#  its own type byte and index key) the embedding is packed as float32 or float16 little endian values into a
+#  BSON Binary, preceded by a small versioned header:
+#
+#      magic "FE" | version (uint8) | dtype code (uint8) | dimension (uint16) | name length (uint8) | model name
+#
+#  Reads accept both formats, so documents written before the migration keep working. They also check the model
+#  name and the dimension of the header against the configured model: after a switch of EMBEDDING_MODEL_NAME,
+#  the embeddings of the previous model raise IncompatibleEmbedding instead of being compared with the new ones.
+
+import struct
+from typing import Optional, Union
+
+import numpy as np
+from bson.binary import Binary
+
+from face_auth.constant.embedding_constants import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_SIZE,
+    EMBEDDING_STORAGE_DTYPE,
+)
+
+MAGIC = b"FE"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<2sBBHB")
+DTYPE_CODES = {"float32": 1, "float16": 2}
+CODE_DTYPES = {code: np.dtype(name).newbyteorder("<") for name, code in DTYPE_CODES.items()}
+
+
+class IncompatibleEmbedding(ValueError):
+    """Raised when a stored embedding does not come from the configured model, the user is then handled as
+    not registered until the faces are registered again"""
+
+
+def encode_embedding(
+    embedding, dtype: str = EMBEDDING_STORAGE_DTYPE, model_name: str = EMBEDDING_MODEL_NAME
+) -> Binary:
+    """Packs an embedding into the versioned binary format
+
+    Args:
+        embedding: list or array of shape (dimension,)
+        dtype (str, optional): float32 or float16. Defaults to EMBEDDING_STORAGE_DTYPE.
+        model_name (str, optional): model the embedding comes from. Defaults to EMBEDDING_MODEL_NAME.
+
+    Returns:
+        Binary: value stored in the user_embed field
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(f"Invalid embedding storage dtype passed - {dtype}")
+    values = np.asarray(embedding, dtype=CODE_DTYPES[DTYPE_CODES[dtype]]).ravel()
+    name = model_name.encode()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, DTYPE_CODES[dtype], len(values), len(name))
+    return Binary(header + name + values.tobytes())
+
+
+def decode_header(value: bytes) -> dict:
+    """Returns the version, dtype, dimension, model name and payload offset of an encoded embedding"""
+    magic, version, dtype_code, dimension, name_length = HEADER.unpack_from(value)
+    if magic != MAGIC or version != FORMAT_VERSION or dtype_code not in CODE_DTYPES:
+        raise ValueError(f"Unknown embedding encoding: magic {magic}, version {version}, dtype {dtype_code}")
+    name_end = HEADER.size + name_length
+    return {
+        "version": version,
+        "dtype": CODE_DTYPES[dtype_code],
+        "dimension": dimension,
+        "model_name": bytes(value[HEADER.size : name_end]).decode(),
+        "offset": name_end,
+    }
+
+
+def decode_embedding(
+    value: Union[bytes, list],
+    model_name: Optional[str] = EMBEDDING_MODEL_NAME,
+    dimension: Optional[int] = EMBEDDING_SIZE,
+) -> np.ndarray:
+    """Returns the stored embedding as an array, whatever its storage format
+
+    Args:
+        value (bytes | list): user_embed field, encoded binary or list of floats
+        model_name (str, optional): model the embedding must come from, None skips the check. The list format
+            has no model name, only its dimension is checked. Defaults to EMBEDDING_MODEL_NAME.
+        dimension (int, optional): size the embedding must have, None skips the check. Defaults to EMBEDDING_SIZE.
+
+    Raises:
+        IncompatibleEmbedding: the embedding comes from another model
+
+    Returns:
+        np.ndarray: read only view over the stored bytes for the binary format, float32 array for the list
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        header = decode_header(value)
+        if model_name is not None and header["model_name"] != model_name:
+            raise IncompatibleEmbedding(f"embedding of the model {header['model_name']}, not {model_name}")
+        if dimension is not None and header["dimension"] != dimension:
+            raise IncompatibleEmbedding(f"embedding of dimension {header['dimension']}, not {dimension}")
+        ## no copy, the array reads the payload of the BSON value directly
+        return np.frombuffer(value, dtype=header["dtype"], count=header["dimension"], offset=header["offset"])
+    embedding = np.asarray(value, dtype=np.float32)
+    if dimension is not None and embedding.size != dimension:
+        raise IncompatibleEmbedding(f"embedding of dimension {embedding.size}, not {dimension}")
+    return embedding
+
+
+def is_encoded(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview))
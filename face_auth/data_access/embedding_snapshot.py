@@ -0,0 +1,169 @@
+## Bulk export and import of the embedding collection through an on-disk snapshot. A snapshot is made of
+#  three .npy files sharing a prefix:
+#
+#      <path>.embeddings.npy   float32 matrix (N, dimension) of unit length rows
+#      <path>.norms.npy        float32 (N,) norm of every stored embedding, so an import restores them exactly
+#      <path>.uuids.npy        (N,) UUIDs, row i belongs to uuids[i]
+#      <path>.synced_until.npy updated_at of the latest embedding when the export started, the index built from
+#                              the snapshot catches up on the embeddings written since
+#
+#  The matrix is opened with np.load(mmap_mode="r"), so every worker process maps the same page cache pages
+#  instead of holding its own copy, and the exact index can search it without a copy since it is normalized.
+
+import argparse
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.exception import AppException
+from face_auth.logger import logging
+
+
+class EmbeddingSnapshot(NamedTuple):
+    uuids: List[str]
+    matrix: np.ndarray  ## read only memory map of the unit length embeddings
+    norms: np.ndarray
+    synced_until: Optional[datetime] = None
+
+
+def snapshot_exists(path: str) -> bool:
+    return all(os.path.isfile(path + suffix) for suffix in (".embeddings.npy", ".norms.npy", ".uuids.npy"))
+
+
+def export_embedding_snapshot(
+    path: str, user_embedding_data: UserEmbeddingData = None, batch_size: int = 1000, dimension: int = EMBEDDING_SIZE
+) -> int:
+    """Streams the embedding collection into a snapshot without holding the matrix in memory
+
+    Args:
+        path (str): prefix of the snapshot files
+        user_embedding_data (UserEmbeddingData, optional): source collection. Defaults to UserEmbeddingData().
+        batch_size (int, optional): documents fetched per round trip. Defaults to 1000.
+        dimension (int, optional): size of the embeddings. Defaults to EMBEDDING_SIZE.
+
+    Returns:
+        int: number of exported users
+    """
+    try:
+        user_embedding_data = user_embedding_data or UserEmbeddingData()
+        ## read before the scan, the embeddings written during it are read again by the catch up
+        synced_until = user_embedding_data.latest_update()
+        uuids, norms, seen = [], [], set()
+        rows_path = path + ".embeddings.rows.tmp"
+        ## the rows are appended to a raw file first, the .npy header needs the final row count
+        with open(rows_path, "wb") as rows:
+            block = []
+            for uuid_, embedding in user_embedding_data.get_all_embeddings(batch_size):
+                if uuid_ in seen:  ## like find_one, the first document of a UUID is the one used
+                    continue
+                seen.add(uuid_)
+                uuids.append(uuid_)
+                block.append(embedding)
+                if len(block) == batch_size:
+                    norms.append(_write_rows(rows, block, dimension))
+                    block = []
+            if block:
+                norms.append(_write_rows(rows, block, dimension))
+        norms = np.concatenate(norms) if norms else np.empty((0,), np.float32)
+
+        matrix_tmp = path + ".embeddings.npy.tmp"
+        with open(matrix_tmp, "wb") as matrix, open(rows_path, "rb") as rows:
+            header = {"descr": "<f4", "fortran_order": False, "shape": (len(uuids), dimension)}
+            np.lib.format.write_array_header_1_0(matrix, header)
+            shutil.copyfileobj(rows, matrix, 16 * 1024 * 1024)
+        os.remove(rows_path)
+        _save_atomic(path + ".norms.npy", norms)
+        _save_atomic(path + ".uuids.npy", np.asarray(uuids, dtype=str))
+        _save_atomic(path + ".synced_until.npy", np.array(synced_until or "NaT", dtype="datetime64[ms]"))
+        ## the matrix is swapped last, load checks that it matches the sidecar files
+        os.replace(matrix_tmp, path + ".embeddings.npy")
+        logging.info(f"Exported {len(uuids)} embeddings to the snapshot {path}.......")
+        return len(uuids)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def _write_rows(rows, block: list, dimension: int) -> np.ndarray:
+    embeddings = np.asarray(block, dtype=np.float32).reshape(-1, dimension)
+    norms = np.linalg.norm(embeddings, axis=1)
+    rows.write(np.ascontiguousarray(embeddings / np.where(norms == 0, 1, norms)[:, None], dtype="<f4").tobytes())
+    return norms.astype(np.float32)
+
+
+def _save_atomic(path: str, array: np.ndarray) -> None:
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def load_embedding_snapshot(path: str) -> EmbeddingSnapshot:
+    """Memory maps a snapshot written by export_embedding_snapshot
+
+    Args:
+        path (str): prefix of the snapshot files
+
+    Returns:
+        EmbeddingSnapshot: UUIDs, read only matrix of unit length embeddings and their norms
+    """
+    try:
+        matrix = np.load(path + ".embeddings.npy", mmap_mode="r")
+        norms = np.load(path + ".norms.npy")
+        uuids = np.load(path + ".uuids.npy").tolist()
+        if not len(uuids) == len(norms) == len(matrix):
+            raise ValueError(f"Inconsistent embedding snapshot {path}: {len(matrix)} rows, {len(uuids)} UUIDs")
+        synced_until = None  ## snapshots exported before the file was written have none
+        if os.path.isfile(path + ".synced_until.npy"):
+            synced_until = np.load(path + ".synced_until.npy").item()
+        return EmbeddingSnapshot(uuids, matrix, norms, synced_until)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def import_embedding_snapshot(
+    path: str, user_embedding_data: UserEmbeddingData = None, batch_size: int = 1000
+) -> int:
+    """Bulk upserts the embeddings of a snapshot into the embedding collection, replacing the stored embeddings
+    of the same UUIDs
+
+    Args:
+        path (str): prefix of the snapshot files
+        user_embedding_data (UserEmbeddingData, optional): target collection. Defaults to UserEmbeddingData().
+        batch_size (int, optional): documents per bulk write. Defaults to 1000.
+
+    Returns:
+        int: number of imported users
+    """
+    try:
+        user_embedding_data = user_embedding_data or UserEmbeddingData()
+        snapshot = load_embedding_snapshot(path)
+        for start in range(0, len(snapshot.uuids), batch_size):
+            end = start + batch_size
+            embeddings = snapshot.matrix[start:end] * snapshot.norms[start:end, None]
+            user_embedding_data.insert_embeddings(snapshot.uuids[start:end], embeddings)
+        logging.info(f"Imported {len(snapshot.uuids)} embeddings from the snapshot {path}.......")
+        return len(snapshot.uuids)
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export or import the embedding collection as a snapshot")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="prefix of the snapshot files")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(f"exported {export_embedding_snapshot(args.path, batch_size=args.batch_size)} embeddings")
+    else:
+        print(f"imported {import_embedding_snapshot(args.path, batch_size=args.batch_size)} embeddings")
+
+
+if __name__ == "__main__":
+    main()
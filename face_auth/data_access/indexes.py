@@ -0,0 +1,64 @@
+## Indexes of the collections, declared by the data access objects (UNIQUE_FIELDS, INDEXED_FIELDS) and created
+#  at startup.
+#  Every lookup of the app is an equality on one of these fields, without them each login, registration and
+#  embedding read is a collection scan. The unique indexes also make the database reject a second user with the
+#  same username, email id or UUID, which closes the race between the duplicate check and the insert.
+
+import sys
+
+import pymongo
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from face_auth.data_access.user_data import UserData
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.exception import AppException
+from face_auth.logger import logging
+
+
+def ensure_unique_index(collection, field: str) -> bool:
+    """Creates the unique index of the field, or a plain index when the collection already holds duplicates
+
+    Args:
+        collection: MongoDB collection
+        field (str): indexed field
+
+    Returns:
+        bool: whether the index is unique
+    """
+    try:
+        ## create_index is a no-op when the index already exists
+        collection.create_index([(field, pymongo.ASCENDING)], unique=True, name=f"{field}_unique")
+        return True
+    except (DuplicateKeyError, OperationFailure) as e:
+        logging.warning(
+            f"Unique index on {collection.name}.{field} not created ({e}), the duplicates have to be removed. "
+            f"Creating a non unique index......."
+        )
+        collection.create_index([(field, pymongo.ASCENDING)], name=f"{field}_1")
+        return False
+
+
+def ensure_indexes(*data_access_objects) -> dict:
+    """Creates the indexes declared by the UNIQUE_FIELDS and INDEXED_FIELDS of the data access objects
+
+    Args:
+        data_access_objects: UserData, UserEmbeddingData... Defaults to both.
+
+    Returns:
+        dict: {"collection.field": whether the index is unique}, the plain indexes are False
+    """
+    try:
+        if not data_access_objects:
+            data_access_objects = (UserData(), UserEmbeddingData())
+        indexes = {}
+        for data_access_object in data_access_objects:
+            collection = data_access_object.collection
+            for field in data_access_object.UNIQUE_FIELDS:
+                indexes[f"{collection.name}.{field}"] = ensure_unique_index(collection, field)
+            for field in getattr(data_access_object, "INDEXED_FIELDS", ()):
+                collection.create_index([(field, pymongo.ASCENDING)], name=f"{field}_1")
+                indexes[f"{collection.name}.{field}"] = False
+        logging.info(f"Database indexes ensured: {indexes}.......")
+        return indexes
+    except Exception as e:
+        raise AppException(e, sys) from e
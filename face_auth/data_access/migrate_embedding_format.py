@@ -0,0 +1,82 @@
+## Rewrites the stored embeddings from BSON arrays of doubles to the binary format of embedding_codec, in
+#  batches of bulk updates so that the collection stays readable while it runs. The app reads both formats,
+#  so the migration can run against a live database, and --reverse converts the documents back to arrays.
+#
+#      python -m face_auth.data_access.migrate_embedding_format [--dry-run] [--reverse] [--batch-size 1000]
+
+import argparse
+import sys
+
+import bson
+from pymongo import UpdateOne
+
+from face_auth.constant.embedding_constants import EMBEDDING_STORAGE_DTYPE
+from face_auth.data_access.embedding_codec import decode_embedding, encode_embedding
+from face_auth.data_access.user_embedding_data import UserEmbeddingData
+from face_auth.exception import AppException
+from face_auth.logger import logging
+
+
+def migrate_embedding_format(
+    collection, reverse: bool = False, dtype: str = EMBEDDING_STORAGE_DTYPE, batch_size: int = 1000,
+    dry_run: bool = False,
+) -> dict:
+    """Converts every embedding document still in the source format
+
+    Args:
+        collection: embedding collection
+        reverse (bool, optional): converts binary embeddings back to arrays. Defaults to False.
+        dtype (str, optional): float32 or float16 payload of the binary format. Defaults to EMBEDDING_STORAGE_DTYPE.
+        batch_size (int, optional): documents per bulk write. Defaults to 1000.
+        dry_run (bool, optional): only counts the documents and bytes. Defaults to False.
+
+    Returns:
+        dict: converted documents, and BSON size of the user_embed fields before and after
+    """
+    try:
+        source_type = "binData" if reverse else "array"
+        report = {"documents": 0, "bytes_before": 0, "bytes_after": 0}
+        cursor = collection.find(
+            {"user_embed": {"$type": source_type}}, {"_id": 1, "user_embed": 1}, batch_size=batch_size
+        )
+        updates = []
+        for document in cursor:
+            ## a format conversion only, the embeddings of every model are converted
+            embedding = decode_embedding(document["user_embed"], model_name=None, dimension=None)
+            converted = embedding.astype(float).tolist() if reverse else encode_embedding(embedding, dtype)
+            report["documents"] += 1
+            report["bytes_before"] += len(bson.encode({"user_embed": document["user_embed"]}))
+            report["bytes_after"] += len(bson.encode({"user_embed": converted}))
+            updates.append(UpdateOne({"_id": document["_id"]}, {"$set": {"user_embed": converted}}))
+            if len(updates) == batch_size:
+                if not dry_run:
+                    collection.bulk_write(updates, ordered=False)
+                updates = []
+        if updates and not dry_run:
+            collection.bulk_write(updates, ordered=False)
+        logging.info(f"Embedding format migration {'(dry run) ' if dry_run else ''}report: {report}")
+        return report
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert the stored embeddings to the compact binary format")
+    parser.add_argument("--reverse", action="store_true", help="convert binary embeddings back to arrays")
+    parser.add_argument("--dtype", default=EMBEDDING_STORAGE_DTYPE, choices=["float32", "float16"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be converted")
+    args = parser.parse_args()
+
+    report = migrate_embedding_format(
+        UserEmbeddingData().collection, args.reverse, args.dtype, args.batch_size, args.dry_run
+    )
+    saved = report["bytes_before"] - report["bytes_after"]
+    print(
+        f"{'would convert' if args.dry_run else 'converted'} {report['documents']} documents, "
+        f"user_embed size {report['bytes_before']} -> {report['bytes_after']} bytes ({saved} bytes saved)"
+    )
+
+
+if __name__ == "__main__":
+    main()
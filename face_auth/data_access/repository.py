@@ -0,0 +1,34 @@
+## Request-scoped access to the database for the FastAPI handlers. The data access objects and the pooled
+#  MongoClient behind them are built once per process, every request gets a light Repository through the
+#  get_repository dependency instead of building UserData and UserEmbeddingData again.
+
+from typing import Optional
+
+from face_auth.data_access.async_data_access import AsyncUserData, AsyncUserEmbeddingData
+
+
+class Repository:
+    """Data access objects of one request
+
+    Args:
+        users (AsyncUserData): user collection
+        embeddings (AsyncUserEmbeddingData): embedding collection
+    """
+
+    def __init__(self, users: AsyncUserData, embeddings: AsyncUserEmbeddingData) -> None:
+        self.users = users
+        self.embeddings = embeddings
+
+
+_users: Optional[AsyncUserData] = None
+_embeddings: Optional[AsyncUserEmbeddingData] = None
+
+
+def get_repository() -> Repository:
+    """FastAPI dependency returning the repository of the request, e.g.
+    `repository: Repository = Depends(get_repository)`"""
+    global _users, _embeddings
+    ## built on the first request, not at import, so importing the controllers does not need the database
+    if _users is None:
+        _users, _embeddings = AsyncUserData(), AsyncUserEmbeddingData()
+    return Repository(_users, _embeddings)
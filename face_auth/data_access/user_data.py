@@ -8,20 +8,37 @@ class UserData:
     like get_user and save_user
     """
 
+    ## fields with a unique index, created at startup by face_auth.data_access.indexes.ensure_indexes
+    UNIQUE_FIELDS = ("UUID", "username", "email_id")
+
     def __init__(self) -> None:
         self.client = MongodbClient()
         self.collection_name = USER_COLLECTION_NAME
         self.collection = self.client.database[self.collection_name]
 
     def save_user(self, user: User) -> None:
+        ## raises pymongo.errors.DuplicateKeyError when the username, email id or UUID is already taken
         self.collection.insert_one(user)
 
-    def get_user(self, query: dict):
-        user = self.collection.find_one(query)
+    def update_password(self, uuid_: str, hashed_password: str) -> None:
+        self.collection.update_one({"UUID": uuid_}, {"$set": {"password": hashed_password}})
+
+    def get_user(self, query: dict, projection: dict = None):
+        user = self.collection.find_one(query, projection)
         return user
 
-    def get_all_users(self):
-        pass
+    def get_all_users(self, projection: dict = None, batch_size: int = 1000):
+        """Streams the user documents, the password hash is left out unless the projection asks for it
+
+        Args:
+            projection (dict, optional): fields to return. Defaults to every field but the password.
+            batch_size (int, optional): documents fetched per round trip. Defaults to 1000.
+
+        Yields:
+            dict: user document
+        """
+        projection = projection or {"_id": 0, "password": 0}
+        yield from self.collection.find({}, projection).batch_size(batch_size)
 
     def delete_user(self, user_id: str) -> None:
         pass
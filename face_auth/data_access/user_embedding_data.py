@@ -1,19 +1,53 @@
 ## This code is for a python class named "UserEmbeddingData". It interacts with a MongoDB database to
 #  store and retrieve user data based on user UUIDs.
 
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
 from face_auth.config.database import MongodbClient
 from face_auth.constant.database_constants import EMBEDDING_COLLECTION_NAME
+from face_auth.constant.embedding_constants import EMBEDDING_MODEL_NAME, EMBEDDING_STORAGE_FORMAT
+from face_auth.data_access.embedding_cache import embedding_cache
+from face_auth.data_access.embedding_codec import IncompatibleEmbedding, decode_embedding, encode_embedding
+from face_auth.logger import logging
 
 
 class UserEmbeddingData:
+    ## fields with a unique index, created at startup by face_auth.data_access.indexes.ensure_indexes
+    UNIQUE_FIELDS = ("UUID",)
+    ## fields with a plain index, updated_at is the field the identification indexes catch up on
+    INDEXED_FIELDS = ("updated_at",)
+
     def __init__(self) -> None:
         self.client = MongodbClient() ## object of the "MongodbClient" class and stores it in the "client" attribute of the current object.
         self.collection_name = EMBEDDING_COLLECTION_NAME ## stores the value of the "EMBEDDING_COLLECTION_NAME" constant in the "collection_name" attribute of the current object.
         self.collection = self.client.database[self.collection_name] ##  gets the collection from the
 # MongoDB database specified by the "collection_name" attribute and stores it in the "collection" attribute of the current object.
 
+    @staticmethod
+    def encode(embedding):
+        ## the embedding is packed into a compact BSON Binary unless EMBEDDING_STORAGE_FORMAT is "array"
+        if EMBEDDING_STORAGE_FORMAT == "binary":
+            return encode_embedding(embedding)
+        return np.asarray(embedding, dtype=float).tolist()
+
+    def update(self, embedding) -> dict:
+        ## updated_at is stamped by the database server, so the stamps of every API process share one clock
+        return {"$set": {"user_embed": self.encode(embedding)}, "$currentDate": {"updated_at": True}}
+
     def save_user_embedding(self, uuid_: str, embedding_list) -> None: ##  "save_user_embedding" method, which takes a UUID string and an embedding list as input parameters.
-        self.collection.insert_one({"UUID": uuid_, "user_embed": embedding_list}) ## This line inserts a new document into the collection in the MongoDB database. The document consists of the UUID string and the embedding list.
+        update = self.update(embedding_list) ## The document consists of the UUID string, the embedding and the time of the write.
+        ## upsert, a new registration of the faces replaces the stored embedding instead of adding a second
+        # document for the UUID
+        try:
+            self.collection.update_one({"UUID": uuid_}, update, upsert=True)
+        except DuplicateKeyError:  ## two concurrent upserts of a new UUID, the second one becomes an update
+            self.collection.update_one({"UUID": uuid_}, update, upsert=True)
+        embedding_cache.invalidate(uuid_) ## the cached embedding of this user is stale now
 
     def get_user_embedding(self, uuid_: str) -> dict: ## "get_user_embedding" method, which takes a UUID string as input parameter and returns a dictionary.
         user: dict = self.collection.find_one({"UUID": uuid_}) #This line finds the document in the collection that matches the given UUID and stores it in the "user" variable.
@@ -21,3 +55,117 @@ class UserEmbeddingData:
             return user
         else:
             return None ## otherwise None is returned.
+
+    def get_user_embedding_array(self, uuid_: str) -> Optional[np.ndarray]:
+        """Returns the stored embedding of the user as a normalized float32 array, served from the
+        embedding cache when possible
+
+        Args:
+            uuid_ (str): UUID of the user
+
+        Returns:
+            Optional[np.ndarray]: normalized embedding, None if the user has no embedding
+        """
+        embedding = embedding_cache.get(uuid_)
+        if embedding is not None:
+            return embedding
+        return self.fetch_user_embedding_array(uuid_)
+
+    def fetch_user_embedding_array(self, uuid_: str) -> Optional[np.ndarray]:
+        """Reads the stored embedding of the user from the database, bypassing the cache, and caches it unless
+        the embedding of the user was saved again during the read"""
+        generation = embedding_cache.generation()
+        user = self.collection.find_one({"UUID": uuid_}, {"_id": 0, "user_embed": 1})
+        if user is None or user.get("user_embed") is None:
+            return None
+        try:
+            embedding = decode_embedding(user["user_embed"])
+        except IncompatibleEmbedding as e:  ## stored by another model, the user has to register the faces again
+            logging.warning(f"Stored embedding of {uuid_} ignored: {e}.......")
+            return None
+        return embedding_cache.put(uuid_, embedding, generation)
+
+    def get_all_embeddings(self, batch_size: int = 1000):
+        """Streams the UUID and the embedding of every stored document
+
+        Args:
+            batch_size (int, optional): documents fetched per round trip. Defaults to 1000.
+
+        Yields:
+            tuple: (UUID, embedding array), both storage formats are decoded
+        """
+        cursor = self.collection.find(
+            {"user_embed": {"$ne": None}}, {"_id": 0, "UUID": 1, "user_embed": 1}
+        ).batch_size(batch_size)
+        for document, embedding in self.decode_documents(cursor):
+            yield document["UUID"], embedding
+
+    @staticmethod
+    def decode_documents(documents):
+        """Yields (document, embedding array) of the documents, skipping the embeddings of another model"""
+        skipped = 0
+        for document in documents:
+            try:
+                embedding = decode_embedding(document["user_embed"])
+            except IncompatibleEmbedding:
+                skipped += 1
+                continue
+            yield document, embedding
+        if skipped:
+            logging.warning(f"{skipped} stored embeddings not computed by {EMBEDDING_MODEL_NAME} skipped.......")
+
+    def latest_update(self) -> Optional[datetime]:
+        """Returns the updated_at of the last written embedding, None when no embedding was stamped yet"""
+        document = self.collection.find_one(
+            {"updated_at": {"$ne": None}}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", DESCENDING)]
+        )
+        return None if document is None else document["updated_at"]
+
+    def get_embeddings_updated_since(self, since: Optional[datetime], batch_size: int = 1000):
+        """Streams the embeddings written at or after since, in the order they were written
+
+        Args:
+            since (Optional[datetime]): updated_at of the oldest returned document, None returns every stamped one
+            batch_size (int, optional): documents fetched per round trip. Defaults to 1000.
+
+        Yields:
+            tuple: (UUID, embedding array, updated_at), both storage formats are decoded
+        """
+        query = {"updated_at": {"$ne": None} if since is None else {"$gte": since}, "user_embed": {"$ne": None}}
+        cursor = (
+            self.collection.find(query, {"_id": 0, "UUID": 1, "user_embed": 1, "updated_at": 1})
+            .sort("updated_at", ASCENDING)
+            .batch_size(batch_size)
+        )
+        for document, embedding in self.decode_documents(cursor):
+            yield document["UUID"], embedding, document["updated_at"]
+
+    def count_embeddings(self) -> int:
+        return self.collection.count_documents({"user_embed": {"$ne": None}})
+
+    def insert_embeddings(self, uuids: List[str], embeddings) -> None:
+        """Bulk upserts the embeddings of several users in one round trip. Like save_user_embedding, the
+        embedding of a UUID already stored is replaced, so a snapshot can be imported into a non empty collection.
+
+        Args:
+            uuids (List[str]): UUIDs of the users
+            embeddings: array of shape (len(uuids), dimension)
+        """
+        if len(uuids) == 0:
+            return
+        requests = [
+            UpdateOne({"UUID": uuid_}, self.update(embedding), upsert=True)
+            for uuid_, embedding in zip(uuids, embeddings)
+        ]
+        try:
+            try:
+                self.collection.bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                ## concurrent upserts of new UUIDs, the documents exist now and the retry replaces them
+                errors = e.details.get("writeErrors", [])
+                if not errors or any(error.get("code") != 11000 for error in errors):
+                    raise
+                self.collection.bulk_write([requests[error["index"]] for error in errors], ordered=False)
+        finally:
+            for uuid_ in uuids: ## part of the batch may be written even when the bulk write fails
+                embedding_cache.invalidate(uuid_)
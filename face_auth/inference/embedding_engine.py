@@ -0,0 +1,192 @@
+## This module holds the batched embedding engine. Instead of running one Facenet forward pass per
+#  uploaded frame, all frames of a request are decoded, their faces are detected and preprocessed, and the
+#  aligned crops are stacked into a single tensor so the model runs only once per request.
+
+import io
+import sys
+from ast import Bytes
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from face_auth.constant.embedding_constants import (
+    ENFORCE_DETECTION,
+    NORMALIZATION,
+    REPRESENT_DETECTOR_BACKEND,
+)
+from face_auth.constant.quality_constants import QUALITY_GATE_ENABLED
+from face_auth.exception import AppException
+from face_auth.inference.face_detectors import FaceDetection
+from face_auth.inference.image_preprocessor import ImagePreprocessor
+from face_auth.inference.model_registry import ModelRegistry
+from face_auth.inference.quality_gate import FrameQualityGate, quality_gate
+from face_auth.logger import logging
+
+
+class BatchEmbeddingEngine:
+    """Generates face embeddings for all frames of a request with a single model inference.
+
+    The per-frame preprocessing is the one `DeepFace.represent` applies, so the embeddings returned here
+    match the ones of `UserLoginEmbeddingValidation.generate_embedding`, except that the frames go through
+    the ImagePreprocessor first: they are decoded upright at a bounded size and the detector backend of the
+    registry runs on a downscaled copy.
+    """
+
+    def __init__(
+        self,
+        enforce_detection: bool = ENFORCE_DETECTION,
+        quality_gate: Optional[FrameQualityGate] = quality_gate if QUALITY_GATE_ENABLED else None,
+    ) -> None:
+        self.enforce_detection = enforce_detection
+        self.quality_gate = quality_gate
+        self.preprocessor = ImagePreprocessor()
+
+    @property
+    def model(self):
+        ## the model is built once per process by the registry and shared by every engine
+        return ModelRegistry.get_embedding_model()
+
+    @property
+    def target_size(self) -> tuple:
+        from deepface.commons import functions
+
+        input_shape_x, input_shape_y = functions.find_input_shape(self.model)
+        return (input_shape_y, input_shape_x)
+
+    @staticmethod
+    def decode_image(contents) -> np.ndarray:
+        """Decode an uploaded frame into a full resolution image array, as the per-image path does
+
+        Args:
+            contents (bytes | file): Bytes of the image, or the binary file it was spooled to
+
+        Returns:
+            np.ndarray: image array
+        """
+        ## a file is decoded in place, without first copying its content into bytes
+        source = contents if hasattr(contents, "read") else io.BytesIO(contents)
+        with Image.open(source) as image:
+            return np.array(image)
+
+    def detect(self, img_array: np.ndarray) -> Optional[FaceDetection]:
+        """Detect and align the face of a single frame with the detector backend of the registry
+
+        Args:
+            img_array (np.ndarray): image array of the frame
+
+        Returns:
+            FaceDetection: the face, None when no face is found
+        """
+        try:
+            return ModelRegistry.get_detector().detect(img_array)
+        except Exception:  ## the alignment fails when the detected face has an empty shape
+            return None
+
+    def detect_face(self, img_array: np.ndarray, detection: Optional[FaceDetection] = None) -> np.ndarray:
+        """Detect and align the face of a single frame
+
+        Args:
+            img_array (np.ndarray): image array of the frame
+            detection (FaceDetection, optional): detection of the frame when it is already known
+
+        Returns:
+            np.ndarray: face crop, or the whole frame when no face is found and detection is not enforced
+        """
+        ## same logic as deepface.commons.functions.detect_face but with the detector backend of the registry
+        detection = detection or self.detect(img_array)
+        if detection is not None and isinstance(detection.face, np.ndarray):
+            return detection.face
+        if self.enforce_detection:
+            raise ValueError("Face could not be detected. Please confirm that the picture is a face photo.")
+        return img_array
+
+    def preprocess_face(self, face: np.ndarray) -> np.ndarray:
+        """Resize, pad and normalize a face crop to the input of the embedding model
+
+        Args:
+            face (np.ndarray): face crop returned by detect_face
+
+        Returns:
+            np.ndarray: array of shape (1, height, width, 3)
+        """
+        from deepface.commons import functions
+
+        img_pixels = functions.preprocess_face(
+            img=face,
+            target_size=self.target_size,
+            enforce_detection=False,
+            detector_backend=REPRESENT_DETECTOR_BACKEND,
+        )
+        return functions.normalize_input(img=img_pixels, normalization=NORMALIZATION)
+
+    def represent_faces(self, faces: np.ndarray) -> np.ndarray:
+        """Run one inference of the embedding model over a batch of preprocessed faces
+
+        Args:
+            faces (np.ndarray): array of shape (n, height, width, 3)
+
+        Returns:
+            np.ndarray: embeddings of shape (n, embedding size)
+        """
+        if len(faces) == 0:
+            return np.empty((0, self.model.output_shape[-1]), dtype=np.float32)
+        return np.asarray(self.model.predict_on_batch(faces))
+
+    def extract_gated_faces(self, files: List[Bytes]) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Decode all frames, detect their faces, drop the frames rejected by the quality gate and stack the
+        preprocessed crops of the others
+
+        Args:
+            files (List[Bytes]): Bytes of images, or the binary files they were spooled to
+
+        Returns:
+            tuple: faces of shape (accepted frames, height, width, 3) and the rejection reason of every frame,
+                None for the accepted ones
+        """
+        try:
+            frames = [self.preprocessor.decode(contents) for contents in files]
+            detections = [self.detect(frame) for frame in frames]
+            reasons = self.quality_gate.check(detections) if self.quality_gate else [None] * len(frames)
+            faces = [
+                self.preprocess_face(self.detect_face(frame, detection))
+                for frame, detection, reason in zip(frames, detections, reasons)
+                if reason is None
+            ]
+            if len(faces) == 0:
+                return np.empty((0,) + self.target_size + (3,), dtype=np.float32), reasons
+            return np.concatenate(faces, axis=0), reasons
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def extract_faces(self, files: List[Bytes]) -> np.ndarray:
+        """Decode all frames, detect their faces and stack the preprocessed crops of the frames accepted by
+        the quality gate
+
+        Args:
+            files (List[Bytes]): Bytes of images, or the binary files they were spooled to
+
+        Returns:
+            np.ndarray: faces of shape (accepted frames, height, width, 3)
+        """
+        return self.extract_gated_faces(files)[0]
+
+    def generate_embedding_batch(self, files: List[Bytes]) -> np.ndarray:
+        """Decode all frames, detect their faces and embed them in a single batch
+
+        Args:
+            files (List[Bytes]): Bytes of images
+
+        Returns:
+            np.ndarray: embeddings of shape (accepted frames, embedding size)
+        """
+        try:
+            faces = self.extract_faces(files)
+            logging.info(f"Running batched inference on {len(faces)} frames.......")
+            return self.represent_faces(faces)
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def generate_embedding_list(self, files: List[Bytes]) -> List[np.ndarray]:
+        """Same as generate_embedding_batch but returns one embedding per frame"""
+        return list(self.generate_embedding_batch(files))
@@ -0,0 +1,204 @@
+## Face detector backends of the embedding engine. Every backend runs on the downscaled copy of the frame
+#  prepared by the ImagePreprocessor and returns the aligned face cropped from the frame itself. The cascade
+#  backend runs a fast detector first and only falls back to MTCNN when the fast one is unsure. deepface is
+#  imported where the detectors are built and used, so importing the backends does not load TensorFlow.
+
+import abc
+import threading
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from face_auth.constant.embedding_constants import (
+    CASCADE_ACCURATE_DETECTOR,
+    CASCADE_FAST_DETECTOR,
+    HAAR_MIN_CONFIDENCE,
+    SSD_MIN_CONFIDENCE,
+)
+from face_auth.inference.image_preprocessor import ImagePreprocessor
+
+
+class FaceDetection(NamedTuple):
+    face: np.ndarray  ## aligned face crop of the frame
+    region: tuple  ## (x, y, w, h) of the face in the frame
+    confidence: float  ## score of the backend, its scale depends on the backend
+    faces_found: int  ## number of faces in the frame, only the most confident one is returned
+    backend: str  ## name of the detector which found the face, the scale of its confidence
+
+
+class BaseFaceDetector(abc.ABC):
+    """Base class of the detector backends, a backend without detect cannot be instantiated.
+
+    Args:
+        preprocessor (ImagePreprocessor, optional): downscales the frames before the detection
+    """
+
+    name = None
+    ## confidence from which the detection is trusted by the cascade without running MTCNN
+    min_confidence = 0.0
+
+    def __init__(self, preprocessor: ImagePreprocessor = None) -> None:
+        self.preprocessor = preprocessor or ImagePreprocessor()
+
+    @abc.abstractmethod
+    def detect(self, img: np.ndarray) -> Optional[FaceDetection]:
+        """Detect and align the most confident face of the frame
+
+        Args:
+            img (np.ndarray): decoded frame
+
+        Returns:
+            FaceDetection: the face, None when no face is found
+        """
+
+    def is_confident(self, detection: Optional[FaceDetection]) -> bool:
+        return detection is not None and detection.faces_found == 1 and detection.confidence >= self.min_confidence
+
+    def crop(self, img: np.ndarray, box, scale: float) -> tuple:
+        ## maps the box found on the downscaled copy back to the frame and crops it
+        x, y, w, h = self.preprocessor.map_box(box, scale, img.shape)
+        return img[y : y + h, x : x + w], (x, y, w, h)
+
+
+class MtcnnFaceDetector(BaseFaceDetector):
+    name = "mtcnn"
+
+    def __init__(self, preprocessor: ImagePreprocessor = None) -> None:
+        super().__init__(preprocessor)
+        from deepface.detectors import FaceDetector
+
+        self.model = FaceDetector.build_model("mtcnn")
+
+    def detect(self, img: np.ndarray) -> Optional[FaceDetection]:
+        from deepface.detectors import FaceDetector
+
+        small, scale = self.preprocessor.downscale(img)
+        ## same channel order as deepface's MtcnnWrapper so the detections match the ones of the per-image path
+        detections = self.model.detect_faces(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        if len(detections) == 0:
+            return None
+        detection = detections[0]  ## like FaceDetector.detect_face, the other faces are discarded
+        face, region = self.crop(img, detection["box"], scale)
+        keypoints = detection["keypoints"]
+        ## the rotation only depends on the direction between the eyes, which the scale does not change
+        face = FaceDetector.alignment_procedure(
+            face,
+            self.preprocessor.map_point(keypoints["left_eye"], scale),
+            self.preprocessor.map_point(keypoints["right_eye"], scale),
+        )
+        return FaceDetection(face, region, float(detection["confidence"]), len(detections), self.name)
+
+
+class HaarFaceDetector(BaseFaceDetector):
+    """OpenCV Haar cascade, the confidence is the level weight of the last stage of the cascade"""
+
+    name = "opencv"
+    min_confidence = HAAR_MIN_CONFIDENCE
+
+    def __init__(self, preprocessor: ImagePreprocessor = None) -> None:
+        super().__init__(preprocessor)
+        from deepface.detectors import FaceDetector
+
+        self.model = FaceDetector.build_model("opencv")
+
+    def detect(self, img: np.ndarray) -> Optional[FaceDetection]:
+        from deepface.detectors import OpenCvWrapper
+
+        small, scale = self.preprocessor.downscale(img)
+        ## same channel order and parameters as deepface's OpenCvWrapper, whose cascade reads the colour array as
+        # BGR like the MTCNN backend above, so the detections match the ones of the per-image path
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        boxes, _, level_weights = self.model["face_detector"].detectMultiScale3(
+            gray, 1.1, 10, outputRejectLevels=True
+        )
+        if len(boxes) == 0:
+            return None
+        best = int(np.argmax(level_weights))
+        face, region = self.crop(img, boxes[best], scale)
+        face = OpenCvWrapper.align_face(self.model["eye_detector"], face)
+        return FaceDetection(face, region, float(np.ravel(level_weights)[best]), len(boxes), self.name)
+
+
+class SsdFaceDetector(BaseFaceDetector):
+    """OpenCV ResNet SSD, the weights are downloaded by deepface on the first build"""
+
+    name = "ssd"
+    min_confidence = SSD_MIN_CONFIDENCE
+    detection_threshold = 0.9  ## same threshold as deepface's SsdWrapper
+    input_size = (300, 300)
+
+    def __init__(self, preprocessor: ImagePreprocessor = None) -> None:
+        super().__init__(preprocessor)
+        from deepface.detectors import FaceDetector
+
+        self.model = FaceDetector.build_model("ssd")
+        self._lock = threading.Lock()  ## cv2.dnn networks keep their input, they are not thread safe
+
+    def detect(self, img: np.ndarray) -> Optional[FaceDetection]:
+        from deepface.detectors import OpenCvWrapper
+
+        height, width = img.shape[:2]
+        ## the network input is 300x300 whatever the frame, no need for the downscaled copy
+        blob = cv2.dnn.blobFromImage(cv2.resize(img, self.input_size))
+        with self._lock:
+            self.model["face_detector"].setInput(blob)
+            detections = self.model["face_detector"].forward()[0][0]
+        ## columns: image id, is face, confidence, left, top, right, bottom (relative coordinates)
+        detections = detections[(detections[:, 1] == 1) & (detections[:, 2] >= self.detection_threshold)]
+        if len(detections) == 0:
+            return None
+        best = detections[np.argmax(detections[:, 2])]
+        left, top, right, bottom = best[3] * width, best[4] * height, best[5] * width, best[6] * height
+        face, region = self.crop(img, (left, top, right - left, bottom - top), 1.0)
+        face = OpenCvWrapper.align_face(self.model["eye_detector"], face)
+        return FaceDetection(face, region, float(best[2]), len(detections), self.name)
+
+
+class CascadeFaceDetector(BaseFaceDetector):
+    """Runs the fast detector first and the accurate one only when the fast one finds no face, several
+    faces or a face below its min_confidence.
+
+    Args:
+        fast (BaseFaceDetector): cheap first pass detector
+        accurate (BaseFaceDetector): detector used when the first pass is unsure
+    """
+
+    name = "cascade"
+
+    def __init__(self, fast: BaseFaceDetector, accurate: BaseFaceDetector) -> None:
+        super().__init__(fast.preprocessor)
+        self.fast = fast
+        self.accurate = accurate
+        self.fast_hits = 0
+        self.fallbacks = 0
+
+    def detect(self, img: np.ndarray) -> Optional[FaceDetection]:
+        detection = self.fast.detect(img)
+        if self.fast.is_confident(detection):
+            self.fast_hits += 1
+            return detection
+        self.fallbacks += 1
+        return self.accurate.detect(img)
+
+    def stats(self) -> dict:
+        return {"fast_hits": self.fast_hits, "fallbacks": self.fallbacks}
+
+
+DETECTORS = {
+    "mtcnn": MtcnnFaceDetector,
+    "opencv": HaarFaceDetector,
+    "ssd": SsdFaceDetector,
+}
+
+
+def build_face_detector(backend: str) -> BaseFaceDetector:
+    """Builds the detector of the given backend: mtcnn, opencv, ssd or cascade"""
+    if backend == "cascade":
+        return CascadeFaceDetector(
+            build_face_detector(CASCADE_FAST_DETECTOR), build_face_detector(CASCADE_ACCURATE_DETECTOR)
+        )
+    detector_class = DETECTORS.get(backend)
+    if detector_class is None:
+        raise ValueError(f"Invalid detector backend passed - {backend}")
+    return detector_class()
@@ -0,0 +1,78 @@
+## Decode and resize stage run before the face detection. Phone cameras upload 12MP frames while the face
+#  crop fed to Facenet is 160x160, so the frames are decoded at a reduced size (JPEG draft mode), turned
+#  upright and to RGB, and the detector runs on a copy downscaled to DETECTION_MAX_SIDE. The detected box and
+#  eye keypoints are then mapped back to the decoded frame, which the face is cropped from.
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from face_auth.constant.embedding_constants import DECODE_MAX_SIDE, DETECTION_MAX_SIDE
+
+
+class ImagePreprocessor:
+    """Decodes the uploaded frames and prepares the downscaled copy used by the detector.
+
+    Args:
+        decode_max_side (int): maximum side of the decoded frame the face is cropped from
+        detection_max_side (int): maximum side of the image the detector runs on, 0 disables the downscale
+    """
+
+    def __init__(self, decode_max_side: int = DECODE_MAX_SIDE, detection_max_side: int = DETECTION_MAX_SIDE) -> None:
+        self.decode_max_side = decode_max_side
+        self.detection_max_side = detection_max_side
+
+    def decode(self, contents) -> np.ndarray:
+        """Decode an uploaded frame into an upright RGB array of at most decode_max_side pixels per side
+
+        Args:
+            contents (bytes | file): Bytes of the image, or the binary file it was spooled to
+
+        Returns:
+            np.ndarray: image array of shape (height, width, 3)
+        """
+        source = contents if hasattr(contents, "read") else io.BytesIO(contents)
+        with Image.open(source) as image:
+            width, height = image.size
+            ratio = self.decode_max_side / max(width, height)
+            if image.format == "JPEG" and ratio < 1:
+                ## the JPEG decoder skips the DCT coefficients of the finer scales (1/2, 1/4 or 1/8), the size it
+                # picks stays larger than the requested one
+                image.draft("RGB", (int(width * ratio), int(height * ratio)))
+            image = ImageOps.exif_transpose(image)
+            if image.mode != "RGB":  ## RGBA, palette and grayscale frames
+                image = image.convert("RGB")
+            if max(image.size) > self.decode_max_side:
+                image.thumbnail((self.decode_max_side, self.decode_max_side), Image.BILINEAR)
+            return np.asarray(image)
+
+    def downscale(self, img: np.ndarray):
+        """Returns the copy of the frame the detector runs on and its scale relative to the frame
+
+        Args:
+            img (np.ndarray): decoded frame
+
+        Returns:
+            tuple: (downscaled image, scale), scale is 1 when the frame is already small enough
+        """
+        height, width = img.shape[:2]
+        if not self.detection_max_side or max(height, width) <= self.detection_max_side:
+            return img, 1.0
+        scale = self.detection_max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+    @staticmethod
+    def map_box(box, scale: float, shape: tuple) -> tuple:
+        """Maps a detection box (x, y, w, h) of the downscaled image back to the frame, clipped to its bounds"""
+        x, y, w, h = (value / scale for value in box)
+        x0, y0 = max(0, int(x)), max(0, int(y))
+        x1, y1 = min(shape[1], int(x + w)), min(shape[0], int(y + h))
+        return x0, y0, x1 - x0, y1 - y0
+
+    @staticmethod
+    def map_point(point, scale: float) -> tuple:
+        """Maps a keypoint (x, y) of the downscaled image back to the frame"""
+        return point[0] / scale, point[1] / scale
@@ -0,0 +1,129 @@
+## Client of the inference workers (face_auth/inference/inference_worker.py). In the split deployment the API
+#  processes load no model: the InferenceExecutor of kind "remote" submits the jobs to this pool, which sends
+#  them over authenticated local sockets to the worker processes holding the models.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client
+from typing import List
+
+from face_auth.logger import logging
+
+
+class RemoteInferenceError(Exception):
+    """Raised when a job failed in the inference worker, with the error of the worker"""
+
+
+def parse_address(address: str) -> tuple:
+    """host:port -> (host, port), the host defaults to the local one"""
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+class RemoteInferencePool:
+    """Connections to the inference workers, with the submit and shutdown methods of the concurrent.futures pools
+    so the InferenceExecutor uses it like its thread and process pools. A job holds one connection until the
+    worker answers, the connections of the workers alternate so the jobs are spread over them.
+
+    Args:
+        addresses (List[str]): host:port of the workers
+        authkey (bytes): key of the connection handshake, shared with the workers
+        connections_per_worker (int): jobs sent to each worker at the same time
+        connect_timeout (float): seconds start waits for the workers, they only listen once their models are loaded
+    """
+
+    def __init__(
+        self, addresses: List[str], authkey: bytes, connections_per_worker: int = 1, connect_timeout: float = 0
+    ) -> None:
+        if not addresses:
+            raise ValueError("No inference worker address passed")
+        self.addresses = [parse_address(address) for address in addresses]
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        self.size = len(self.addresses) * connections_per_worker
+        self.slots = queue.Queue()  ## [address, connection or None], opened by the first job using the slot
+        for _ in range(connections_per_worker):
+            for address in self.addresses:
+                self.slots.put([address, None])
+        self.pool = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="inference-client")
+        self.sent = 0
+        self.failed = 0
+        self.reconnects = 0
+        self._lock = threading.Lock()
+
+    def connect(self, address: tuple, timeout: float = 0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return Client(address, authkey=self.authkey)
+            except OSError:  ## refused while the worker is still loading its models
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.5)
+
+    def start(self) -> None:
+        """Opens every connection, waiting up to connect_timeout for the workers to listen"""
+        slots = [self.slots.get() for _ in range(self.size)]
+        try:
+            for slot in slots:
+                if slot[1] is None:
+                    slot[1] = self.connect(slot[0], self.connect_timeout)
+        finally:
+            for slot in slots:
+                self.slots.put(slot)
+        logging.info(f"Connected to the inference workers {self.worker_names()}.......")
+
+    def _call(self, function, args: tuple):
+        slot = self.slots.get()
+        try:
+            if slot[1] is not None and slot[1].poll():
+                ## an idle connection is only readable once the worker closed it, e.g. when it restarted
+                slot[1].close()
+                slot[1] = None
+            if slot[1] is None:
+                with self._lock:
+                    self.reconnects += 1
+                slot[1] = self.connect(slot[0])
+            slot[1].send((function.__name__, args))  ## the workers look the job up by name
+            status, result = slot[1].recv()
+        except (EOFError, OSError):
+            ## the worker stopped, the next job of the slot connects again
+            if slot[1] is not None:
+                slot[1].close()
+            slot[1] = None
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            self.slots.put(slot)
+        with self._lock:
+            self.sent += 1
+        if status == "error":
+            raise RemoteInferenceError(result)
+        return result
+
+    def submit(self, function, *args) -> Future:
+        """Sends function(*args) to a worker, which only runs the functions of its INFERENCE_JOBS. The arguments
+        are restricted to builtins and numpy arrays."""
+        return self.pool.submit(self._call, function, args)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.pool.shutdown(wait=wait)
+        while not self.slots.empty():
+            _, connection = self.slots.get()
+            if connection is not None:
+                connection.close()
+
+    def worker_names(self) -> List[str]:
+        return [f"{host}:{port}" for host, port in self.addresses]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.worker_names(),
+            "connections": self.size,
+            "sent": self.sent,
+            "failed": self.failed,
+            "reconnects": self.reconnects,
+        }
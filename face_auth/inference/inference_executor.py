@@ -0,0 +1,136 @@
+## This module runs the CPU bound face inference outside of the asyncio event loop. The FastAPI handlers
+#  await the executor, so other requests (like the /auth logins) are served while the frames are processed.
+#  The remote kind sends the jobs to the inference workers of the split deployment instead of a local pool.
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from face_auth.constant.embedding_constants import MODEL_WARMUP
+from face_auth.constant.inference_constants import (
+    INFERENCE_EXECUTOR,
+    INFERENCE_MAX_QUEUE_SIZE,
+    INFERENCE_MAX_WORKERS,
+    INFERENCE_TIMEOUT_SECONDS,
+    INFERENCE_WORKER_ADDRESSES,
+    INFERENCE_WORKER_AUTHKEY,
+    INFERENCE_WORKER_CONNECT_TIMEOUT_SECONDS,
+)
+from face_auth.inference.inference_client import RemoteInferencePool
+from face_auth.inference.model_registry import ModelRegistry
+from face_auth.logger import logging
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the executor already holds the maximum number of pending inference jobs"""
+
+
+def preload_models() -> None:
+    ## initializer of the process pool, every worker loads and warms up its own models
+    ModelRegistry.load(warmup=MODEL_WARMUP)
+
+
+class InferenceExecutor:
+    """Bounded thread or process pool for the face inference jobs, or connections to the inference workers.
+
+    Args:
+        kind (str): "thread", "process" or "remote"
+        max_workers (int): number of threads or processes running inference, jobs sent to each worker when remote
+        max_queue_size (int): maximum number of running plus waiting jobs
+        timeout (float): seconds a request waits for its job before giving up
+    """
+
+    def __init__(
+        self,
+        kind: str = INFERENCE_EXECUTOR,
+        max_workers: int = INFERENCE_MAX_WORKERS,
+        max_queue_size: int = INFERENCE_MAX_QUEUE_SIZE,
+        timeout: float = INFERENCE_TIMEOUT_SECONDS,
+    ) -> None:
+        if kind not in ("thread", "process", "remote"):
+            raise ValueError(f"Invalid inference executor passed - {kind}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self.pool = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Create the pool and load the models where the inference will run"""
+        if self.pool is not None:
+            return
+        if self.kind == "thread":
+            ModelRegistry.load(warmup=MODEL_WARMUP)
+            self.pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="inference"
+            )
+        elif self.kind == "remote":
+            ## the models live in the workers, this process only waits for them to listen
+            pool = RemoteInferencePool(
+                INFERENCE_WORKER_ADDRESSES,
+                INFERENCE_WORKER_AUTHKEY,
+                connections_per_worker=self.max_workers,
+                connect_timeout=INFERENCE_WORKER_CONNECT_TIMEOUT_SECONDS,
+            )
+            pool.start()
+            self.pool = pool
+        else:
+            ## spawn instead of fork, TensorFlow is not fork safe once it has been initialised
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload_models,
+            )
+            ## start every worker now so that the models are loaded before the first request
+            for future in [self.pool.submit(int) for _ in range(self.max_workers)]:
+                future.result()
+        logging.info(f"Inference executor started with {self.max_workers} {self.kind} workers.......")
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, function, *args):
+        """Run function(*args) in the pool and wait for its result
+
+        Raises:
+            InferenceQueueFull: the executor already holds max_queue_size jobs
+            asyncio.TimeoutError: the job did not finish within the timeout
+        """
+        if self.pool is None:
+            self.start()
+        with self._lock:
+            if self.pending >= self.max_queue_size:
+                raise InferenceQueueFull(f"{self.pending} inference jobs are already pending")
+            self.pending += 1
+        try:
+            future = self.pool.submit(function, *args)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+        ## the slot is released when the job really ends, not when the request stops waiting for it
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+
+    def stats(self) -> dict:
+        stats = {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue_size": self.max_queue_size,
+            "pending": self.pending,
+        }
+        if isinstance(self.pool, RemoteInferencePool):
+            stats["remote"] = self.pool.stats()
+        return stats
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,141 @@
+## Inference worker of the split deployment: a process holding the detector and the embedding model and running
+#  the jobs sent by the API processes (face_auth/inference/inference_client.py) with INFERENCE_EXECUTOR=remote.
+#  The models are loaded before the worker listens, so no client is ever served by a cold model. Each connection
+#  is served by its own thread, the API opens INFERENCE_MAX_WORKERS connections per worker.
+#  A job is the name of one of the INFERENCE_JOBS and its arguments, builtins and numpy arrays: a client cannot
+#  make the worker load any other class or run any other function. INFERENCE_WORKER_AUTHKEY must be set.
+#  Usage: python -m face_auth.inference.inference_worker [--host 127.0.0.1] [--port 7001] [--workers 1]
+#  --workers N starts N worker processes listening on port, port + 1, ..., e.g. one per core.
+
+import argparse
+import io
+import multiprocessing
+import pickle
+import threading
+from multiprocessing.connection import Listener
+from multiprocessing.context import AuthenticationError
+
+from face_auth.business_val.user_embedding_val import (
+    compare_user_embedding_list,
+    extract_gated_faces,
+    represent_faces,
+    verify_user_embedding_list,
+)
+from face_auth.business_val.user_identification_val import identify_users
+from face_auth.constant.embedding_constants import MODEL_WARMUP
+from face_auth.constant.inference_constants import INFERENCE_WORKER_AUTHKEY
+from face_auth.inference.model_registry import ModelRegistry
+from face_auth.logger import logging
+
+## the functions the API runs in the workers, by name
+INFERENCE_JOBS = {
+    job.__name__: job
+    for job in (
+        extract_gated_faces,
+        represent_faces,
+        compare_user_embedding_list,
+        verify_user_embedding_list,
+        identify_users,
+    )
+}
+
+
+class JobUnpickler(pickle.Unpickler):
+    """Unpickler of the jobs, the only classes it loads are the ones numpy arrays and scalars are rebuilt with"""
+
+    NUMPY_NAMES = {"_reconstruct", "_frombuffer", "ndarray", "dtype", "scalar"}
+
+    def find_class(self, module: str, name: str):
+        if module.split(".")[0] == "numpy" and name in self.NUMPY_NAMES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in an inference job")
+
+
+def run_job(message: bytes) -> tuple:
+    """Runs the job of a message and returns the answer of the client
+
+    Args:
+        message (bytes): pickled (name, args)
+
+    Returns:
+        tuple: ("ok", result) or ("error", message of the error)
+    """
+    try:
+        name, args = JobUnpickler(io.BytesIO(message)).load()
+        function = INFERENCE_JOBS[name]
+    except Exception as e:
+        logging.warning(f"Inference worker refused a job: {type(e).__name__}: {e}")
+        return ("error", f"Invalid inference job: {type(e).__name__}: {e}")
+    try:
+        return ("ok", function(*args))
+    except Exception as e:
+        logging.exception(f"Inference job {name} failed.......")
+        return ("error", f"{type(e).__name__}: {e}")
+
+
+def handle_connection(connection) -> None:
+    """Runs the jobs of a client connection until the client closes it
+
+    Args:
+        connection (Connection): accepted connection, receiving (name, args) and answering (status, result)
+    """
+    with connection:
+        while True:
+            try:
+                message = connection.recv_bytes()
+            except (EOFError, OSError):
+                return
+            answer = run_job(message)
+            try:
+                connection.send(answer)
+            except (EOFError, OSError):
+                return
+
+
+def serve(address: tuple, authkey: bytes = INFERENCE_WORKER_AUTHKEY, warmup: bool = MODEL_WARMUP) -> None:
+    """Loads the models then serves the clients until the process is stopped
+
+    Args:
+        address (tuple): (host, port) to listen on
+        authkey (bytes, optional): key of the connection handshake. Defaults to INFERENCE_WORKER_AUTHKEY.
+        warmup (bool, optional): run a dummy inference before listening. Defaults to MODEL_WARMUP.
+    """
+    if not authkey:
+        raise ValueError("INFERENCE_WORKER_AUTHKEY is not set, the inference worker would accept any client")
+    ModelRegistry.load(warmup=warmup)
+    with Listener(address, authkey=authkey) as listener:
+        logging.info(f"Inference worker listening on {address[0]}:{address[1]}.......")
+        while True:
+            try:
+                connection = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:  ## failed handshake, e.g. a port probe
+                logging.warning(f"Inference worker refused a connection: {e}")
+                continue
+            threading.Thread(target=handle_connection, args=(connection,), daemon=True).start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inference worker of the split deployment")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7001)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, on consecutive ports")
+    args = parser.parse_args()
+    if not INFERENCE_WORKER_AUTHKEY:
+        parser.error("INFERENCE_WORKER_AUTHKEY is not set, the inference worker would accept any client")
+    if args.workers == 1:
+        serve((args.host, args.port))
+        return
+    ## spawn, every worker initialises its own TensorFlow
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=serve, args=((args.host, args.port + offset),), name=f"inference-worker-{offset}")
+        for offset in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+## This module coalesces the face crops of concurrent requests into a single embedding inference.
+#  Requests arriving within a short window (or until the maximum batch size is reached) share one
+#  Facenet forward pass, and each request gets back only the embeddings of its own faces.
+
+import asyncio
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+from face_auth.constant.inference_constants import (
+    MICRO_BATCH_MAX_SIZE,
+    MICRO_BATCH_WINDOW_MS,
+)
+from face_auth.inference.inference_executor import InferenceExecutor, inference_executor
+from face_auth.logger import logging
+
+
+class EmbeddingMicroBatcher:
+    """Asyncio micro-batching layer in front of the embedding model.
+
+    Args:
+        represent_function: picklable function mapping faces (n, h, w, 3) to embeddings (n, d)
+        executor (InferenceExecutor): executor running the batched inference
+        window_ms (float): how long the first request of a batch waits for others to join
+        max_batch_size (int): number of faces that closes a batch before the window ends
+    """
+
+    def __init__(
+        self,
+        represent_function,
+        executor: InferenceExecutor = inference_executor,
+        window_ms: float = MICRO_BATCH_WINDOW_MS,
+        max_batch_size: int = MICRO_BATCH_MAX_SIZE,
+    ) -> None:
+        self.represent_function = represent_function
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue = None
+        self.worker = None
+        self.running = set()
+        ## metrics
+        self.batch_size_histogram = Counter()
+        self.wait_times_ms = deque(maxlen=1000)
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_worker(self) -> None:
+        ## the queue and the task are created lazily so they belong to the event loop of the server
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed(self, faces: np.ndarray) -> np.ndarray:
+        """Embed the faces of one request together with the faces of concurrent requests
+
+        Args:
+            faces (np.ndarray): preprocessed faces of shape (n, h, w, 3)
+
+        Returns:
+            np.ndarray: embeddings of shape (n, d) for the faces of this request
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((faces, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        ## waits for the first request, then gathers more until the window ends or the batch is full
+        items = [await self.queue.get()]
+        batch_size = len(items[0][0])
+        deadline = time.perf_counter() + self.window
+        while batch_size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            batch_size += len(item[0])
+        return items
+
+    async def _run(self) -> None:
+        while True:
+            items = await self._collect()
+            ## the batch runs as its own task so the next batch can be collected while the executor is busy
+            task = asyncio.get_running_loop().create_task(self._dispatch(items))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def _dispatch(self, items: list) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued in items:
+            self.wait_times_ms.append((started - enqueued) * 1000)
+        counts = [len(faces) for faces, _, _ in items]
+        self.batches += 1
+        self.requests += len(items)
+        self.batch_size_histogram[sum(counts)] += 1
+        try:
+            embeddings = await self.executor.run(
+                self.represent_function, np.concatenate([faces for faces, _, _ in items], axis=0)
+            )
+        except Exception as e:
+            logging.info(f"Batched inference of {len(items)} requests failed: {e}")
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        ## hands every request the rows of its own faces
+        for (_, future, _), request_embeddings in zip(
+            items, np.split(embeddings, np.cumsum(counts)[:-1])
+        ):
+            if not future.done():
+                future.set_result(request_embeddings)
+
+    async def shutdown(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+    def stats(self) -> dict:
+        """
+        :return queue depth, batch size histogram and wait time metrics of the batcher:
+        """
+        wait_times = np.array(self.wait_times_ms) if self.wait_times_ms else np.zeros(1)
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "running_batches": len(self.running),
+            "batches": self.batches,
+            "requests": self.requests,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "wait_time_ms": {
+                "p50": round(float(np.percentile(wait_times, 50)), 3),
+                "p99": round(float(np.percentile(wait_times, 99)), 3),
+                "max": round(float(wait_times.max()), 3),
+            },
+        }
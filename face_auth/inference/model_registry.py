@@ -0,0 +1,139 @@
+## This module holds the registry of the face detection and embedding models. The models are built once
+#  per worker process, warmed up with a dummy inference at startup and then shared by the embedding code.
+#  deepface (and TensorFlow with it) is imported by load, so importing the registry does not load the ML stack.
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import (
+    DETECTOR_BACKEND,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_RUNTIME,
+    REPRESENT_DETECTOR_BACKEND,
+    TF_INTER_OP_THREADS,
+    TF_INTRA_OP_THREADS,
+    WARMUP_IMAGE_SHAPE,
+)
+from face_auth.exception import AppException
+from face_auth.inference.face_detectors import build_face_detector
+from face_auth.inference.onnx_embedding import build_embedding_model
+from face_auth.logger import logging
+from face_auth.utils.util import CommonUtils
+
+
+class ModelRegistry:
+    """Process wide registry of the detector and the embedding model.
+
+    Like MongodbClient.client the models are kept on the class, so every object of the
+    embedding code running in the same process uses the same loaded models.
+    """
+
+    detector = None
+    represent_detector = None
+    embedding_model = None
+    load_time: dict = {}
+    memory_usage: dict = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _timed_build(cls, name: str, build_function):
+        ## builds a model and records how long it took and how much resident memory it added
+        memory_before = CommonUtils().get_memory_usage_in_mb()
+        start = time.perf_counter()
+        model = build_function()
+        cls.load_time[name] = round(time.perf_counter() - start, 3)
+        cls.memory_usage[name] = round(CommonUtils().get_memory_usage_in_mb() - memory_before, 1)
+        logging.info(
+            f"{name} loaded in {cls.load_time[name]} seconds using {cls.memory_usage[name]} MB......."
+        )
+        return model
+
+    @staticmethod
+    def configure_tensorflow_threads() -> None:
+        ## only effective before TensorFlow initialises its runtime, i.e. before the first model is built
+        uses_tensorflow = EMBEDDING_RUNTIME == "tensorflow" or DETECTOR_BACKEND in ("mtcnn", "cascade")
+        if not uses_tensorflow or not (TF_INTRA_OP_THREADS or TF_INTER_OP_THREADS):
+            return
+        import tensorflow as tf
+
+        try:
+            if TF_INTRA_OP_THREADS:
+                tf.config.threading.set_intra_op_parallelism_threads(TF_INTRA_OP_THREADS)
+            if TF_INTER_OP_THREADS:
+                tf.config.threading.set_inter_op_parallelism_threads(TF_INTER_OP_THREADS)
+        except RuntimeError as e:
+            logging.warning(f"TensorFlow threads not configured, its runtime is already initialised: {e}")
+
+    @classmethod
+    def load(cls, warmup: bool = True) -> dict:
+        """Build the detector and the embedding model if they are not built yet in this process
+
+        Args:
+            warmup (bool, optional): Run a dummy inference after loading. Defaults to True.
+
+        Returns:
+            dict: load statistics of the registry
+        """
+        try:
+            from deepface.detectors import FaceDetector
+
+            with cls._lock:
+                if cls.detector is None and cls.embedding_model is None:
+                    cls.configure_tensorflow_threads()
+                if cls.detector is None:
+                    cls.detector = cls._timed_build(
+                        DETECTOR_BACKEND, lambda: build_face_detector(DETECTOR_BACKEND)
+                    )
+                if cls.represent_detector is None:
+                    cls.represent_detector = cls._timed_build(
+                        REPRESENT_DETECTOR_BACKEND,
+                        lambda: FaceDetector.build_model(REPRESENT_DETECTOR_BACKEND),
+                    )
+                if cls.embedding_model is None:
+                    cls.embedding_model = cls._timed_build(
+                        EMBEDDING_MODEL_NAME, lambda: build_embedding_model(EMBEDDING_RUNTIME)
+                    )
+                if warmup and "warmup" not in cls.load_time:
+                    cls._timed_build("warmup", cls.warmup)
+            return cls.stats()
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    @classmethod
+    def warmup(cls) -> None:
+        """Run a dummy image through the detector and the embedding model so that the first
+        request does not pay for graph tracing and kernel initialisation"""
+        from deepface.commons import functions
+
+        dummy_image = np.zeros(WARMUP_IMAGE_SHAPE, dtype=np.uint8)
+        cls.detector.detect(dummy_image)
+        input_shape_x, input_shape_y = functions.find_input_shape(cls.embedding_model)
+        cls.embedding_model.predict_on_batch(
+            np.zeros((1, input_shape_y, input_shape_x, 3), dtype=np.float32)
+        )
+
+    @classmethod
+    def get_detector(cls):
+        if cls.detector is None:
+            cls.load(warmup=False)
+        return cls.detector
+
+    @classmethod
+    def get_embedding_model(cls):
+        if cls.embedding_model is None:
+            cls.load(warmup=False)
+        return cls.embedding_model
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        :return load time in seconds and memory in MB of every loaded model:
+        """
+        return {
+            "load_time": dict(cls.load_time),
+            "memory_usage": dict(cls.memory_usage),
+            "process_memory": round(CommonUtils().get_memory_usage_in_mb(), 1),
+        }
@@ -0,0 +1,208 @@
+## ONNX Runtime backend of the embedding model. The deepface Keras Facenet is exported once to ONNX, optionally
+#  converted to fp16 or statically quantized to int8, and run by a CPU ONNX Runtime session. The exported
+#  files are cached in ONNX_MODEL_DIR, export them ahead of the deployment with:
+#      python -m face_auth.inference.onnx_embedding [onnx onnx-fp16 onnx-int8] [--calibration-dir <face photos>]
+#  The int8 model is calibrated on the faces of --calibration-dir, it cannot be exported without them.
+
+import os
+import sys
+import tempfile
+import zipfile
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import (
+    EMBEDDING_MODEL_NAME,
+    ONNX_INTRA_OP_THREADS,
+    ONNX_MODEL_DIR,
+)
+from face_auth.exception import AppException
+from face_auth.logger import logging
+
+ONNX_RUNTIMES = ("onnx", "onnx-fp16", "onnx-int8")
+
+
+def onnx_model_path(runtime: str, model_dir: str = ONNX_MODEL_DIR) -> str:
+    suffix = {"onnx": "", "onnx-fp16": ".fp16", "onnx-int8": ".int8"}[runtime]
+    return os.path.join(model_dir, f"{EMBEDDING_MODEL_NAME.lower()}{suffix}.onnx")
+
+
+def _atomic_write(path: str, write_function) -> None:
+    ## several workers may export at the same time, the file only appears once it is complete
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary_path = tempfile.mkstemp(suffix=".onnx", dir=os.path.dirname(path))
+    os.close(handle)
+    try:
+        write_function(temporary_path)
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+def _convert_keras(keras_model, signature, output_path: str) -> None:
+    import onnx
+    import tf2onnx
+
+    ## the large model mode keeps the weights out of the serialized graph, the in-memory conversion of the
+    # 90MB Facenet needs several GB otherwise. It writes a zip of the graph and its weights, merged back here.
+    with tempfile.TemporaryDirectory() as export_dir:
+        archive_path = os.path.join(export_dir, "model.zip")
+        tf2onnx.convert.from_keras(
+            keras_model, input_signature=signature, opset=13, output_path=archive_path, large_model=True
+        )
+        with zipfile.ZipFile(archive_path) as archive:
+            archive.extractall(export_dir)
+        onnx.save(onnx.load(os.path.join(export_dir, "__MODEL_PROTO.onnx")), output_path)
+
+
+def _quantize_int8(base_path: str, output_path: str, calibration_faces: np.ndarray) -> None:
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    ## the activation ranges are only right for the inputs they were calibrated on, never guess them
+    if calibration_faces is None or len(calibration_faces) == 0:
+        raise ValueError("onnx-int8 needs preprocessed face crops to calibrate its activation ranges")
+
+    class FaceReader(CalibrationDataReader):
+        def __init__(self) -> None:
+            self.faces = iter(calibration_faces)
+
+        def get_next(self):
+            face = next(self.faces, None)
+            return None if face is None else {"input": face[np.newaxis].astype(np.float32)}
+
+    ## static QDQ quantization: ONNX Runtime fuses the int8 convolutions, dynamic quantization falls back to
+    # the much slower ConvInteger kernels
+    with tempfile.TemporaryDirectory() as quantize_dir:
+        prepared_path = os.path.join(quantize_dir, "prepared.onnx")
+        quant_pre_process(base_path, prepared_path, skip_symbolic_shape=True)
+        quantize_static(
+            prepared_path,
+            output_path,
+            FaceReader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+        )
+
+
+def export_onnx_model(
+    runtime: str = "onnx", model_dir: str = ONNX_MODEL_DIR, keras_model=None, calibration_faces: np.ndarray = None
+) -> str:
+    """Exports the Keras embedding model to the ONNX file of the runtime if it does not exist yet
+
+    Args:
+        runtime (str): onnx, onnx-fp16 or onnx-int8
+        model_dir (str): directory of the exported files
+        keras_model (optional): loaded deepface model, built when not given
+        calibration_faces (np.ndarray, optional): preprocessed faces calibrating the int8 activation ranges,
+            required to export onnx-int8
+
+    Returns:
+        str: path of the ONNX file
+    """
+    try:
+        path = onnx_model_path(runtime, model_dir)
+        if os.path.isfile(path):
+            return path
+        if runtime == "onnx-int8" and (calibration_faces is None or len(calibration_faces) == 0):
+            raise ValueError(
+                f"{path} does not exist and no calibration faces were passed, export it ahead of the deployment "
+                "with: python -m face_auth.inference.onnx_embedding onnx-int8 --calibration-dir <face photos>"
+            )
+        base_path = onnx_model_path("onnx", model_dir)
+        if not os.path.isfile(base_path):
+            import tensorflow as tf
+            from deepface import DeepFace
+
+            keras_model = keras_model or DeepFace.build_model(EMBEDDING_MODEL_NAME)
+            logging.info(f"Exporting {EMBEDDING_MODEL_NAME} to {base_path} .......")
+            signature = (tf.TensorSpec((None,) + tuple(keras_model.input_shape[1:]), tf.float32, name="input"),)
+            _atomic_write(base_path, lambda output_path: _convert_keras(keras_model, signature, output_path))
+        if runtime == "onnx-fp16":
+            import onnx
+            from onnxruntime.transformers.float16 import convert_float_to_float16
+
+            ## inputs and outputs stay float32, the casts are part of the graph
+            _atomic_write(
+                path,
+                lambda output_path: onnx.save(
+                    convert_float_to_float16(onnx.load(base_path), keep_io_types=True), output_path
+                ),
+            )
+        elif runtime == "onnx-int8":
+            _atomic_write(path, lambda output_path: _quantize_int8(base_path, output_path, calibration_faces))
+        return path
+    except Exception as e:
+        raise AppException(e, sys) from e
+
+
+class OnnxEmbeddingModel:
+    """ONNX Runtime session exposing the part of the Keras model interface used by the embedding code.
+
+    Args:
+        path (str): ONNX file of the model
+        intra_op_threads (int): threads of the session, 0 lets ONNX Runtime use every core
+    """
+
+    def __init__(self, path: str, intra_op_threads: int = ONNX_INTRA_OP_THREADS) -> None:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        self.path = path
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        model_output = self.session.get_outputs()[0]
+        self.input_name = model_input.name
+        self.input_shape = (None,) + tuple(model_input.shape[1:])
+        self.output_shape = (None,) + tuple(model_output.shape[1:])
+
+    @property
+    def layers(self) -> list:
+        ## deepface's find_input_shape reads model.layers[0].input_shape
+        return [self]
+
+    def predict_on_batch(self, faces: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: np.asarray(faces, dtype=np.float32)})[0]
+
+    def predict(self, faces: np.ndarray, **kwargs) -> np.ndarray:
+        return self.predict_on_batch(faces)
+
+
+def build_embedding_model(runtime: str):
+    """Builds the embedding model of the runtime: the deepface Keras model or an ONNX Runtime session"""
+    if runtime == "tensorflow":
+        from deepface import DeepFace
+
+        return DeepFace.build_model(EMBEDDING_MODEL_NAME)
+    if runtime not in ONNX_RUNTIMES:
+        raise ValueError(f"Invalid embedding runtime passed - {runtime}")
+    return OnnxEmbeddingModel(export_onnx_model(runtime))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("runtimes", nargs="*", default=list(ONNX_RUNTIMES))
+    parser.add_argument("--calibration-dir", default=None, help="face photos calibrating the int8 model")
+    args = parser.parse_args()
+    if "onnx-int8" in args.runtimes and not args.calibration_dir:
+        parser.error("onnx-int8 is calibrated on real faces, pass --calibration-dir <face photos>")
+
+    faces = None
+    if args.calibration_dir:
+        from face_auth.inference.embedding_engine import BatchEmbeddingEngine
+
+        files = []
+        for name in sorted(os.listdir(args.calibration_dir)):
+            with open(os.path.join(args.calibration_dir, name), "rb") as image_file:
+                files.append(image_file.read())
+        faces = BatchEmbeddingEngine().extract_faces(files)
+    for runtime_name in args.runtimes:
+        print(export_onnx_model(runtime_name, calibration_faces=faces))
@@ -0,0 +1,102 @@
+## Quality gate run between the face detection and the embedding model. Frames without a face, with a face
+#  too small, blurry, too dark or too bright, or found with a low detector confidence are rejected before the
+#  Facenet pass, so they neither cost an inference nor end up averaged into the template of the user.
+
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from face_auth.constant.quality_constants import (
+    QUALITY_MAX_BRIGHTNESS,
+    QUALITY_MIN_BRIGHTNESS,
+    QUALITY_MIN_CONFIDENCE_BY_BACKEND,
+    QUALITY_MIN_FACE_SIZE,
+    QUALITY_MIN_SHARPNESS,
+    QUALITY_SAMPLE_SIZE,
+)
+from face_auth.inference.face_detectors import FaceDetection
+
+
+class FrameQualityGate:
+    """Checks the detected faces of a batch of frames and returns why each frame is rejected.
+
+    Args:
+        min_sharpness (float): minimal variance of the Laplacian of the face, in 0-255 gray levels
+        min_brightness (float): minimal mean gray level of the face
+        max_brightness (float): maximal mean gray level of the face
+        min_face_size (int): minimal side in pixels of the face in the decoded frame
+        min_confidence (dict): minimal detector score per backend (MTCNN and SSD probability, Haar level
+            weight), a backend missing from it is not checked
+        sample_size (int): side the faces are resized to before measuring them, so the blur does not
+            depend on the resolution of the frame
+    """
+
+    def __init__(
+        self,
+        min_sharpness: float = QUALITY_MIN_SHARPNESS,
+        min_brightness: float = QUALITY_MIN_BRIGHTNESS,
+        max_brightness: float = QUALITY_MAX_BRIGHTNESS,
+        min_face_size: int = QUALITY_MIN_FACE_SIZE,
+        min_confidence: dict = QUALITY_MIN_CONFIDENCE_BY_BACKEND,
+        sample_size: int = QUALITY_SAMPLE_SIZE,
+    ) -> None:
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_face_size = min_face_size
+        self.min_confidence = min_confidence
+        self.sample_size = sample_size
+
+    def measure(self, faces: List[np.ndarray]):
+        """Returns the sharpness and the brightness of every face, computed on the stacked gray faces"""
+        size = (self.sample_size, self.sample_size)
+        gray = np.stack(
+            [cv2.resize(cv2.cvtColor(face, cv2.COLOR_RGB2GRAY), size, interpolation=cv2.INTER_AREA) for face in faces]
+        ).astype(np.float32)
+        ## 4-neighbour Laplacian of every face at once
+        laplacian = (
+            gray[:, :-2, 1:-1] + gray[:, 2:, 1:-1] + gray[:, 1:-1, :-2] + gray[:, 1:-1, 2:] - 4 * gray[:, 1:-1, 1:-1]
+        )
+        return laplacian.var(axis=(1, 2)), gray.mean(axis=(1, 2))
+
+    def check(self, detections: List[Optional[FaceDetection]]) -> List[Optional[str]]:
+        """Function to decide which frames are worth an inference of the embedding model
+
+        Args:
+            detections (List[Optional[FaceDetection]]): detection of every frame, None when no face was found
+
+        Returns:
+            List[Optional[str]]: rejection reason of every frame, None for the accepted ones
+        """
+        reasons, found = [None] * len(detections), []
+        for index, detection in enumerate(detections):
+            if detection is None or not detection.face.size:
+                reasons[index] = "no face detected"
+            else:
+                found.append(index)
+        if not found:
+            return reasons
+
+        face_sizes = np.array([min(detections[index].region[2:]) for index in found])
+        confidences = np.array([detections[index].confidence for index in found])
+        ## the threshold on the scale of the backend which found the face, the cascade mixes two backends
+        min_confidences = np.array([self.min_confidence.get(detections[index].backend, -np.inf) for index in found])
+        sharpness, brightness = self.measure([detections[index].face for index in found])
+        ## the first failing check of a frame is the reason reported for it
+        checks = [
+            (confidences < min_confidences, "low detector confidence"),
+            (face_sizes < self.min_face_size, "face too small"),
+            (brightness < self.min_brightness, "frame too dark"),
+            (brightness > self.max_brightness, "frame too bright"),
+            (sharpness < self.min_sharpness, "frame too blurry"),
+        ]
+        for position, index in enumerate(found):
+            for failed, reason in checks:
+                if failed[position]:
+                    reasons[index] = reason
+                    break
+        return reasons
+
+
+quality_gate = FrameQualityGate()
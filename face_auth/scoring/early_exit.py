@@ -0,0 +1,75 @@
+## Early-exit decision of the login verification. The frames are embedded a few at a time and the running
+#  score is compared with SIMILARITY_THRESHOLD after every step: once the threshold lies outside the
+#  confidence interval of the score, more frames cannot change the decision and the remaining ones are skipped.
+
+from typing import List, NamedTuple
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import SIMILARITY_THRESHOLD
+from face_auth.constant.inference_constants import (
+    EARLY_EXIT_MARGIN,
+    EARLY_EXIT_MIN_FRAMES,
+    EARLY_EXIT_Z,
+)
+from face_auth.scoring.similarity_scorer import SimilarityScorer, similarity_scorer
+
+
+class Verification(NamedTuple):
+    authenticated: bool
+    settled: bool  ## False while more frames could still change the decision
+    frames_used: int
+    score: float
+
+
+class EarlyExitVerifier:
+    """Decides whether the frames embedded so far settle the verification.
+
+    Args:
+        threshold (float): similarity needed to authenticate the user
+        min_frames (int): frames embedded before an early decision can be taken
+        margin (float): minimal distance between the score and the threshold for an early decision
+        z (float): width of the confidence interval of the score, in standard errors of the per-frame scores
+        scorer (SimilarityScorer): scorer aggregating the per-frame scores
+    """
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        min_frames: int = EARLY_EXIT_MIN_FRAMES,
+        margin: float = EARLY_EXIT_MARGIN,
+        z: float = EARLY_EXIT_Z,
+        scorer: SimilarityScorer = similarity_scorer,
+    ) -> None:
+        self.threshold = threshold
+        self.min_frames = max(1, min_frames)
+        self.margin = margin
+        self.z = z
+        self.scorer = scorer
+
+    def decide(self, template, embedding_list: List[np.ndarray], total_frames: int) -> Verification:
+        """Function to score the frames embedded so far and decide if the remaining ones are needed
+
+        Args:
+            template: stored embedding of the user
+            embedding_list (List[np.ndarray]): embeddings of the frames processed so far
+            total_frames (int): number of uploaded frames
+
+        Returns:
+            Verification: decision, whether it is settled, frames used and running score
+        """
+        similarity = self.scorer.score(template, embedding_list)
+        frames_used = len(similarity.frame_scores)
+        authenticated = similarity.score >= self.threshold
+        if frames_used >= total_frames:
+            return Verification(authenticated, True, frames_used, similarity.score)
+        if frames_used < self.min_frames:
+            return Verification(authenticated, False, frames_used, similarity.score)
+        ## standard error of the per-frame scores, a single frame gives no estimate of the spread
+        spread = np.std(similarity.frame_scores, ddof=1) if frames_used > 1 else 0.0
+        bound = self.margin + self.z * spread / np.sqrt(frames_used)
+        settled = abs(similarity.score - self.threshold) > bound
+        return Verification(authenticated, bool(settled), frames_used, similarity.score)
+
+
+early_exit_verifier = EarlyExitVerifier()
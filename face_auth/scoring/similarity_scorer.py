@@ -0,0 +1,69 @@
+## Vectorized cosine scoring of the frames of a request against the stored template of a user. The frames
+#  are normalized once and scored with a single matrix-vector product, the aggregation strategy then turns the
+#  per-frame scores into the score compared with SIMILARITY_THRESHOLD.
+
+from typing import List, NamedTuple
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import SCORE_AGGREGATION
+
+AGGREGATIONS = ("mean_embedding", "mean_score", "max", "median")
+
+
+class SimilarityScore(NamedTuple):
+    score: float  ## aggregated cosine similarity
+    frame_scores: np.ndarray  ## cosine similarity of every frame with the template
+
+
+class SimilarityScorer:
+    """Scores the embeddings of the uploaded frames against a stored template.
+
+    Args:
+        aggregation (str): mean_embedding (cosine of the averaged embedding, the original behaviour),
+            mean_score, max or median of the per-frame scores
+    """
+
+    def __init__(self, aggregation: str = SCORE_AGGREGATION) -> None:
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f"Invalid score aggregation passed - {aggregation}")
+        self.aggregation = aggregation
+
+    @staticmethod
+    def _unit(template) -> np.ndarray:
+        template = np.asarray(template, dtype=np.float32)
+        norm = np.linalg.norm(template)
+        return template / norm if norm > 0 else template
+
+    def score(self, template, embedding_list: List[np.ndarray]) -> SimilarityScore:
+        """Function to score the embeddings of the current images against the template of the database
+
+        Args:
+            template: stored embedding of the user, of shape (dimension,)
+            embedding_list (List[np.ndarray]): embeddings of the current images, or an array of shape (n, dimension)
+
+        Returns:
+            SimilarityScore: aggregated score and per-frame scores
+        """
+        template = self._unit(template)
+        frames = np.array(embedding_list, dtype=np.float32, ndmin=2)
+        norms = np.linalg.norm(frames, axis=1)
+        norms[norms == 0] = 1
+        ## the raw dot products are reused by the mean_embedding aggregation before being turned into cosines
+        dots = frames @ template
+        frame_scores = dots / norms
+
+        if self.aggregation == "mean_embedding":
+            ## cosine of the mean embedding: <mean(x), t> / ||mean(x)|| with <mean(x), t> = mean(<x, t>)
+            mean_norm = np.linalg.norm(frames.mean(axis=0))
+            score = dots.mean() / mean_norm if mean_norm > 0 else 0.0
+        elif self.aggregation == "mean_score":
+            score = frame_scores.mean()
+        elif self.aggregation == "max":
+            score = frame_scores.max()
+        else:
+            score = np.median(frame_scores)
+        return SimilarityScore(float(score), frame_scores)
+
+
+similarity_scorer = SimilarityScorer()
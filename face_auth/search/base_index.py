@@ -0,0 +1,189 @@
+## Common interface of the embedding indexes used for 1:N identification. Every backend (exact, IVF, HNSW)
+#  supports building from the embedding collection, incremental inserts, top k search and persistence to disk.
+
+import abc
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.constant.search_constants import EMBEDDING_CATCH_UP_OVERLAP_SECONDS
+from face_auth.exception import AppException
+from face_auth.logger import logging
+
+
+def atomic_write(path: str, write_function) -> None:
+    """Calls write_function with a temporary path next to path, then renames the file to path, so a process
+    loading the index never reads a partially written file
+
+    Args:
+        path (str): final path of the file
+        write_function: function writing the file to the path it is given
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    ## same extension as path, np.savez and np.save append theirs to a path without it
+    handle, temporary_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(handle)
+    try:
+        write_function(temporary_path)
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+class BaseEmbeddingIndex(abc.ABC):
+    """Base class of the embedding index backends, a backend missing one of the abstract methods cannot be
+    instantiated.
+
+    Args:
+        dimension (int): size of the embeddings
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_SIZE) -> None:
+        self.dimension = dimension
+        self.loaded = False
+        self.caught_up_at = None  ## time.monotonic() of the last check against the embedding collection
+        self.synced_until = None  ## updated_at of the latest embedding written to the collection the index holds
+        self.applied = {}  ## UUID: updated_at of the embeddings read by the catch up within the overlap
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of indexed users"""
+
+    @abc.abstractmethod
+    def __contains__(self, uuid_: str) -> bool:
+        """Whether the user is indexed"""
+
+    @staticmethod
+    def normalize(embeddings) -> np.ndarray:
+        """Returns the embeddings as float32 rows of unit length"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1, norms)
+
+    @abc.abstractmethod
+    def build(self, uuids: List[str], embeddings) -> None:
+        """Replaces the content of the index with the given embeddings"""
+
+    @abc.abstractmethod
+    def add(self, uuid_: str, embedding) -> None:
+        """Inserts the embedding of a user, or replaces it when the user is already indexed"""
+
+    @abc.abstractmethod
+    def search(self, query, top_k: int) -> List[dict]:
+        """Returns [{"uuid": ..., "score": cosine similarity}] of the top_k users sorted by decreasing score"""
+
+    @abc.abstractmethod
+    def save(self, path: str) -> None:
+        """Persists the index to files prefixed by path, each one written with atomic_write"""
+
+    @abc.abstractmethod
+    def load(self, path: str) -> None:
+        """Loads an index previously persisted with save"""
+
+    @staticmethod
+    @abc.abstractmethod
+    def exists(path: str) -> bool:
+        """Whether an index was persisted to the files prefixed by path"""
+
+    def set_synced_until(self, synced_until: Optional[datetime]) -> None:
+        self.synced_until = synced_until
+        self.applied = {}
+
+    def synced_until_array(self) -> np.ndarray:
+        """synced_until as an array saved with the index, NaT when the index holds no stamped embedding"""
+        return np.array(self.synced_until or "NaT", dtype="datetime64[ms]")
+
+    def restore_synced_until(self, data) -> None:
+        """Restores synced_until from the arrays of a saved index, the files written before it was saved have
+        none and the catch up reads every stamped embedding once"""
+        self.set_synced_until(data["synced_until"].item() if "synced_until" in data.files else None)
+
+    def load_from_collection(self, user_embedding_data) -> None:
+        """Builds the index from every document of the embedding collection
+
+        Args:
+            user_embedding_data (UserEmbeddingData): data access object of the embedding collection
+        """
+        try:
+            caught_up_at = time.monotonic()
+            ## read before the scan, the embeddings written during it are read again by the next catch up
+            synced_until = user_embedding_data.latest_update()
+            uuids, embeddings, seen = [], [], set()
+            for uuid_, embedding in user_embedding_data.get_all_embeddings():
+                if uuid_ in seen:  ## like find_one, the first document of a UUID is the one used
+                    continue
+                seen.add(uuid_)
+                uuids.append(uuid_)
+                embeddings.append(embedding)
+            self.build(uuids, embeddings)
+            self.set_synced_until(synced_until)
+            self.caught_up_at = caught_up_at
+            logging.info(f"{type(self).__name__} loaded with {len(self)} users.......")
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def catch_up(self, user_embedding_data) -> int:
+        """Applies the embeddings written to the collection since synced_until, e.g. by the registrations of
+        another process or after the index file was written: new users are added and the users who registered
+        their faces again get their new embedding. Only the documents stamped after synced_until are read, minus
+        EMBEDDING_CATCH_UP_OVERLAP_SECONDS for the writes committed after a later stamp was read.
+
+        Args:
+            user_embedding_data (UserEmbeddingData): data access object of the embedding collection
+
+        Returns:
+            int: number of users added or updated
+        """
+        try:
+            caught_up_at = time.monotonic()
+            overlap = timedelta(seconds=EMBEDDING_CATCH_UP_OVERLAP_SECONDS)
+            since = None if self.synced_until is None else self.synced_until - overlap
+            changed = 0
+            for uuid_, embedding, updated_at in user_embedding_data.get_embeddings_updated_since(since):
+                self.synced_until = updated_at if self.synced_until is None else max(self.synced_until, updated_at)
+                if self.applied.get(uuid_) == updated_at:  ## already applied by the previous catch up
+                    continue
+                self.add(uuid_, embedding)
+                self.applied[uuid_] = updated_at
+                changed += 1
+            if self.synced_until is not None:  ## only the stamps the next catch up reads again are kept
+                self.applied = {
+                    uuid_: updated_at
+                    for uuid_, updated_at in self.applied.items()
+                    if updated_at >= self.synced_until - overlap
+                }
+            self.caught_up_at = caught_up_at
+            if changed:
+                logging.info(f"{type(self).__name__} caught up with {changed} new or updated users.......")
+            return changed
+        except Exception as e:
+            raise AppException(e, sys) from e
+
+    def load_snapshot(self, snapshot) -> None:
+        """Builds the index from a memory mapped embedding snapshot
+
+        Args:
+            snapshot (EmbeddingSnapshot): UUIDs and unit length embedding matrix of every user
+        """
+        self.build(snapshot.uuids, snapshot.matrix)
+        self.set_synced_until(snapshot.synced_until)
+        logging.info(f"{type(self).__name__} loaded with {len(self)} users from a snapshot.......")
+
+    @staticmethod
+    def top_k(scores: np.ndarray, uuids, top_k: int) -> List[dict]:
+        """Selects the top_k scores in linear time and returns them sorted, top_k is clamped to the index size"""
+        top_k = min(max(top_k, 0), len(scores))
+        if top_k == 0:
+            return []
+        candidates = np.argpartition(scores, len(scores) - top_k)[-top_k:]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [{"uuid": uuids[row], "score": float(scores[row])} for row in candidates]
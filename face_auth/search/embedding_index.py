@@ -0,0 +1,158 @@
+## In-memory index of the stored user embeddings used for 1:N identification. All embeddings are kept in a
+#  single L2 normalized float32 matrix, so a query against every registered user is one matrix-vector product.
+
+import os
+import threading
+from typing import List
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.search.base_index import BaseEmbeddingIndex, atomic_write
+
+
+class EmbeddingIndex(BaseEmbeddingIndex):
+    """Exact cosine similarity index over the embeddings of all registered users.
+
+    The matrix of an index loaded from a snapshot is a read only memory map shared by the processes. The users
+    added after the load go to a small private matrix of extra rows instead of copying it, and the mapped rows of
+    the users added again are masked out of the results.
+
+    Args:
+        dimension (int): size of the embeddings
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_SIZE) -> None:
+        super().__init__(dimension)
+        self.matrix = np.empty((0, dimension), dtype=np.float32)
+        self.uuids = np.empty((0,), dtype=object)
+        self.size = 0
+        self.rows = {}  ## UUID -> row of the matrix
+        self._reset_extra()
+        self._lock = threading.Lock()
+
+    def _reset_extra(self) -> None:
+        self.extra = np.empty((0, self.dimension), dtype=np.float32)
+        self.extra_uuids = np.empty((0,), dtype=object)
+        self.extra_size = 0
+        self.extra_rows = {}  ## UUID -> row of the extra matrix
+        self.masked_rows = np.empty((0,), dtype=np.int64)  ## rows of the mapped matrix replaced by an extra row
+
+    def __len__(self) -> int:
+        return self.size + self.extra_size - len(self.masked_rows)
+
+    def __contains__(self, uuid_: str) -> bool:
+        return uuid_ in self.rows or uuid_ in self.extra_rows
+
+    def _reserve(self, capacity: int) -> None:
+        ## grows the matrix by doubling so that inserts are amortised O(1)
+        if capacity <= len(self.matrix) and self.matrix.flags.writeable:
+            return
+        new_capacity = max(capacity, 2 * len(self.matrix), 1024)
+        matrix = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        uuids = np.empty((new_capacity,), dtype=object)
+        uuids[: self.size] = self.uuids[: self.size]
+        self.matrix, self.uuids = matrix, uuids
+
+    def build(self, uuids: List[str], embeddings) -> None:
+        embeddings = self.normalize(embeddings) if len(uuids) else np.empty((0, self.dimension), np.float32)
+        with self._lock:
+            self.matrix = np.ascontiguousarray(embeddings)
+            self.uuids = np.asarray(uuids, dtype=object)
+            self.size = len(uuids)
+            self.rows = {uuid_: row for row, uuid_ in enumerate(uuids)}
+            self._reset_extra()
+            self.loaded = True
+
+    def load_snapshot(self, snapshot) -> None:
+        ## the rows of the snapshot are already normalized, the mapped matrix is searched without a copy and
+        # its pages are shared by every process mapping the same snapshot
+        with self._lock:
+            self.matrix = snapshot.matrix
+            self.uuids = np.asarray(snapshot.uuids, dtype=object)
+            self.size = len(snapshot.uuids)
+            self.rows = {uuid_: row for row, uuid_ in enumerate(snapshot.uuids)}
+            self._reset_extra()
+            self.set_synced_until(snapshot.synced_until)
+            self.loaded = True
+
+    def _add_extra(self, uuid_: str, embedding: np.ndarray) -> None:
+        ## the mapped matrix is never written, the embedding goes to the extra rows
+        row = self.extra_rows.get(uuid_)
+        if row is None:
+            mapped_row = self.rows.get(uuid_)
+            if mapped_row is not None:
+                self.masked_rows = np.append(self.masked_rows, mapped_row)
+            if self.extra_size == len(self.extra):
+                extra = np.empty((max(64, 2 * len(self.extra)), self.dimension), dtype=np.float32)
+                extra[: self.extra_size] = self.extra[: self.extra_size]
+                extra_uuids = np.empty((len(extra),), dtype=object)
+                extra_uuids[: self.extra_size] = self.extra_uuids[: self.extra_size]
+                self.extra, self.extra_uuids = extra, extra_uuids
+            row = self.extra_size
+            self.extra_size += 1
+            self.extra_rows[uuid_] = row
+            self.extra_uuids[row] = uuid_
+        self.extra[row] = embedding
+
+    def add(self, uuid_: str, embedding) -> None:
+        embedding = self.normalize(embedding)[0]
+        with self._lock:
+            if not self.matrix.flags.writeable:
+                self._add_extra(uuid_, embedding)
+                return
+            row = self.rows.get(uuid_)
+            self._reserve(self.size + (row is None))
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.rows[uuid_] = row
+                self.uuids[row] = uuid_
+            self.matrix[row] = embedding
+
+    def search(self, query, top_k: int) -> List[dict]:
+        """Returns the top_k most similar users to the query embedding
+
+        Args:
+            query: embedding of shape (dimension,)
+            top_k (int): number of users to return
+
+        Returns:
+            List[dict]: [{"uuid": ..., "score": cosine similarity}] sorted by decreasing score
+        """
+        query = self.normalize(query)[0]
+        with self._lock:
+            matrix = self.matrix[: self.size]
+            uuids = self.uuids[: self.size]
+            extra, extra_uuids = self.extra[: self.extra_size], self.extra_uuids[: self.extra_size]
+            masked_rows = self.masked_rows
+        ## cosine similarity with every user in one matrix-vector product
+        scores = matrix @ query
+        if len(extra) == 0:
+            return self.top_k(scores, uuids, top_k)
+        scores[masked_rows] = -np.inf
+        matches = self.top_k(scores, uuids, top_k) + self.top_k(extra @ query, extra_uuids, top_k)
+        matches = [match for match in matches if match["score"] != -np.inf]
+        return sorted(matches, key=lambda match: -match["score"])[:top_k]
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            live = np.ones(self.size, dtype=bool)
+            live[self.masked_rows] = False
+            matrix = np.concatenate([self.matrix[: self.size][live], self.extra[: self.extra_size]])
+            uuids = np.concatenate([self.uuids[: self.size][live], self.extra_uuids[: self.extra_size]]).astype(str)
+            synced_until = self.synced_until_array()
+        atomic_write(
+            path + ".exact.npz",
+            lambda output_path: np.savez(output_path, matrix=matrix, uuids=uuids, synced_until=synced_until),
+        )
+
+    def load(self, path: str) -> None:
+        with np.load(path + ".exact.npz") as data:
+            self.build(data["uuids"].tolist(), data["matrix"])
+            self.restore_synced_until(data)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(path + ".exact.npz")
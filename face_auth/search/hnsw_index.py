@@ -0,0 +1,153 @@
+## HNSW approximate nearest neighbour index backed by the optional hnswlib package (pip install hnswlib).
+#  ef_search trades recall for latency: the larger it is, the more graph nodes a query visits.
+
+import os
+import sys
+import tempfile
+import threading
+from typing import List
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.constant.search_constants import HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH, HNSW_M
+from face_auth.exception import AppException
+from face_auth.search.base_index import BaseEmbeddingIndex, atomic_write
+
+try:
+    import hnswlib
+except ImportError:  ## hnswlib is optional, the exact and IVF backends do not need it
+    hnswlib = None
+
+
+class HNSWEmbeddingIndex(BaseEmbeddingIndex):
+    """Approximate cosine similarity index based on a hierarchical navigable small world graph.
+
+    Args:
+        dimension (int): size of the embeddings
+        m (int): number of links per graph node
+        ef_construction (int): size of the candidate list while inserting
+        ef_search (int): size of the candidate list while searching
+    """
+
+    def __init__(
+        self,
+        dimension: int = EMBEDDING_SIZE,
+        m: int = HNSW_M,
+        ef_construction: int = HNSW_EF_CONSTRUCTION,
+        ef_search: int = HNSW_EF_SEARCH,
+    ) -> None:
+        if hnswlib is None:
+            raise AppException(ImportError("hnswlib is required by the hnsw index backend"), sys)
+        super().__init__(dimension)
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.uuids = []
+        self.labels = {}  ## UUID -> label of its current graph node
+        self._lock = threading.Lock()
+        self.graph = self._new_graph(1024)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, uuid_: str) -> bool:
+        return uuid_ in self.labels
+
+    def _new_graph(self, capacity: int):
+        graph = hnswlib.Index(space="cosine", dim=self.dimension)
+        graph.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+        graph.set_ef(self.ef_search)
+        return graph
+
+    def _reserve(self, capacity: int) -> None:
+        ## grows the graph by doubling, like EmbeddingIndex does with its matrix
+        if capacity > self.graph.get_max_elements():
+            self.graph.resize_index(max(capacity, 2 * self.graph.get_max_elements()))
+
+    def build(self, uuids: List[str], embeddings) -> None:
+        graph = self._new_graph(max(1024, len(uuids)))
+        if len(uuids):
+            graph.add_items(self.normalize(embeddings), np.arange(len(uuids)))
+        with self._lock:
+            self.graph = graph
+            self.uuids = list(uuids)
+            self.labels = {uuid_: label for label, uuid_ in enumerate(uuids)}
+            self.loaded = True
+
+    def add(self, uuid_: str, embedding) -> None:
+        embedding = self.normalize(embedding)
+        with self._lock:
+            previous = self.labels.get(uuid_)
+            if previous is not None:
+                ## the node of the previous embedding stays in the graph but is never returned again
+                self.graph.mark_deleted(previous)
+            label = len(self.uuids)
+            self._reserve(label + 1)
+            self.graph.add_items(embedding, np.array([label]))
+            self.uuids.append(uuid_)
+            self.labels[uuid_] = label
+
+    def search(self, query, top_k: int, ef_search: int = None) -> List[dict]:
+        """Returns the top_k most similar users to the query embedding
+
+        Args:
+            query: embedding of shape (dimension,)
+            top_k (int): number of users to return
+            ef_search (int, optional): candidate list size, defaults to the ef_search of the index
+
+        Returns:
+            List[dict]: [{"uuid": ..., "score": cosine similarity}] sorted by decreasing score
+        """
+        query = self.normalize(query)
+        with self._lock:
+            top_k = min(max(top_k, 0), len(self.labels))
+            if top_k == 0:
+                return []
+            if ef_search is not None:
+                self.graph.set_ef(max(ef_search, top_k))
+            labels, distances = self.graph.knn_query(query, k=top_k)
+            if ef_search is not None:
+                self.graph.set_ef(self.ef_search)
+            uuids = self.uuids
+        ## hnswlib returns the cosine distance, 1 - distance is the cosine similarity
+        return [
+            {"uuid": uuids[label], "score": float(1 - distance)}
+            for label, distance in zip(labels[0], distances[0])
+        ]
+
+    def save(self, path: str) -> None:
+        ## the graph and its UUIDs go to a single file, a load never pairs the graph of a save with the UUIDs of
+        # another one. hnswlib only writes the graph to a path, it is read back from a temporary file.
+        with self._lock, tempfile.TemporaryDirectory(dir=os.path.dirname(path) or ".") as directory:
+            graph_path = os.path.join(directory, "graph.bin")
+            self.graph.save_index(graph_path)
+            graph = np.fromfile(graph_path, dtype=np.uint8)
+            uuids = np.asarray(self.uuids, dtype=str)
+            synced_until = self.synced_until_array()
+        atomic_write(
+            path + ".hnsw.npz",
+            lambda output_path: np.savez(output_path, graph=graph, uuids=uuids, synced_until=synced_until),
+        )
+
+    def load(self, path: str) -> None:
+        graph = hnswlib.Index(space="cosine", dim=self.dimension)
+        with np.load(path + ".hnsw.npz") as data, tempfile.TemporaryDirectory(
+            dir=os.path.dirname(path) or "."
+        ) as directory:
+            uuids = data["uuids"].tolist()
+            self.restore_synced_until(data)
+            graph_path = os.path.join(directory, "graph.bin")
+            data["graph"].tofile(graph_path)
+            graph.load_index(graph_path, max_elements=max(1024, len(uuids)))
+        graph.set_ef(self.ef_search)
+        with self._lock:
+            self.graph = graph
+            self.uuids = uuids
+            ## the latest label of a UUID is its live node, earlier ones were marked deleted by add
+            self.labels = {uuid_: label for label, uuid_ in enumerate(uuids)}
+            self.loaded = True
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(path + ".hnsw.npz")
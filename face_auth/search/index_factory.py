@@ -0,0 +1,25 @@
+## Selects the embedding index backend of the deployment (EMBEDDING_INDEX_BACKEND = exact, ivf or hnsw)
+#  and holds the index shared by the identification and the registration code of the process.
+
+from face_auth.constant.search_constants import EMBEDDING_INDEX_BACKEND
+from face_auth.search.base_index import BaseEmbeddingIndex
+from face_auth.search.embedding_index import EmbeddingIndex
+from face_auth.search.hnsw_index import HNSWEmbeddingIndex
+from face_auth.search.ivf_index import IVFEmbeddingIndex
+
+INDEX_BACKENDS = {
+    "exact": EmbeddingIndex,
+    "ivf": IVFEmbeddingIndex,
+    "hnsw": HNSWEmbeddingIndex,
+}
+
+
+def build_embedding_index(backend: str = EMBEDDING_INDEX_BACKEND) -> BaseEmbeddingIndex:
+    """Returns an empty index of the given backend"""
+    index_class = INDEX_BACKENDS.get(backend)
+    if index_class is None:
+        raise ValueError(f"Invalid embedding index backend passed - {backend}")
+    return index_class()
+
+
+embedding_index = build_embedding_index()
@@ -0,0 +1,184 @@
+## Inverted file (IVF) approximate nearest neighbour index written in NumPy. The embeddings are clustered
+#  with spherical k-means, and a query only scans the n_probe lists whose centroids are the closest to it.
+#  Raising n_probe increases the recall at the cost of latency, n_probe = n_lists is an exact search.
+
+import os
+import threading
+from typing import List
+
+import numpy as np
+
+from face_auth.constant.embedding_constants import EMBEDDING_SIZE
+from face_auth.constant.search_constants import (
+    IVF_N_LISTS,
+    IVF_N_PROBE,
+    IVF_TRAIN_ITERATIONS,
+    IVF_TRAIN_SIZE,
+)
+from face_auth.logger import logging
+from face_auth.search.base_index import BaseEmbeddingIndex, atomic_write
+
+
+class IVFEmbeddingIndex(BaseEmbeddingIndex):
+    """Approximate cosine similarity index based on inverted lists.
+
+    Args:
+        dimension (int): size of the embeddings
+        n_lists (int): number of k-means clusters, 0 picks 4 * sqrt(N) when the index is built
+        n_probe (int): number of lists scanned per query
+        train_size (int): maximum number of embeddings used to train the centroids
+        train_iterations (int): k-means iterations
+    """
+
+    def __init__(
+        self,
+        dimension: int = EMBEDDING_SIZE,
+        n_lists: int = IVF_N_LISTS,
+        n_probe: int = IVF_N_PROBE,
+        train_size: int = IVF_TRAIN_SIZE,
+        train_iterations: int = IVF_TRAIN_ITERATIONS,
+    ) -> None:
+        super().__init__(dimension)
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self.train_iterations = train_iterations
+        ## before training a single centroid is used, which makes the index exact
+        self.centroids = np.zeros((1, dimension), dtype=np.float32)
+        self.list_vectors = [np.empty((0, dimension), dtype=np.float32)]
+        self.list_ids = [np.empty((0,), dtype=np.int64)]
+        self.uuids = []
+        self.ids = {}  ## UUID -> id (position in self.uuids)
+        self.assignments = {}  ## id -> list number
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, uuid_: str) -> bool:
+        return uuid_ in self.ids
+
+    def _train(self, embeddings: np.ndarray) -> np.ndarray:
+        ## spherical k-means on a sample of the embeddings
+        n_lists = self.n_lists or int(4 * np.sqrt(len(embeddings)))
+        n_lists = max(1, min(n_lists, len(embeddings)))
+        rng = np.random.default_rng(0)
+        sample = embeddings
+        if len(sample) > self.train_size:
+            sample = sample[rng.choice(len(sample), self.train_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            assignment = self._assign(sample, centroids)
+            order = np.argsort(assignment, kind="stable")
+            counts = np.bincount(assignment, minlength=len(centroids))
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            ## empty clusters keep their previous centroid
+            sums = centroids.copy()
+            sums[counts > 0] = np.add.reduceat(sample[order], starts[counts > 0], axis=0)
+            centroids = self.normalize(sums)
+        return centroids
+
+    @staticmethod
+    def _assign(embeddings: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        ## nearest centroid of every embedding, computed in chunks to bound the memory of the score matrix
+        assignment = np.empty(len(embeddings), dtype=np.int64)
+        for start in range(0, len(embeddings), chunk_size):
+            chunk = embeddings[start : start + chunk_size]
+            assignment[start : start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignment
+
+    def build(self, uuids: List[str], embeddings) -> None:
+        embeddings = self.normalize(embeddings) if len(uuids) else np.empty((0, self.dimension), np.float32)
+        centroids = self._train(embeddings) if len(uuids) else np.zeros((1, self.dimension), np.float32)
+        assignment = self._assign(embeddings, centroids)
+        order = np.argsort(assignment, kind="stable")
+        boundaries = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+        with self._lock:
+            self.centroids = centroids
+            self.list_ids = [order[boundaries[n] : boundaries[n + 1]] for n in range(len(centroids))]
+            self.list_vectors = [np.ascontiguousarray(embeddings[ids]) for ids in self.list_ids]
+            self.uuids = list(uuids)
+            self.ids = {uuid_: id_ for id_, uuid_ in enumerate(uuids)}
+            self.assignments = dict(zip(range(len(uuids)), assignment.tolist()))
+            self.loaded = True
+        logging.info(f"IVF index built with {len(centroids)} lists.......")
+
+    def add(self, uuid_: str, embedding) -> None:
+        embedding = self.normalize(embedding)
+        list_number = int(self._assign(embedding, self.centroids)[0])
+        with self._lock:
+            id_ = self.ids.get(uuid_)
+            if id_ is None:
+                id_ = len(self.uuids)
+                self.uuids.append(uuid_)
+                self.ids[uuid_] = id_
+            else:
+                ## removes the previous embedding of the user from its list
+                previous = self.assignments[id_]
+                keep = self.list_ids[previous] != id_
+                self.list_ids[previous] = self.list_ids[previous][keep]
+                self.list_vectors[previous] = self.list_vectors[previous][keep]
+            self.assignments[id_] = list_number
+            self.list_ids[list_number] = np.append(self.list_ids[list_number], id_)
+            self.list_vectors[list_number] = np.vstack([self.list_vectors[list_number], embedding])
+
+    def search(self, query, top_k: int, n_probe: int = None) -> List[dict]:
+        """Returns the top_k most similar users to the query embedding among the n_probe closest lists
+
+        Args:
+            query: embedding of shape (dimension,)
+            top_k (int): number of users to return
+            n_probe (int, optional): lists to scan, defaults to the n_probe of the index
+
+        Returns:
+            List[dict]: [{"uuid": ..., "score": cosine similarity}] sorted by decreasing score
+        """
+        query = self.normalize(query)[0]
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        with self._lock:
+            centroid_scores = self.centroids @ query
+            probes = np.argpartition(centroid_scores, len(centroid_scores) - n_probe)[-n_probe:]
+            vectors = [self.list_vectors[n] for n in probes]
+            ids = np.concatenate([self.list_ids[n] for n in probes])
+            uuids = self.uuids
+        if len(ids) == 0:
+            return []
+        scores = np.concatenate([block @ query for block in vectors])
+        matches = self.top_k(scores, ids, top_k)
+        for match in matches:  ## top_k returned the ids, only the k selected ones are mapped to their UUID
+            match["uuid"] = uuids[match["uuid"]]
+        return matches
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            arrays = dict(
+                centroids=self.centroids,
+                lengths=np.array([len(ids) for ids in self.list_ids], dtype=np.int64),
+                list_ids=np.concatenate(self.list_ids),
+                list_vectors=np.concatenate(self.list_vectors),
+                uuids=np.asarray(self.uuids, dtype=str),
+                synced_until=self.synced_until_array(),
+            )
+        atomic_write(path + ".ivf.npz", lambda output_path: np.savez(output_path, **arrays))
+
+    def load(self, path: str) -> None:
+        with np.load(path + ".ivf.npz") as data:
+            boundaries = np.concatenate([[0], np.cumsum(data["lengths"])])
+            list_ids, list_vectors = data["list_ids"], data["list_vectors"]
+            with self._lock:
+                self.centroids = data["centroids"]
+                self.list_ids = [list_ids[boundaries[n] : boundaries[n + 1]] for n in range(len(self.centroids))]
+                self.list_vectors = [
+                    list_vectors[boundaries[n] : boundaries[n + 1]] for n in range(len(self.centroids))
+                ]
+                self.uuids = data["uuids"].tolist()
+                self.ids = {uuid_: id_ for id_, uuid_ in enumerate(self.uuids)}
+                self.assignments = {
+                    int(id_): n for n, ids in enumerate(self.list_ids) for id_ in ids
+                }
+                self.restore_synced_until(data)
+                self.loaded = True
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(path + ".ivf.npz")
@@ -1,3 +1,4 @@
+import functools
 import os
 import sys
 from datetime import datetime
@@ -55,13 +56,38 @@ class CommonUtils:
         total_milisecond = total_seconds * 1000
         return total_milisecond
 
+    def get_memory_usage_in_mb(self) -> float:
+        """
+        :return resident memory of the current process in megabytes:
+        """
+        try:
+            with open("/proc/self/statm") as statm_file:
+                resident_pages = int(statm_file.read().split()[1])
+            return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            import resource
+
+            ## ru_maxrss is the peak resident memory in kilobytes on linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
     def get_environment_variable(self, variable_name: str):
         """
         :param variable_name:
         :return environment variable:
         """
+        from face_auth.config.settings import settings
+
+        ## the variables of the settings are read and validated once per process
+        if variable_name in settings.__fields__:
+            return getattr(settings, variable_name)
         if os.environ.get(variable_name) is None:
-            enironment_variable = dotenv_values(".env")
+            enironment_variable = _dotenv_values()
             return enironment_variable[variable_name]
         else:
             return os.environ.get(variable_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _dotenv_values() -> dict:
+    ## the .env file is parsed once per process, not once per missing variable
+    return dotenv_values(".env")
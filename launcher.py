@@ -0,0 +1,245 @@
+## Production launcher of the app: one uvicorn worker per core instead of the single process of `python app.py`.
+#  The parent binds the socket and imports the app, TensorFlow and deepface once, then forks the workers, which
+#  share these pages copy-on-write and skip the imports. The models themselves are built by every worker right
+#  after the fork, by the startup event of the app: a TensorFlow runtime initialised before a fork deadlocks in the
+#  child, so only the import can be shared. The identification index is loaded in the parent when it comes from a
+#  file (EMBEDDING_INDEX_PATH or EMBEDDING_SNAPSHOT_PATH), its matrix is then shared by the workers too.
+#  Usage: python launcher.py [--workers N] [--host 0.0.0.0] [--port 8000] [--graceful-timeout 30] [--no-preload]
+#  Signals: HUP restarts the workers one at a time, each new worker serving before an old one is stopped, so no
+#  request is refused. TERM and INT stop the workers gracefully. A worker that dies is replaced.
+#  HUP does not reload the code: it is imported once by the parent, restart the launcher to deploy a new version.
+#  The cores are the ones the launcher may use (affinity mask and cgroup quota of a container), not the host's.
+
+import argparse
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from typing import List, Optional
+
+import uvicorn
+
+from face_auth.config.cpu import available_cpus
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-forking launcher of the app")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVER_WORKERS", "0")) or available_cpus())
+    parser.add_argument("--host", default=None, help="defaults to APP_HOST")
+    parser.add_argument("--port", type=int, default=None, help="defaults to APP_PORT")
+    parser.add_argument("--graceful-timeout", type=float, default=30, help="seconds a stopped worker has to finish")
+    parser.add_argument("--startup-timeout", type=float, default=300, help="seconds a new worker has to load its models")
+    parser.add_argument("--no-preload", action="store_true", help="do not import TensorFlow in the parent")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args(argv)
+
+
+def split_cores(workers: int) -> None:
+    """Gives every worker its share of the cores for its TensorFlow, ONNX Runtime and OpenMP thread pools and its
+    password hashing threads. Must run before face_auth reads its settings, the values already set are kept.
+
+    Args:
+        workers (int): number of worker processes
+    """
+    threads = str(max(1, available_cpus() // workers))
+    for name in ("TF_INTRA_OP_THREADS", "ONNX_INTRA_OP_THREADS", "OMP_NUM_THREADS", "PASSWORD_HASH_WORKERS"):
+        os.environ.setdefault(name, threads)
+    os.environ.setdefault("TF_INTER_OP_THREADS", "1")
+
+
+def preload() -> None:
+    """Imports the ML modules and loads the file backed identification index before the fork"""
+    from face_auth.business_val.user_identification_val import UserIdentification
+    from face_auth.constant.search_constants import EMBEDDING_INDEX_PATH, EMBEDDING_SNAPSHOT_PATH
+    from face_auth.data_access.embedding_snapshot import snapshot_exists
+    from face_auth.search.index_factory import embedding_index
+
+    ## importing TensorFlow starts no thread, building a model does: the models are built after the fork
+    import tensorflow  # noqa: F401
+    from deepface import DeepFace  # noqa: F401
+
+    ## loading from the collection would open a MongoClient, which must not cross a fork
+    if (EMBEDDING_INDEX_PATH and embedding_index.exists(EMBEDDING_INDEX_PATH)) or (
+        EMBEDDING_SNAPSHOT_PATH and snapshot_exists(EMBEDDING_SNAPSHOT_PATH)
+    ):
+        ## every worker applies the embeddings written after the file by its first identification
+        UserIdentification(catch_up=False)
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server writing to a pipe once the startup events of the app (the model loading) are done"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int) -> None:
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            os.write(self.ready_fd, b"1")
+        os.close(self.ready_fd)
+
+
+class PreforkLauncher:
+    """Forks and supervises the uvicorn workers serving the shared socket.
+
+    Args:
+        sock (socket.socket): bound listening socket
+        app: ASGI app served by the workers
+        workers (int): number of worker processes
+        graceful_timeout (float): seconds a stopped worker has to finish its requests before it is killed
+        startup_timeout (float): seconds a new worker has to become ready
+        log_level (str, optional): log level of uvicorn in the workers. Defaults to "warning".
+    """
+
+    def __init__(
+        self,
+        sock: socket.socket,
+        app,
+        workers: int,
+        graceful_timeout: float,
+        startup_timeout: float,
+        log_level: str = "warning",
+    ) -> None:
+        self.sock = sock
+        self.app = app
+        self.log_level = log_level
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.pids = {}  ## pid -> read end of its ready pipe, None once it is ready
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn(self) -> int:
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self.run_worker(write_fd)
+            os._exit(0)
+        os.close(write_fd)
+        self.pids[pid] = read_fd
+        return pid
+
+    def run_worker(self, ready_fd: int) -> None:
+        ## the handlers of the parent do not apply to the worker, uvicorn installs its own for TERM and INT
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        config = uvicorn.Config(self.app, log_level=self.log_level)
+        try:
+            WorkerServer(config, ready_fd).run(sockets=[self.sock])
+        except Exception:
+            logging.exception(f"Worker {os.getpid()} failed.......")
+            os._exit(1)
+
+    def wait_ready(self, pid: int) -> bool:
+        read_fd = self.pids.get(pid)
+        if read_fd is None:
+            return pid in self.pids
+        readable, _, _ = select.select([read_fd], [], [], self.startup_timeout)
+        ready = bool(readable) and os.read(read_fd, 1) == b"1"
+        os.close(read_fd)
+        self.pids[pid] = None
+        return ready
+
+    def stop_worker(self, pid: int) -> None:
+        """Asks the worker to stop accepting connections and finish its requests, then kills it after the timeout"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                break
+            time.sleep(0.1)
+        else:
+            logging.warning(f"Worker {pid} did not stop within {self.graceful_timeout} seconds, killing it.......")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.forget(pid)
+
+    def forget(self, pid: int) -> None:
+        read_fd = self.pids.pop(pid, None)
+        if read_fd is not None:
+            os.close(read_fd)
+
+    def reload(self) -> None:
+        """Replaces the workers one at a time, an old worker is only stopped once its replacement serves"""
+        for old_pid in list(self.pids):
+            new_pid = self.spawn()
+            if not self.wait_ready(new_pid):
+                logging.error(f"Worker {new_pid} did not start, the restart is aborted.......")
+                return
+            self.stop_worker(old_pid)
+        logging.info(f"Workers restarted: {sorted(self.pids)}.......")
+
+    def reap(self) -> None:
+        ## replaces the workers that died, e.g. killed by the out of memory killer
+        while self.pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if pid in self.pids:
+                self.forget(pid)
+                logging.warning(f"Worker {pid} exited with status {status}.......")
+                if not self.stopping:
+                    time.sleep(1)  ## a worker failing at startup would otherwise be respawned in a tight loop
+                    self.spawn()
+
+    def handle_signal(self, signum, frame) -> None:
+        if signum == signal.SIGHUP:
+            self.reload_requested = True
+        else:
+            self.stopping = True
+
+    def run(self) -> None:
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.handle_signal)
+        start = time.perf_counter()
+        for pid in [self.spawn() for _ in range(self.workers)]:
+            self.wait_ready(pid)
+        message = f"{len(self.pids)} workers ready in {time.perf_counter() - start:.1f} seconds"
+        logging.info(f"{message}.......")
+        print(message, flush=True)
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+                print(f"workers restarted: {sorted(self.pids)}", flush=True)
+            self.reap()
+            time.sleep(0.2)
+        for pid in list(self.pids):
+            self.stop_worker(pid)
+
+
+def main() -> None:
+    args = parse_args()
+    split_cores(args.workers)
+    ## imported once the environment is set, the settings are read by the first import of face_auth
+    from app import app
+    from face_auth.constant.application import APP_HOST, APP_PORT, APP_PROFILE
+
+    host, port = args.host or APP_HOST, args.port or APP_PORT
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    if APP_PROFILE == "full" and not args.no_preload:
+        start = time.perf_counter()
+        preload()
+        logging.info(f"Preloaded the ML modules in {time.perf_counter() - start:.1f} seconds.......")
+    print(f"launcher {os.getpid()} serving http://{host}:{port} with {args.workers} workers", flush=True)
+    PreforkLauncher(
+        sock, app, args.workers, args.graceful_timeout, args.startup_timeout, log_level=args.log_level
+    ).run()
+    sock.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())